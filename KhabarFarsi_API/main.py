@@ -1,6 +1,10 @@
+import urllib.request
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from api import app as api_app
+from service_health import HealthMonitor
+from service_health.fastapi import install as install_health
 
 # Create main FastAPI app
 app = FastAPI(
@@ -26,9 +30,17 @@ app.mount("/api", api_app)
 async def root():
     return {"message": "KhabarFarsi API is running", "status": "healthy"}
 
-@app.get("/health")
-async def health():
-    return {"status": "healthy", "service": "khabarfarsi-api"}
+health = HealthMonitor("khabarfarsi-api")
+
+
+@health.check("khabarfarsi.com", critical=False, interval_s=60, timeout_s=10)
+def khabarfarsi_reachable():
+    request = urllib.request.Request("https://khabarfarsi.com", method="HEAD")
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return f"HTTP {response.status}"
+
+
+install_health(app, health)
 
 if __name__ == "__main__":
     import uvicorn
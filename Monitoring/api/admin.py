@@ -1,9 +1,175 @@
 # api/admin.py
 from django.contrib import admin, messages
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections, transaction
+from django.http import FileResponse, Http404
+from django.shortcuts import get_object_or_404
+from django.urls import path, reverse
 from django.utils import timezone
+from django.utils.functional import cached_property
+from django.utils.html import format_html
 from django.db.models import Count
 
-from .models import Service, Endpoint, CheckResult
+from .alerts import dispatch_on_commit, recompute_service_status
+from .config_cache import bump_version
+from .models import Service, Endpoint, CheckResult, Incident, ProfileCapture
+from .writer import write_lock
+
+
+# ---------- Changelist helpers for large tables ----------
+class EstimatedCountPaginator(Paginator):
+    """
+    Avoids exact COUNT(*) over big tables: PostgreSQL uses the planner's row
+    estimate, other backends count at most COUNT_CAP rows. ``estimated`` and
+    ``capped`` say which happened; the changelist shows "~N" or "N+"
+    (templates/admin/api/checkresult/pagination.html).
+    """
+
+    COUNT_CAP = 10000
+    estimated = False
+    capped = False
+
+    @cached_property
+    def count(self):
+        qs = self.object_list
+        conn = connections[qs.db]
+        if conn.vendor == "postgresql":
+            sql, params = qs.query.sql_with_params()
+            with conn.cursor() as cursor:
+                cursor.execute("EXPLAIN (FORMAT JSON) " + sql, params)
+                estimate = int(cursor.fetchone()[0][0]["Plan"]["Plan Rows"])
+            if estimate > self.COUNT_CAP:
+                self.estimated = True
+                return estimate
+        # One row past the cap tells "exactly COUNT_CAP" from "more than that".
+        # Unordered, so a filter's index can serve it instead of a walk of the pk.
+        count = qs.order_by()[:self.COUNT_CAP + 1].count()
+        if count > self.COUNT_CAP:
+            self.capped = True
+            return self.COUNT_CAP
+        return count
+
+
+class CachedChoicesFilter(admin.SimpleListFilter):
+    """
+    SimpleListFilter whose sidebar choices are cached instead of queried per
+    page. Subclasses define ``load_choices()`` returning (value, label) pairs.
+    """
+
+    cache_timeout = 600
+
+    def int_value(self):
+        """The selected value as an int; None if unset or not a number (ignored)."""
+        try:
+            return int(self.value())
+        except (TypeError, ValueError):
+            return None
+
+    def lookups(self, request, model_admin):
+        key = f"monitor:admin:choices:{type(self).__name__}"
+        choices = cache.get(key)
+        if choices is None:
+            choices = list(self.load_choices())
+            cache.set(key, choices, self.cache_timeout)
+        return choices
+
+
+class ServiceFilter(CachedChoicesFilter):
+    title = "service"
+    parameter_name = "service"
+    endpoint_lookup = "endpoint_id__in"
+
+    def load_choices(self):
+        return Service.objects.order_by("name").values_list("id", "name")
+
+    def queryset(self, request, queryset):
+        service_id = self.int_value()
+        if service_id is None:
+            return queryset
+        if self.endpoint_lookup is None:
+            return queryset.filter(service_id=service_id)
+        # A subquery on endpoint ids lets the (endpoint, -timestamp) index do the work.
+        endpoint_ids = Endpoint.objects.filter(service_id=service_id).values("id")
+        return queryset.filter(**{self.endpoint_lookup: endpoint_ids})
+
+
+class EndpointServiceFilter(ServiceFilter):
+    endpoint_lookup = None
+
+
+class MethodFilter(admin.SimpleListFilter):
+    title = "method"
+    parameter_name = "method"
+
+    def lookups(self, request, model_admin):
+        return list(Endpoint.METHOD_CHOICES.items())
+
+    def queryset(self, request, queryset):
+        if self.value() is None:
+            return queryset
+        return queryset.filter(endpoint_id__in=Endpoint.objects.filter(method=self.value()).values("id"))
+
+
+class StatusCodeFilter(CachedChoicesFilter):
+    title = "status code"
+    parameter_name = "status_code"
+    SAMPLE_ROWS = 100000
+
+    def load_choices(self):
+        # Distinct codes among the most recent rows, found through a primary-key range.
+        last = CheckResult.objects.order_by("-id").values_list("id", flat=True).first() or 0
+        codes = (
+            CheckResult.objects.filter(id__gt=last - self.SAMPLE_ROWS)
+            .values_list("status_code", flat=True).distinct().order_by("status_code")
+        )
+        return [(code, str(code)) for code in codes]
+
+    def queryset(self, request, queryset):
+        code = self.int_value()
+        if code is None:
+            return queryset
+        return queryset.filter(status_code=code)
+
+
+class TimeWindowFilter(admin.SimpleListFilter):
+    """
+    Bounds the changelist to a recent window (24 hours unless chosen
+    otherwise). The row count is a range scan of the CheckResult timestamp
+    index; the page itself walks the primary key back from the newest row.
+    """
+
+    title = "time window"
+    parameter_name = "window"
+    DEFAULT = "24h"
+    WINDOWS = {
+        "1h": ("Last hour", timezone.timedelta(hours=1)),
+        "24h": ("Last 24 hours", timezone.timedelta(hours=24)),
+        "7d": ("Last 7 days", timezone.timedelta(days=7)),
+        "30d": ("Last 30 days", timezone.timedelta(days=30)),
+        "all": ("All time", None),
+    }
+
+    def lookups(self, request, model_admin):
+        return [(key, label) for key, (label, _) in self.WINDOWS.items()]
+
+    def value(self):
+        value = super().value()
+        return value if value in self.WINDOWS else self.DEFAULT
+
+    def choices(self, changelist):
+        for lookup, title in self.lookup_choices:
+            yield {
+                "selected": self.value() == lookup,
+                "query_string": changelist.get_query_string({self.parameter_name: lookup}),
+                "display": title,
+            }
+
+    def queryset(self, request, queryset):
+        delta = self.WINDOWS[self.value()][1]
+        if delta is None:
+            return queryset
+        return queryset.filter(timestamp__gte=timezone.now() - delta)
 
 
 # ---------- Inline for Endpoints on the Service page ----------
@@ -11,11 +177,11 @@ class EndpointInline(admin.TabularInline):
     model = Endpoint
     extra = 0
     fields = (
-        "url", "method", "expected_status",
+        "url", "method", "kind", "expected_status",
         "timeout_ms", "interval_sec",
-        "enabled", "next_run_at",
+        "enabled", "state", "next_run_at",
     )
-    readonly_fields = ("next_run_at",)
+    readonly_fields = ("state", "next_run_at",)
     show_change_link = True
 
 
@@ -23,18 +189,21 @@ class EndpointInline(admin.TabularInline):
 @admin.action(description="Enable selected endpoints")
 def enable_endpoints(modeladmin, request, queryset):
     updated = queryset.update(enabled=True)
+    bump_version()
     messages.success(request, f"Enabled {updated} endpoint(s).")
 
 
 @admin.action(description="Disable selected endpoints")
 def disable_endpoints(modeladmin, request, queryset):
     updated = queryset.update(enabled=False)
+    bump_version()
     messages.success(request, f"Disabled {updated} endpoint(s).")
 
 
 @admin.action(description="Schedule run now (set next_run_at = now)")
 def schedule_run_now(modeladmin, request, queryset):
-    updated = queryset.update(next_run_at=timezone.now())
+    # Push endpoints are not probed; their next_run_at is the heartbeat deadline.
+    updated = queryset.filter(mode=Endpoint.MODE_POLL).update(next_run_at=timezone.now())
     messages.info(request, f"Scheduled {updated} endpoint(s) to run now.")
 
 
@@ -42,15 +211,17 @@ def schedule_run_now(modeladmin, request, queryset):
 @admin.register(Endpoint)
 class EndpointAdmin(admin.ModelAdmin):
     list_display = (
-        "id", "service", "short_url", "method",
-        "expected_status", "enabled",
+        "id", "service", "short_url", "method", "kind",
+        "expected_status", "enabled", "state", "tier", "mode",
         "interval_sec", "timeout_ms", "next_run_at",
     )
-    list_filter = ("enabled", "method", "expected_status", "service")
+    list_filter = ("enabled", "state", "tier", "mode", "kind", "method", "expected_status", EndpointServiceFilter)
+    list_select_related = ("service",)
+    show_full_result_count = False
     search_fields = ("url", "service__name")
     autocomplete_fields = ("service",)
     actions = [enable_endpoints, disable_endpoints, schedule_run_now]
-    readonly_fields = ()
+    readonly_fields = ("state", "state_changed_at")
     ordering = ("service__name", "id")
 
     def short_url(self, obj):
@@ -61,8 +232,8 @@ class EndpointAdmin(admin.ModelAdmin):
 # ---------- Service Admin ----------
 @admin.register(Service)
 class ServiceAdmin(admin.ModelAdmin):
-    list_display = ("id", "name", "url", "status", "last_checked", "endpoints_count")
-    list_filter = ("status",)
+    list_display = ("id", "name", "url", "tier", "status", "last_checked", "endpoints_count")
+    list_filter = ("status", "tier")
     search_fields = ("name", "url")
     inlines = [EndpointInline]
     readonly_fields = ("status", "last_checked")
@@ -75,16 +246,16 @@ class ServiceAdmin(admin.ModelAdmin):
         return getattr(obj, "_ep_count", 0)
     endpoints_count.short_description = "Endpoints"
 
-    @admin.action(description="Recompute service status from last 10 results")
+    @admin.action(description="Recompute service status from endpoint states")
     def recompute_status(self, request, queryset):
-        for svc in queryset:
-            last10 = list(
-                CheckResult.objects.filter(endpoint__service=svc.id).order_by("-timestamp")[:10]
-            )
-            svc.status = "UNHEALTHY" if any(not c.success for c in last10) else "HEALTHY"
-            svc.last_checked = timezone.now()
-            svc.save(update_fields=["status", "last_checked"])
-        messages.success(request, f"Recomputed status for {queryset.count()} service(s).")
+        services = list(queryset)
+        # Transitions found here are incidents like the checker's, alerts included.
+        with write_lock("recompute_status"), transaction.atomic():
+            incidents = recompute_service_status(services)
+            Service.objects.bulk_update(services, ["status", "last_checked"])
+            Incident.objects.bulk_create(incidents)
+            dispatch_on_commit(incidents)
+        messages.success(request, f"Recomputed status for {len(services)} service(s).")
 
     actions = ["recompute_status"]
 
@@ -94,12 +265,19 @@ class ServiceAdmin(admin.ModelAdmin):
 class CheckResultAdmin(admin.ModelAdmin):
     list_display = (
         "id", "service_name", "endpoint_id", "timestamp",
-        "status_code", "response_time_ms", "success", "short_details",
+        "status_code", "response_time_ms", "success", "repeat_count", "short_details",
     )
-    list_filter = ("success", "status_code", "endpoint__method", "endpoint__service")
+    list_filter = (TimeWindowFilter, "success", StatusCodeFilter, MethodFilter, ServiceFilter)
+    list_select_related = ("endpoint__service",)
     search_fields = ("endpoint__url", "endpoint__service__name", "details")
-    readonly_fields = ("endpoint", "timestamp", "status_code", "response_time_ms", "success", "details")
-    ordering = ("-timestamp",)
+    readonly_fields = (
+        "endpoint", "timestamp", "status_code", "response_time_ms", "success", "details",
+        "repeat_count", "last_timestamp", "latency_sum_ms", "latency_max_ms",
+    )
+    # Newest first by primary key: walks the pk index backwards instead of sorting the window.
+    ordering = ("-id",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     def service_name(self, obj):
         return obj.endpoint.service.name
@@ -109,3 +287,59 @@ class CheckResultAdmin(admin.ModelAdmin):
             return ""
         return (obj.details[:80] + "…") if len(obj.details) > 80 else obj.details
     short_details.short_description = "Details"
+
+
+# ---------- Incident Admin ----------
+@admin.register(Incident)
+class IncidentAdmin(admin.ModelAdmin):
+    list_display = ("id", "timestamp", "service", "endpoint", "previous_state", "state", "notification")
+    list_filter = ("state", "notification", "service")
+    list_select_related = ("service", "endpoint")
+    search_fields = ("service__name", "endpoint__url", "details")
+    readonly_fields = ("service", "endpoint", "timestamp", "previous_state", "state", "details", "notification")
+    ordering = ("-timestamp",)
+
+
+# ---------- Profiler captures ----------
+@admin.register(ProfileCapture)
+class ProfileCaptureAdmin(admin.ModelAdmin):
+    list_display = ("created_at", "kind", "name", "duration_ms", "samples", "size_bytes", "download")
+    list_filter = ("kind",)
+    search_fields = ("name",)
+    readonly_fields = ("kind", "name", "created_at", "duration_ms", "samples", "size_bytes", "file_name", "download")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def delete_queryset(self, request, queryset):
+        # Go through Model.delete() so the profile files are removed too.
+        for cap in queryset:
+            cap.delete()
+
+    def get_urls(self):
+        urls = [
+            path(
+                "<int:pk>/download/",
+                self.admin_site.admin_view(self.download_view),
+                name="api_profilecapture_download",
+            ),
+        ]
+        return urls + super().get_urls()
+
+    def download_view(self, request, pk):
+        if not self.has_view_permission(request):
+            raise Http404
+        cap = get_object_or_404(ProfileCapture, pk=pk)
+        try:
+            fh = open(cap.path, "rb")
+        except FileNotFoundError:
+            raise Http404("Profile file is missing.")
+        return FileResponse(fh, as_attachment=True, filename=cap.file_name, content_type="text/plain")
+
+    def download(self, obj):
+        url = reverse("admin:api_profilecapture_download", args=[obj.pk])
+        return format_html('<a href="{}">{}</a>', url, obj.file_name)
+    download.short_description = "Folded stacks"
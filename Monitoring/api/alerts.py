@@ -0,0 +1,182 @@
+# api/alerts.py
+"""
+Incremental state-transition detection and alert dispatch.
+
+The checker compares each new result with the state stored on its Endpoint
+(and each touched Service with its stored status), so spotting an up/down flip
+is O(1) and never re-scans CheckResult history. Only transitions are stored,
+as Incident rows, and notification happens in a Celery task so webhook
+latency never blocks the probe loop.
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Endpoint, Incident, Service
+
+log = logging.getLogger(__name__)
+
+SERVICE_HEALTHY = "HEALTHY"
+SERVICE_DEGRADED = "DEGRADED"
+SERVICE_UNHEALTHY = "UNHEALTHY"
+
+
+def endpoint_transition(ep: Endpoint, ok: bool, now, details=None, degraded=False):
+    """
+    Apply one probe outcome to ``ep.state`` in place; a successful but
+    ``degraded`` one (see api.baselines) means DEGRADED rather than UP.
+    Returns an unsaved Incident if the state flipped, else None. The first
+    UP after UNKNOWN is not an incident; a first DOWN is.
+    """
+    if not ok:
+        new_state = Endpoint.STATE_DOWN
+    else:
+        new_state = Endpoint.STATE_DEGRADED if degraded else Endpoint.STATE_UP
+    previous = ep.state
+    if new_state == previous:
+        return None
+    ep.state = new_state
+    ep.state_changed_at = now
+    if previous == Endpoint.STATE_UNKNOWN and new_state == Endpoint.STATE_UP:
+        return None
+    return Incident(
+        service_id=ep.service_id,
+        endpoint=ep,
+        timestamp=now,
+        previous_state=previous,
+        state=new_state,
+        details=(details[:2000] if details else None),
+    )
+
+
+def service_transition(svc: Service, new_status, now):
+    """Same as endpoint_transition, for a service's aggregated status."""
+    previous = svc.status
+    svc.last_checked = now
+    if new_status == previous:
+        return None
+    svc.status = new_status
+    if previous is None and new_status == SERVICE_HEALTHY:
+        return None
+    return Incident(
+        service=svc,
+        timestamp=now,
+        previous_state=previous,
+        state=new_status,
+    )
+
+
+def dispatch_on_commit(incidents):
+    """Queue notification of freshly created incidents once the tick commits."""
+    if not incidents or not settings.ALERT_WEBHOOK_URLS:
+        return
+    ids = [inc.id for inc in incidents]
+
+    def _enqueue():
+        from .tasks import dispatch_alerts_task
+        try:
+            dispatch_alerts_task.delay(ids)
+        except Exception as e:
+            log.warning("Could not queue alerts for incidents %s: %s", ids, e)
+
+    transaction.on_commit(_enqueue)
+
+
+def _is_duplicate(inc: Incident) -> bool:
+    # The same target entering the same state again within the window (a
+    # flapping endpoint) is only announced once.
+    target = f"ep:{inc.endpoint_id}" if inc.endpoint_id else f"svc:{inc.service_id}"
+    key = f"monitor:alert:dedupe:{target}:{inc.state}"
+    return not cache.add(key, 1, timeout=settings.ALERT_DEDUPE_S)
+
+
+def _over_rate_limit(service_id: int) -> bool:
+    key = f"monitor:alert:rate:{service_id}"
+    cache.add(key, 0, timeout=settings.ALERT_RATE_WINDOW_S)
+    try:
+        sent = cache.incr(key)
+    except ValueError:
+        # Key expired between add() and incr(); start a new window.
+        cache.set(key, 1, timeout=settings.ALERT_RATE_WINDOW_S)
+        sent = 1
+    return sent > settings.ALERT_RATE_LIMIT
+
+
+def _payload(inc: Incident) -> dict:
+    return {
+        "incident_id": inc.id,
+        "service": inc.service.name,
+        "service_id": inc.service_id,
+        "endpoint_id": inc.endpoint_id,
+        "endpoint_url": inc.endpoint.url if inc.endpoint_id else None,
+        "previous_state": inc.previous_state,
+        "state": inc.state,
+        "timestamp": inc.timestamp.isoformat(),
+        "details": inc.details,
+    }
+
+
+def dispatch(incident_ids) -> int:
+    """
+    Deliver pending incidents to every ALERT_WEBHOOK_URLS entry, applying
+    dedupe and a per-service rate limit. Returns the number sent.
+    """
+    import httpx  # only worker processes that deliver alerts need it
+
+    pending = (
+        Incident.objects.select_related("service", "endpoint")
+        .filter(id__in=incident_ids, notification=Incident.NOTIFY_PENDING)
+        .order_by("timestamp")
+    )
+    sent = 0
+    with httpx.Client(timeout=settings.ALERT_WEBHOOK_TIMEOUT_S) as client:
+        for inc in pending:
+            if _is_duplicate(inc):
+                inc.notification = Incident.NOTIFY_DEDUPED
+            elif _over_rate_limit(inc.service_id):
+                inc.notification = Incident.NOTIFY_RATE_LIMITED
+            else:
+                inc.notification = Incident.NOTIFY_SENT
+                body = _payload(inc)
+                for url in settings.ALERT_WEBHOOK_URLS:
+                    try:
+                        client.post(url, json=body).raise_for_status()
+                    except Exception as e:
+                        log.warning("Alert webhook %s failed for incident %s: %s", url, inc.id, e)
+                        inc.notification = Incident.NOTIFY_FAILED
+                if inc.notification == Incident.NOTIFY_SENT:
+                    sent += 1
+            inc.save(update_fields=["notification"])
+    return sent
+
+
+def recompute_service_status(services, now=None):
+    """
+    Re-derive ``services``' status from their endpoints' stored state:
+    UNHEALTHY if any is down, else DEGRADED if any is degraded, else HEALTHY.
+    """
+    now = now or timezone.now()
+    ids = [svc.id for svc in services]
+    states = {}
+    for service_id, state in (
+        Endpoint.objects.filter(
+            service_id__in=ids, enabled=True, state__in=(Endpoint.STATE_DOWN, Endpoint.STATE_DEGRADED),
+        ).values_list("service_id", "state").distinct()
+    ):
+        states.setdefault(service_id, set()).add(state)
+    incidents = []
+    for svc in services:
+        found = states.get(svc.id, ())
+        if Endpoint.STATE_DOWN in found:
+            status = SERVICE_UNHEALTHY
+        elif Endpoint.STATE_DEGRADED in found:
+            status = SERVICE_DEGRADED
+        else:
+            status = SERVICE_HEALTHY
+        inc = service_transition(svc, status, now)
+        if inc:
+            incidents.append(inc)
+    return incidents
@@ -0,0 +1,169 @@
+# api/async_views.py
+"""
+Async read paths for ASGI deployments (settings.ASYNC_VIEWS).
+
+GET/HEAD on services, endpoints, results and the service summary are served
+here with Django's async ORM, so one process can hold many concurrent
+dashboard requests without a thread per request. Responses mirror the DRF
+list/detail JSON (same serializers, PageNumberPagination envelope); any
+other method is handed to the regular DRF viewset in a worker thread.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from . import timeseries
+from .models import Service, Endpoint, CheckResult
+from .renderers import dumps
+from .serializers import ServiceSerializer, EndpointSerializer, CheckResultSerializer, requested_fields
+from .views import ServiceViewSet, EndpointViewSet, CheckResultViewSet
+
+READ_METHODS = ("GET", "HEAD")
+NOT_FOUND = "No %s matches the given query."
+
+
+def _json(data, status=200):
+    return HttpResponse(dumps(data), status=status, content_type="application/json")
+
+
+def _serialize_with(serializer_class):
+    """Row serializer for _page(): model instances through ``serializer_class``."""
+    def serialize(request, objs):
+        return serializer_class(objs, many=True, fields=requested_fields(request)).data
+    return serialize
+
+
+async def _page(request, qs, serialize):
+    """PageNumberPagination-compatible page of ``qs`` as a JSON response."""
+    page_size = settings.REST_FRAMEWORK["PAGE_SIZE"]
+    raw = request.GET.get("page", "1")
+    try:
+        number = 1 if raw == "last" else int(raw)
+    except ValueError:
+        number = 0
+
+    count = await qs.acount()
+    pages = max(1, -(-count // page_size))
+    if raw == "last":
+        number = pages
+    if number < 1 or number > pages:
+        return _json({"detail": "Invalid page."}, status=404)
+
+    offset = (number - 1) * page_size
+    objs = [obj async for obj in qs[offset:offset + page_size]]
+
+    url = request.build_absolute_uri()
+    nxt = replace_query_param(url, "page", number + 1) if number < pages else None
+    if number <= 1:
+        prev = None
+    elif number == 2:
+        prev = remove_query_param(url, "page")
+    else:
+        prev = replace_query_param(url, "page", number - 1)
+
+    return _json({
+        "count": count,
+        "next": nxt,
+        "previous": prev,
+        "results": serialize(request, objs),
+    })
+
+
+async def _detail(request, qs, pk, serializer_class):
+    obj = await qs.filter(pk=pk).afirst()
+    if obj is None:
+        return _json({"detail": NOT_FOUND % qs.model._meta.object_name}, status=404)
+    return _json(serializer_class(obj, fields=requested_fields(request)).data)
+
+
+def _async_read(read, fallback):
+    """
+    Build a view that serves GET/HEAD with the async ``read`` coroutine and
+    passes every other method to the DRF ``fallback`` view.
+    """
+    fallback = sync_to_async(fallback)
+
+    @csrf_exempt
+    async def view(request, *args, **kwargs):
+        if request.method in READ_METHODS:
+            return await read(request, *args, **kwargs)
+        return await fallback(request, *args, **kwargs)
+
+    return view
+
+
+async def _service_list(request):
+    return await _page(request, Service.objects.order_by("id"), _serialize_with(ServiceSerializer))
+
+
+async def _service_detail(request, pk):
+    return await _detail(request, Service.objects.all(), pk, ServiceSerializer)
+
+
+async def _service_summary(request, pk):
+    svc = await Service.objects.filter(pk=pk).afirst()
+    if svc is None:
+        return _json({"detail": NOT_FOUND % "Service"}, status=404)
+    endpoints = [ep async for ep in svc.endpoint.order_by("id")]
+    return _json({
+        "service": ServiceSerializer(svc).data,
+        "endpoints": EndpointSerializer(endpoints, many=True, fields=requested_fields(request)).data,
+    })
+
+
+async def _timeseries(request, results):
+    try:
+        start, end, step, pct = timeseries.parse_params(request.GET)
+    except timeseries.TimeseriesError as e:
+        return _json({"detail": str(e)}, status=400)
+    rows = [row async for row in timeseries.aggregate(results, start, end, step, pct)]
+    runs = [run async for run in timeseries.spanning_runs(results, start, end, step)]
+    points = timeseries.to_points(rows, start, end, step, runs)
+    return _json(timeseries.response_body(points, start, end, step, pct))
+
+
+async def _service_timeseries(request, pk):
+    if not await Service.objects.filter(pk=pk).aexists():
+        return _json({"detail": NOT_FOUND % "Service"}, status=404)
+    endpoint_ids = Endpoint.objects.filter(service_id=pk).values("id")
+    return await _timeseries(request, CheckResult.objects.filter(endpoint_id__in=endpoint_ids))
+
+
+async def _endpoint_timeseries(request, pk):
+    if not await Endpoint.objects.filter(pk=pk).aexists():
+        return _json({"detail": NOT_FOUND % "Endpoint"}, status=404)
+    return await _timeseries(request, CheckResult.objects.filter(endpoint_id=pk))
+
+
+async def _endpoint_list(request):
+    return await _page(request, Endpoint.objects.order_by("id"), _serialize_with(EndpointSerializer))
+
+
+async def _endpoint_detail(request, pk):
+    return await _detail(request, Endpoint.objects.all(), pk, EndpointSerializer)
+
+
+async def _result_list(request):
+    qs = CheckResultSerializer.values_queryset(CheckResult.objects.order_by("-id"), requested_fields(request))
+    return await _page(request, qs, lambda request, rows: CheckResultSerializer.from_values(rows))
+
+
+async def _result_detail(request, pk):
+    return await _detail(request, CheckResult.objects.all(), pk, CheckResultSerializer)
+
+
+service_list = _async_read(_service_list, ServiceViewSet.as_view({"get": "list", "post": "create"}))
+service_detail = _async_read(_service_detail, ServiceViewSet.as_view({
+    "get": "retrieve", "put": "update", "patch": "partial_update", "delete": "destroy",
+}))
+service_summary = _async_read(_service_summary, ServiceViewSet.as_view({"get": "summary"}))
+service_timeseries = _async_read(_service_timeseries, ServiceViewSet.as_view({"get": "timeseries"}))
+endpoint_timeseries = _async_read(_endpoint_timeseries, EndpointViewSet.as_view({"get": "timeseries"}))
+endpoint_list = _async_read(_endpoint_list, EndpointViewSet.as_view({"get": "list", "post": "create"}))
+endpoint_detail = _async_read(_endpoint_detail, EndpointViewSet.as_view({
+    "get": "retrieve", "put": "update", "patch": "partial_update", "delete": "destroy",
+}))
+result_list = _async_read(_result_list, CheckResultViewSet.as_view({"get": "list"}))
+result_detail = _async_read(_result_detail, CheckResultViewSet.as_view({"get": "retrieve"}))
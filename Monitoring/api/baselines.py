@@ -0,0 +1,71 @@
+# api/baselines.py
+"""
+Streaming latency baselines per endpoint.
+
+Each successful check updates, in O(1) and on the Endpoint row itself, an
+exponentially weighted mean and variance of its latency plus a weighted mean
+per UTC hour of day (seasonal buckets), so a service that is always slower
+during its nightly batch is compared with its own nights. No history is
+re-scanned.
+
+A sample is anomalous once the baseline has LATENCY_WARMUP_SAMPLES behind it
+and the latency is above the expected value (hour bucket, else overall mean)
+by LATENCY_ANOMALY_SIGMA standard deviations, by LATENCY_ANOMALY_RATIO times
+and by LATENCY_ANOMALY_MIN_MS. LATENCY_ANOMALY_STREAK anomalous checks in a
+row make the endpoint DEGRADED. Anomalous samples are folded in at a tenth
+of the weight, so a lasting shift becomes the new normal only slowly.
+"""
+import math
+
+from django.conf import settings
+
+SEASONAL_BUCKETS = 24
+ANOMALY_WEIGHT = 0.1
+
+
+def expected_ms(ep, now):
+    """Baseline latency for ``ep`` at ``now``: its hour-of-day mean if seen, else its overall mean."""
+    hourly = ep.latency_hourly or ()
+    bucket = hourly[now.hour] if len(hourly) == SEASONAL_BUCKETS else None
+    return bucket if bucket is not None else ep.latency_mean_ms
+
+
+def observe(ep, latency_ms, now) -> bool:
+    """
+    Fold one successful check's latency into ``ep``'s baseline (in place) and
+    return whether the endpoint is now degraded.
+    """
+    x = float(latency_ms)
+    anomalous = _anomalous(ep, x, now)
+    weight = ANOMALY_WEIGHT if anomalous else 1.0
+
+    # Exponentially weighted mean and variance (West/Finch incremental form).
+    alpha = settings.LATENCY_EWMA_ALPHA * weight
+    if ep.latency_mean_ms is None:
+        ep.latency_mean_ms, ep.latency_var = x, 0.0
+    else:
+        diff = x - ep.latency_mean_ms
+        incr = alpha * diff
+        ep.latency_mean_ms += incr
+        ep.latency_var = (1 - alpha) * ((ep.latency_var or 0.0) + diff * incr)
+    ep.latency_samples = (ep.latency_samples or 0) + 1
+
+    hourly = list(ep.latency_hourly or [None] * SEASONAL_BUCKETS)
+    prev = hourly[now.hour]
+    hourly[now.hour] = x if prev is None else prev + settings.LATENCY_SEASONAL_ALPHA * weight * (x - prev)
+    ep.latency_hourly = hourly
+
+    ep.latency_anomalies = (ep.latency_anomalies or 0) + 1 if anomalous else 0
+    return ep.latency_anomalies >= settings.LATENCY_ANOMALY_STREAK
+
+
+def _anomalous(ep, x, now) -> bool:
+    if (ep.latency_samples or 0) < settings.LATENCY_WARMUP_SAMPLES:
+        return False
+    expected = expected_ms(ep, now)
+    sd = math.sqrt(max(ep.latency_var or 0.0, 0.0))
+    return (
+        x > expected + settings.LATENCY_ANOMALY_SIGMA * sd
+        and x > expected * settings.LATENCY_ANOMALY_RATIO
+        and x - expected > settings.LATENCY_ANOMALY_MIN_MS
+    )
@@ -1,146 +1,376 @@
 # api/checks.py
 import asyncio
 import logging
-import random
-import time
 
-import httpx
-from django.db import transaction
+from django.conf import settings
+from django.db import connection, transaction
 from django.utils import timezone
 
-from .models import Endpoint, CheckResult, Service
-from .metrics import check_total, latency_ms, response_status
+from . import alerts, baselines, events
+from .config_cache import EndpointConfigCache
+from .instrumentation import QueryTracker
+from .models import Endpoint, CheckResult, Service, Incident
+from .profiling import profiled
+from .writer import write_lock
+from .metrics import (
+    check_total, endpoint_degraded, latency_baseline_ms, latency_ms, probes_deferred, response_status,
+)
+from .probe import MAX_CONCURRENCY, RETRY_COUNT, RateLimiter, SharedRateLimiter, fetch_results, host_of
 
 log = logging.getLogger(__name__)
 
-# Tunables
-MAX_CONCURRENCY = 20
-RETRY_COUNT = 1                 
-BACKOFF_BASE_S = 0.2           
-SCHED_JITTER_S = 0.5        
+# Columns the checker reads fresh each time; the rest comes from the config cache.
+RUNTIME_COLUMNS = (
+    "id", "state", "state_changed_at", "next_run_at", "current_result_id",
+    "latency_mean_ms", "latency_var", "latency_samples", "latency_hourly", "latency_anomalies",
+)
+# Runtime columns record_results writes back.
+BASELINE_FIELDS = ["latency_mean_ms", "latency_var", "latency_samples", "latency_hourly", "latency_anomalies"]
 
+# Tunables
+TICK_BATCH = 500
+AGENT_LEASE_MAX = 1000
 
-def _now_ms() -> int:
-    return int(time.time() * 1000)
+# Endpoint configuration kept between ticks (see api.config_cache).
+_config = EndpointConfigCache()
+# Per-service/per-host probe budgets, kept between ticks and shared by every
+# checker process through Redis when PROBE_LIMIT_REDIS_URL is set.
+_limiter = SharedRateLimiter(settings.PROBE_LIMIT_REDIS_URL) if settings.PROBE_LIMIT_REDIS_URL else RateLimiter()
 
 
 def _labels_for(ep: Endpoint) -> dict:
-    return {"service": ep.service.name, "endpoint_id": str(ep.id), "method": ep.method}
+    # Connect and HEAD probes are labelled by kind (TCP, TLS, HEAD), not the configured method.
+    method = ep.method if ep.kind == Endpoint.KIND_HTTP else ep.kind.upper()
+    return {"service": ep.service.name, "endpoint_id": str(ep.id), "method": method}
+
+
+def _limits_for(ep: Endpoint):
+    svc = ep.service
+    return (
+        (("service", ep.service_id),
+         svc.probe_rate_per_s or settings.PROBE_SERVICE_RATE_PER_S,
+         svc.probe_burst or settings.PROBE_SERVICE_BURST),
+        (("host", host_of(ep.url)), settings.PROBE_HOST_RATE_PER_S, settings.PROBE_HOST_BURST),
+    )
 
 
-async def _probe(client: httpx.AsyncClient, ep: Endpoint):
+def _admit(endpoints):
     """
-    Single probe attempt. Returns tuple:
-    (ok: bool, status_code: int, elapsed_ms: int, details: str)
+    Split due endpoints into those within their rate limits and those over
+    them. The latter are not probed now but pushed back: by the limiter's
+    wait, spaced at the service's rate behind earlier deferrals so they do
+    not all come back in one burst.
     """
-    start = _now_ms()
-    try:
-        method = (ep.method or "GET").upper()
-        timeout_s = max(0.001, (ep.timeout_ms or 5000) / 1000.0)
-
-        r = await client.request(
-            method,
-            ep.url,
-            headers=ep.headers or {},
-            timeout=httpx.Timeout(timeout_s),
-            follow_redirects=True,
-        )
-        elapsed = _now_ms() - start
-        ok = (r.status_code == (ep.expected_status or 200))
-        if not ok:
-            return False, r.status_code, elapsed, f"Expected {ep.expected_status} got {r.status_code}"
-        return True, r.status_code, elapsed, ""
-    except Exception as e:
-        elapsed = _now_ms() - start
-        return False, 0, elapsed, str(e)
+    admitted, deferred = [], []
+    queued = {}
+    now = timezone.now()
+    for ep in endpoints:
+        limits = _limits_for(ep)
+        wait = _limiter.acquire(limits)
+        if not wait:
+            admitted.append(ep)
+            continue
+        (_, rate, _) = limits[0]
+        position = queued[ep.service_id] = queued.get(ep.service_id, 0) + 1
+        ep.next_run_at = now + timezone.timedelta(seconds=wait + (position - 1) / rate)
+        deferred.append(ep)
+    if deferred:
+        with write_lock("defer"):
+            Endpoint.objects.bulk_update(deferred, ["next_run_at"])
+        probes_deferred.inc(len(deferred))
+        log.info("Deferred %d probe(s) over their rate limits", len(deferred))
+    return admitted
 
 
-async def _probe_with_retry(client: httpx.AsyncClient, ep: Endpoint):
-    ok, code, rtt, details = await _probe(client, ep)
-    if not ok and RETRY_COUNT > 0:
-        await asyncio.sleep(BACKOFF_BASE_S + random.random() * 0.3)
-        ok2, code2, rtt2, details2 = await _probe(client, ep)
-        ok, code, rtt, details = ok2, (code2 or code), (rtt2 or rtt), (details2 or details)
-    return ok, code, rtt, details
+def retry_admitted(ep) -> bool:
+    """Whether a retry of ``ep`` may go out now; takes its rate-limit tokens if so."""
+    return RETRY_COUNT > 0 and _limiter.acquire(_limits_for(ep)) == 0
 
 
-async def _fetch_results(endpoints):
+async def probe_now(endpoints):
     """
-    Run all probes concurrently with a connection limit.
+    Ad-hoc probes for the API (single attempt each, nothing persisted). All
+    endpoints run concurrently, so a batch takes about as long as its slowest probe.
     """
-    limits = httpx.Limits(max_connections=MAX_CONCURRENCY)
-    async with httpx.AsyncClient(limits=limits) as client:
-        tasks = [_probe_with_retry(client, ep) for ep in endpoints]
-        return await asyncio.gather(*tasks)
+    return await fetch_results(endpoints, retry=False)
 
 
-def run_due_checks() -> int:
+def run_due_checks(tier=None) -> int:
     """
     Synchronous entrypoint (safe for Celery workers):
-      1) Read due endpoints (sync ORM)
+      1) Read due endpoint ids (sync ORM); configuration comes from the config cache
       2) Probe concurrently (async httpx via asyncio.run)
-      3) Persist results + schedule next runs (sync ORM)
-      4) Update service statuses (simple aggregation)
-    """
-    # ---- 1) SYNC ORM: select due endpoints
-    due = list(
-        Endpoint.objects.select_related("service")
-        .filter(enabled=True, next_run_at__lte=timezone.now())
-        .order_by("next_run_at")[:500]
-    )
+      3) Record the outcomes (see record_results)
+
+    ``tier`` limits the tick to one of settings.CHECK_TIERS, with that tier's
+    batch size and concurrency; None checks every tier.
+
+    Query count and DB time of each tick are logged on the ``api.queries`` logger,
+    and ticks can be profiled (see api.profiling).
+    """
+    name = f"run_due_checks[{tier}]" if tier else "run_due_checks"
+    with profiled("tick", name), QueryTracker(name, log_level=logging.INFO):
+        return _run_due_checks(tier)
+
+
+def _run_due_checks(tier=None) -> int:
+    cfg = settings.CHECK_TIERS[tier] if tier else {}
+
+    # ---- 1) SYNC ORM: which endpoints are due, within their rate limits
+    due = due_endpoints(tier, cfg.get("batch", TICK_BATCH))
     if not due:
         return 0
 
     # ---- 2) ASYNC IO: probe concurrently
+    def probes():
+        return fetch_results(
+            due, max_concurrency=cfg.get("concurrency", MAX_CONCURRENCY),
+            limiter=_limiter, limits_for=_limits_for,
+        )
+
     try:
-        results = asyncio.run(_fetch_results(due))
+        results = asyncio.run(probes())
     except RuntimeError:
         # If we're somehow already inside a running loop (shouldn't happen in Celery),
         # create a fresh loop explicitly.
         loop = asyncio.new_event_loop()
         try:
-            results = loop.run_until_complete(_fetch_results(due))
+            results = loop.run_until_complete(probes())
         finally:
             loop.close()
 
-    # ---- 3) SYNC ORM: persist results + schedule next runs
-    with transaction.atomic():
-        touched_service_ids = set()
+    # ---- 3) Persist, detect transitions, reschedule
+    return record_results(due, results)
+
+
+def due_endpoints(tier=None, limit=TICK_BATCH, exclude=()):
+    """
+    Up to ``limit`` due endpoints (optionally of one ``tier``, skipping ids in
+    ``exclude``) that are within their rate limits. Only ids and runtime
+    state are read from the DB; configuration comes from the config cache.
+    """
+    qs = Endpoint.objects.filter(enabled=True, mode=Endpoint.MODE_POLL, next_run_at__lte=timezone.now())
+    if tier:
+        qs = qs.filter(Endpoint.in_tier(tier))
+    # Excluded ids are overdue too, so they sit at the front of the ordering.
+    rows = qs.order_by("next_run_at").values_list(*RUNTIME_COLUMNS)[:limit + len(exclude)]
+    rows = [row for row in rows if row[0] not in exclude][:limit]
+    return _admit(_load_endpoints(rows))
+
 
-        for ep, (ok, code, rtt, details) in zip(due, results):
-            # Prometheus metrics
-            labels = {"service": ep.service.name, "endpoint_id": str(ep.id), "method": ep.method}
-            check_total.labels(**labels, success="true" if ok else "false").inc()
-            latency_ms.labels(**labels).observe(float(rtt))
-            response_status.labels(**labels, status_code=str(code or 0)).inc()
+def _load_endpoints(rows):
+    """
+    Endpoints from the config cache for RUNTIME_COLUMNS rows, with the
+    runtime fields taken from the rows.
+    """
+    if not rows:
+        return []
+    runtime = {row[0]: row[1:] for row in rows}
+    endpoints = _config.get_many([row[0] for row in rows])
+    for ep in endpoints:
+        for name, value in zip(RUNTIME_COLUMNS[1:], runtime[ep.id]):
+            setattr(ep, name, value)
+    return endpoints
+
+
+def _current_runs(due):
+    """
+    Current result rows of ``due`` by id when storing changes only
+    (settings.RESULT_STORAGE = "changes"), else None.
+    """
+    if settings.RESULT_STORAGE != "changes":
+        return None
+    return CheckResult.objects.in_bulk([ep.current_result_id for ep in due if ep.current_result_id])
+
+
+def record_results(due, results) -> int:
+    """
+    Persist probe outcomes ``results`` (``(ok, status_code, elapsed_ms,
+    details)`` tuples, aligned with the Endpoint list ``due``):
+      1) Metrics, result rows, state transitions against stored endpoint state
+         + next runs
+      2) Results/incidents in bulk, service status derived from endpoint states
+      3) Publish state changes; alerts are dispatched by a Celery task
+    Shared by the Celery checker, probe agent ingestion and push heartbeats.
 
-            # DB row
-            CheckResult.objects.create(
+    With settings.RESULT_STORAGE = "changes", a check that repeats the
+    outcome of the endpoint's current row is counted into that row
+    (CheckResult.repeat_count and latency aggregates) instead of adding one.
+    """
+    # ---- 1) Results, state transitions (O(1) against stored state) + next runs
+    now = timezone.now()
+    rows, incidents, status_events = [], [], []
+    runs, extended, started = _current_runs(due), [], []
+    for ep, (ok, code, rtt, details) in zip(due, results):
+        # Prometheus metrics
+        labels = _labels_for(ep)
+        check_total.labels(**labels, success="true" if ok else "false").inc()
+        latency_ms.labels(**labels).observe(float(rtt))
+        response_status.labels(**labels, status_code=str(code or 0)).inc()
+
+        run = runs.get(ep.current_result_id) if runs else None
+        if run is not None and run.extends_run(
+            bool(ok), code or 0, now,
+            max_gap_s=3 * max(1, ep.interval_sec or 60),
+            heartbeat_s=settings.RESULT_HEARTBEAT_S,
+        ):
+            run.add_check(int(rtt), now)
+            extended.append(run)
+        else:
+            row = CheckResult(
                 endpoint=ep,
                 status_code=code or 0,
                 response_time_ms=int(rtt),
                 success=bool(ok),
                 details=(details[:2000] if details else None),
             )
+            rows.append(row)
+            if runs is not None:
+                started.append((ep, row))
 
-            # Schedule next run (with jitter)
-            next_run = timezone.now() + timezone.timedelta(seconds=max(1, ep.interval_sec or 60))
-            if SCHED_JITTER_S:
-                next_run += timezone.timedelta(seconds=random.uniform(0, SCHED_JITTER_S))
-            ep.next_run_at = next_run
-            ep.save(update_fields=["next_run_at"])
+        # Latency baseline of successful checks; drifting far above it means DEGRADED
+        degraded = False
+        if ok:
+            degraded = baselines.observe(ep, rtt, now)
+            latency_baseline_ms.labels(**labels).set(baselines.expected_ms(ep, now))
 
-            touched_service_ids.add(ep.service_id)
+        previous = ep.state
+        inc = alerts.endpoint_transition(ep, ok, now, details, degraded=degraded)
+        if inc:
+            incidents.append(inc)
+        # Follows the state, so a degraded endpoint that goes down clears it.
+        endpoint_degraded.labels(**labels).set(1 if ep.state == Endpoint.STATE_DEGRADED else 0)
+        if ep.state != previous:
+            status_events.append({
+                "type": "endpoint", "id": ep.id, "service_id": ep.service_id,
+                "state": ep.state, "previous": previous, "status_code": code or 0,
+                "response_time_ms": int(rtt), "timestamp": now,
+            })
 
+        if ep.mode == Endpoint.MODE_PUSH:
+            # For push endpoints next_run_at is the next heartbeat deadline
+            ep.next_run_at = ep.heartbeat_deadline(now)
+            continue
+        # Schedule next run on the endpoint's phase (see Endpoint.next_slot): the
+        # first slot at least half an interval after the run was due, so neither
+        # write latency nor a deferred or leased run shifts it by a whole interval
+        due_at = min(ep.next_run_at or now, now)
+        half = timezone.timedelta(seconds=max(1, ep.interval_sec or 60) / 2)
+        ep.next_run_at = ep.next_slot(max(due_at + half, now))
 
-        # ---- 4) Update service statuses (simple rule over last N checks)
-        for sid in touched_service_ids:
-            svc = Service.objects.get(pk=sid)
-            last10 = list(
-                CheckResult.objects.filter(endpoint__service=sid).order_by("-timestamp")[:10]
+    # ---- 2) SYNC ORM: persist in bulk, then derive service status from endpoint states
+    touched_service_ids = {ep.service_id for ep in due}
+    with write_lock("record_results"), transaction.atomic():
+        CheckResult.objects.bulk_create(rows)
+        fields = ["next_run_at", "state", "state_changed_at", *BASELINE_FIELDS]
+        if runs is not None:
+            CheckResult.objects.bulk_update(
+                extended, ["repeat_count", "latency_sum_ms", "latency_max_ms", "last_timestamp"]
             )
-            svc.status = "UNHEALTHY" if any(not c.success for c in last10) else "HEALTHY"
-            svc.last_checked = timezone.now()
-            svc.save(update_fields=["status", "last_checked"])
+            for ep, row in started:
+                ep.current_result = row
+            fields.append("current_result")
+        Endpoint.objects.bulk_update(due, fields)
+
+        services = list(Service.objects.filter(pk__in=touched_service_ids))
+        previous_status = {svc.id: svc.status for svc in services}
+        svc_incidents = alerts.recompute_service_status(services, now)
+        Service.objects.bulk_update(services, ["status", "last_checked"])
+        for svc in services:
+            if svc.status != previous_status[svc.id]:
+                status_events.append({
+                    "type": "service", "id": svc.id, "service_id": svc.id, "name": svc.name,
+                    "state": svc.status, "previous": previous_status[svc.id], "timestamp": now,
+                })
+
+        incidents.extend(svc_incidents)
+        Incident.objects.bulk_create(incidents)
+        alerts.dispatch_on_commit(incidents)
+
+    # ---- 3) Push state changes to live status streams (after commit)
+    events.publish(status_events)
 
     return len(due)
+
+
+# ---------- Probe agents ----------
+
+def lease_due(limit, lease_s, tier=None):
+    """
+    Hand up to ``limit`` due endpoints (optionally of one ``tier``) to a probe
+    agent. Their next_run_at is pushed to the end of the lease, so neither the
+    checker nor another agent picks them up meanwhile; if the agent never
+    reports back, they simply become due again when the lease runs out.
+    Endpoints over their rate limits are deferred rather than leased.
+    """
+    limit = max(1, min(int(limit), AGENT_LEASE_MAX))
+    now = timezone.now()
+    lease_until = now + timezone.timedelta(seconds=max(1, int(lease_s)))
+    with write_lock("lease_due"), transaction.atomic():
+        qs = (
+            Endpoint.objects.filter(enabled=True, mode=Endpoint.MODE_POLL, next_run_at__lte=now)
+            .order_by("next_run_at")
+        )
+        if tier:
+            qs = qs.filter(Endpoint.in_tier(tier))
+        if connection.features.has_select_for_update_skip_locked:
+            # Lock only endpoint rows, not the services joined in for the tier.
+            of = ("self",) if connection.features.has_select_for_update_of else ()
+            qs = qs.select_for_update(skip_locked=True, of=of)
+        ids = list(qs.values_list("id", flat=True)[:limit])
+        endpoints = _admit(_config.get_many(ids))
+        Endpoint.objects.filter(pk__in=[ep.id for ep in endpoints]).update(next_run_at=lease_until)
+    return endpoints, lease_until
+
+
+def ingest_results(reported):
+    """
+    Record results pushed by a probe agent: ``reported`` is a list of dicts
+    with ``id``, ``ok``, ``status_code``, ``response_time_ms`` and optional
+    ``details``. Unknown endpoint ids are skipped. Returns the number stored.
+    """
+    outcomes = {}
+    for r in reported:
+        outcomes[int(r["id"])] = (
+            bool(r.get("ok")),
+            int(r.get("status_code") or 0),
+            int(r.get("response_time_ms") or 0),
+            str(r.get("details") or ""),
+        )
+    return record_outcomes(outcomes, Endpoint.MODE_POLL)
+
+
+def record_outcomes(outcomes, mode) -> int:
+    """
+    Record ``{endpoint_id: outcome}`` for enabled endpoints of ``mode``;
+    other ids are skipped. Returns the number stored.
+    """
+    due = _load_endpoints(list(
+        Endpoint.objects.filter(pk__in=list(outcomes), enabled=True, mode=mode)
+        .values_list(*RUNTIME_COLUMNS)
+    ))
+    if not due:
+        return 0
+    return record_results(due, [outcomes[ep.id] for ep in due])
+
+
+# ---------- Push heartbeats (see api.heartbeats) ----------
+
+def missed_heartbeats(limit=TICK_BATCH) -> int:
+    """
+    Record a failed check for up to ``limit`` enabled push endpoints whose
+    heartbeat deadline has passed; each gets a new deadline one grace period
+    on, so a silent endpoint keeps failing at that pace. Returns the count.
+    """
+    now = timezone.now()
+    due = _load_endpoints(list(
+        Endpoint.objects.filter(enabled=True, mode=Endpoint.MODE_PUSH, next_run_at__lte=now)
+        .order_by("next_run_at").values_list(*RUNTIME_COLUMNS)[:limit]
+    ))
+    if not due:
+        return 0
+    results = [
+        (False, 0, 0, f"No heartbeat in {max(1, ep.interval_sec or 60) * settings.HEARTBEAT_GRACE:g}s")
+        for ep in due
+    ]
+    return record_results(due, results)
@@ -0,0 +1,55 @@
+# api/config_cache.py
+"""
+In-process cache of endpoint configuration for the checker.
+
+Endpoint/Service configuration changes rarely, so the checker keeps the
+loaded Endpoint objects (with their Service) between ticks and only asks
+the DB which ids are due. Saves through the API, admin or registration
+replace a version token in the shared Django cache (see api.signals); a
+worker that sees a new token drops everything it has cached.
+CONFIG_CACHE_MAX_AGE_S bounds staleness when the cache is not shared
+between processes (the default LocMemCache).
+"""
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Endpoint
+
+VERSION_KEY = "monitor:endpoint-config-version"
+
+
+def bump_version():
+    # A random token rather than a counter: after a cache flush a counter
+    # could restart at a value a worker already holds.
+    cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+
+
+class EndpointConfigCache:
+    def __init__(self):
+        self._endpoints = {}
+        self._version = None
+        self._loaded_at = 0.0
+
+    def _validate(self):
+        version = cache.get(VERSION_KEY)
+        expired = time.monotonic() - self._loaded_at > settings.CONFIG_CACHE_MAX_AGE_S
+        if version != self._version or expired:
+            self._endpoints = {}
+            self._version = version
+            self._loaded_at = time.monotonic()
+
+    def get_many(self, ids):
+        """Endpoints for ``ids`` in the given order; loads only the ones not cached."""
+        self._validate()
+        missing = [i for i in ids if i not in self._endpoints]
+        if missing:
+            for ep in Endpoint.objects.select_related("service").filter(pk__in=missing):
+                self._endpoints[ep.id] = ep
+        return [self._endpoints[i] for i in ids if i in self._endpoints]
+
+    def clear(self):
+        self._endpoints = {}
+        self._version = None
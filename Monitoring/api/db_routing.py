@@ -0,0 +1,163 @@
+# api/db_routing.py
+"""
+Read replicas for the API.
+
+ReplicaReadsMiddleware sends the reads of GET/HEAD requests (viewsets,
+summaries, time series, the admin changelists) to a replica from
+settings.DATABASE_REPLICAS; ReplicaRouter does the routing. Everything else
+(writes, unsafe requests, the checker, Celery tasks, management commands)
+uses ``default``.
+
+Unsafe requests read from the primary too: they read what they are about to
+write. Read-your-writes: a request that writes reads from the primary for the
+rest of its life, and a client whose request wrote (and succeeded) is pinned
+to the primary for REPLICA_PIN_S afterwards, by cookie (browsers, the admin)
+and by its Authorization header (API clients, which may keep no cookies).
+Client addresses are never used: behind a proxy or NAT they are shared.
+Machine ingest views (heartbeats, agents, probes) are marked with ``no_pin``:
+their callers do not read back what they wrote.
+"""
+import contextvars
+import hashlib
+import random
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+
+PIN_COOKIE = "db_pin"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+# Small tables written outside of any request we could pin (logins, sessions).
+PRIMARY_APPS = {"auth", "sessions"}
+
+
+class _Route:
+    """Where the current request reads from, and whether it has written.
+    Mutable, so a write made in a sync_to_async thread still pins the request."""
+
+    __slots__ = ("alias", "wrote")
+
+    def __init__(self, alias):
+        self.alias = alias
+        self.wrote = False
+
+
+_route = contextvars.ContextVar("api_db_route", default=None)
+
+
+@contextmanager
+def use_primary():
+    """Read from ``default`` inside the block, e.g. right after a write elsewhere."""
+    token = _route.set(_Route(None))
+    try:
+        yield
+    finally:
+        _route.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        route = _route.get()
+        if route is None or model._meta.app_label in PRIMARY_APPS:
+            return None
+        return route.alias
+
+    def db_for_write(self, model, **hints):
+        route = _route.get()
+        if route is not None:
+            route.alias, route.wrote = None, True
+        # Explicit, or instances read from a replica would be saved back to it.
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == "default"
+
+
+def no_pin(view):
+    """Mark a view whose writes do not pin its caller to the primary."""
+    view.replica_pin = False
+    return view
+
+
+def _pin_key(request):
+    """Cache key pinning the caller's credentials; None without an Authorization header."""
+    auth = request.META.get("HTTP_AUTHORIZATION", "")
+    if not auth:
+        return None
+    return f"api:dbpin:{hashlib.sha256(auth.encode()).hexdigest()}"
+
+
+class ReplicaReadsMiddleware:
+    """Routes reads of safe, unpinned requests to a replica; pins clients after writes."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.replicas = list(getattr(settings, "DATABASE_REPLICAS", ()))
+        if not self.replicas:
+            raise MiddlewareNotUsed()
+        self.pin_s = settings.REPLICA_PIN_S
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        route = self._route(request, self._pinned(request))
+        token = _route.set(route)
+        try:
+            response = self.get_response(request)
+        finally:
+            _route.reset(token)
+        if self._pins(request, route, response):
+            key = _pin_key(request)
+            if key:
+                cache.set(key, 1, self.pin_s)
+            self._set_cookie(response)
+        return response
+
+    async def __acall__(self, request):
+        pinned = await sync_to_async(self._pinned)(request)
+        route = self._route(request, pinned)
+        token = _route.set(route)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _route.reset(token)
+        if self._pins(request, route, response):
+            key = _pin_key(request)
+            if key:
+                await sync_to_async(cache.set)(key, 1, self.pin_s)
+            self._set_cookie(response)
+        return response
+
+    def _route(self, request, pinned):
+        if pinned or request.method not in SAFE_METHODS:
+            return _Route(None)
+        return _Route(random.choice(self.replicas))
+
+    @staticmethod
+    def _pinned(request):
+        if request.COOKIES.get(PIN_COOKIE):
+            return True
+        key = _pin_key(request)
+        return bool(key and cache.get(key))
+
+    @staticmethod
+    def _pins(request, route, response):
+        """Whether the request wrote, succeeded and was not made by a ``no_pin`` view."""
+        if not route.wrote or not 200 <= response.status_code < 300:
+            return False
+        match = getattr(request, "resolver_match", None)
+        return match is None or getattr(match.func, "replica_pin", True)
+
+    def _set_cookie(self, response):
+        response.set_cookie(PIN_COOKIE, "1", max_age=self.pin_s, httponly=True, samesite="Lax")
@@ -0,0 +1,134 @@
+# api/events.py
+"""
+Live status events, fanned out through Redis pub/sub.
+
+The checker publishes endpoint/service events after each tick; every web
+process holds a single Redis subscription and hands events to its local
+stream subscribers, so Redis and the DB see one reader per process rather
+than one per dashboard viewer.
+"""
+import asyncio
+import json
+import logging
+import weakref
+
+from django.conf import settings
+
+log = logging.getLogger(__name__)
+
+CHANNEL = "monitor:status"
+
+_sync_client = None
+
+
+def _redis():
+    global _sync_client
+    if _sync_client is None:
+        import redis
+        _sync_client = redis.Redis.from_url(
+            settings.MONITOR_EVENTS_REDIS_URL, socket_connect_timeout=1, socket_timeout=1,
+        )
+    return _sync_client
+
+
+def publish(events):
+    """
+    Publish a batch of event dicts (each with a ``type`` key) as one message.
+    Failures are logged and swallowed: live updates must never break a tick.
+    """
+    if not events or not settings.MONITOR_EVENTS_REDIS_URL:
+        return
+    try:
+        _redis().publish(CHANNEL, json.dumps(events, default=str))
+    except Exception as e:
+        log.warning("Could not publish %d status event(s): %s", len(events), e)
+
+
+class _Hub:
+    """One Redis subscription per process/event loop, fanned out to local queues."""
+
+    QUEUE_SIZE = 1000
+
+    def __init__(self):
+        self.queues = set()
+        self._task = None
+
+    def subscribe(self) -> asyncio.Queue:
+        q = asyncio.Queue(maxsize=self.QUEUE_SIZE)
+        self.queues.add(q)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._listen())
+        return q
+
+    def unsubscribe(self, q):
+        self.queues.discard(q)
+        if not self.queues and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _fan_out(self, events):
+        for q in list(self.queues):
+            try:
+                q.put_nowait(events)
+            except asyncio.QueueFull:
+                # A stalled client loses this batch; it resyncs from the REST API.
+                log.warning("Dropping status events for a slow stream subscriber")
+
+    async def _listen(self):
+        import redis.asyncio as aioredis
+
+        while self.queues:
+            client = aioredis.from_url(settings.MONITOR_EVENTS_REDIS_URL)
+            pubsub = client.pubsub()
+            try:
+                await pubsub.subscribe(CHANNEL)
+                async for msg in pubsub.listen():
+                    if msg.get("type") != "message":
+                        continue
+                    try:
+                        self._fan_out(json.loads(msg["data"]))
+                    except ValueError:
+                        log.warning("Ignoring malformed status event")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning("Status event subscription lost (%s); reconnecting", e)
+                await asyncio.sleep(1)
+            finally:
+                await pubsub.aclose()
+                await client.aclose()
+
+
+_hubs = weakref.WeakKeyDictionary()
+
+
+def hub() -> _Hub:
+    # Redis asyncio connections are bound to the loop that created them.
+    loop = asyncio.get_running_loop()
+    if loop not in _hubs:
+        _hubs[loop] = _Hub()
+    return _hubs[loop]
+
+
+async def stream(service_id=None, keepalive=15.0):
+    """
+    Async generator of Server-Sent Events. ``service_id`` restricts the stream
+    to one service; a comment line is sent every ``keepalive`` seconds so
+    proxies keep idle connections open.
+    """
+    h = hub()
+    q = h.subscribe()
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            try:
+                events = await asyncio.wait_for(q.get(), timeout=keepalive)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            for ev in events:
+                if service_id is not None and ev.get("service_id") != service_id:
+                    continue
+                yield f"event: {ev['type']}\ndata: {json.dumps(ev)}\n\n"
+    finally:
+        h.unsubscribe(q)
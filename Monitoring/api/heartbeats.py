@@ -0,0 +1,85 @@
+# api/heartbeats.py
+"""
+Push-mode monitoring: services send heartbeats instead of being probed.
+
+``receive()`` only keeps the latest beat per endpoint in a Redis hash, so the
+ingest view never touches the database. ``sweep()``, a Celery beat task every
+HEARTBEAT_SWEEP_S, drains the hash and records every buffered beat in one
+batch (api.checks.record_results), then fails push endpoints whose heartbeat
+deadline (next_run_at) has passed.
+
+Without Redis (HEARTBEAT_REDIS_URL empty) every beat is recorded as it
+arrives, one database write per ingest request. That fallback is for
+development only; if a configured Redis is unreachable it is used too, and
+logged as an error.
+"""
+import json
+import logging
+
+from django.conf import settings
+
+from .metrics import heartbeats_received
+
+log = logging.getLogger(__name__)
+
+BUFFER_KEY = "monitor:heartbeats"
+
+_client = None
+
+
+def _redis():
+    global _client
+    if _client is None:
+        import redis
+        _client = redis.Redis.from_url(
+            settings.HEARTBEAT_REDIS_URL, socket_connect_timeout=1, socket_timeout=1,
+        )
+    return _client
+
+
+def receive(beats) -> int:
+    """
+    Accept ``{endpoint_id: (ok, status_code, response_time_ms, details)}``.
+    Beats are buffered until the next sweep; if Redis is not configured or
+    unreachable they are recorded right away instead. Either way the count
+    returned is the number of endpoints whose beat was accepted; ids that
+    are not enabled push endpoints are dropped when the beats are recorded.
+    """
+    if not beats:
+        return 0
+    heartbeats_received.inc(len(beats))
+    if settings.HEARTBEAT_REDIS_URL:
+        try:
+            _redis().hset(BUFFER_KEY, mapping={ep_id: json.dumps(b) for ep_id, b in beats.items()})
+            return len(beats)
+        except Exception as e:
+            log.error("Could not buffer %d heartbeat(s), recording them directly: %s", len(beats), e)
+    _record(beats)
+    return len(beats)
+
+
+def drain() -> dict:
+    """Take every buffered beat out of Redis: ``{endpoint_id: outcome}``."""
+    if not settings.HEARTBEAT_REDIS_URL:
+        return {}
+    pipe = _redis().pipeline(transaction=True)
+    pipe.hgetall(BUFFER_KEY)
+    pipe.delete(BUFFER_KEY)
+    raw, _ = pipe.execute()
+    return {int(ep_id): tuple(json.loads(b)) for ep_id, b in raw.items()}
+
+
+def sweep() -> dict:
+    """Record buffered beats, then missed heartbeats. Returns counts of each."""
+    from .checks import missed_heartbeats
+
+    recorded = _record(drain())
+    missed = missed_heartbeats()
+    return {"recorded": recorded, "missed": missed}
+
+
+def _record(beats) -> int:
+    from .checks import record_outcomes
+    from .models import Endpoint
+
+    return record_outcomes(beats, Endpoint.MODE_PUSH) if beats else 0
@@ -0,0 +1,161 @@
+# api/instrumentation.py
+import contextvars
+import logging
+import time
+from contextlib import ContextDecorator
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+log = logging.getLogger("api.queries")
+
+# Trackers active in the current context. A context variable rather than a
+# per-connection wrapper, so queries that async views run through
+# sync_to_async threads are still attributed to the request that made them.
+_active = contextvars.ContextVar("api_query_trackers", default=())
+
+
+def _track(execute, sql, params, many, context):
+    trackers = _active.get()
+    if not trackers:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        took = (time.perf_counter() - start) * 1000
+        alias = context["connection"].alias
+        for tracker in trackers:
+            tracker._record(alias, took, sql)
+
+
+def _install(sender=None, connection=None, **kwargs):
+    if _track not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_track)
+
+
+connection_created.connect(_install)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryTracker(ContextDecorator):
+    """
+    Counts queries and DB time while active, via a connection execute wrapper
+    (works with DEBUG off). Usable as a context manager or decorator:
+
+        with QueryTracker("run_due_checks") as qt:
+            ...
+        qt.count, qt.db_ms, qt.elapsed_ms
+
+    ``using`` limits counting to one database alias (default: all).
+    ``max_queries`` / ``max_db_ms`` turn it into an asserted budget: exceeding
+    either raises QueryBudgetExceeded on exit, listing the captured SQL.
+    """
+
+    def __init__(self, label="", using=None, max_queries=None, max_db_ms=None, log_level=logging.DEBUG):
+        self.label = label
+        self.using = using
+        self.max_queries = max_queries
+        self.max_db_ms = max_db_ms
+        self.log_level = log_level
+        self._reset()
+
+    def _reset(self):
+        self.count = 0
+        self.db_ms = 0.0
+        self.elapsed_ms = 0.0
+        self.statements = []
+        self._token = None
+        self._started = None
+
+    def _record(self, alias, took, sql):
+        if self.using is not None and alias != self.using:
+            return
+        self.count += 1
+        self.db_ms += took
+        if self.max_queries is not None or self.max_db_ms is not None:
+            self.statements.append((round(took, 2), sql))
+
+    def __enter__(self):
+        self._reset()
+        for conn in connections.all(initialized_only=True):
+            _install(connection=conn)
+        self._token = _active.set(_active.get() + (self,))
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.elapsed_ms = (time.perf_counter() - self._started) * 1000
+        _active.reset(self._token)
+        if self.label:
+            log.log(
+                self.log_level, "%s: %d queries, %.1f ms db, %.1f ms total",
+                self.label, self.count, self.db_ms, self.elapsed_ms,
+            )
+        if exc_type is None:
+            self.check_budget()
+        return False
+
+    def check_budget(self):
+        problems = []
+        if self.max_queries is not None and self.count > self.max_queries:
+            problems.append(f"{self.count} queries > budget {self.max_queries}")
+        if self.max_db_ms is not None and self.db_ms > self.max_db_ms:
+            problems.append(f"{self.db_ms:.1f} ms db > budget {self.max_db_ms} ms")
+        if problems:
+            listing = "\n".join(f"  [{ms} ms] {sql}" for ms, sql in self.statements)
+            raise QueryBudgetExceeded(
+                f"{self.label or 'query budget'}: {'; '.join(problems)}\n{listing}"
+            )
+
+
+def query_budget(max_queries=None, max_db_ms=None, label="", using=None):
+    """Shorthand for asserting a budget in tests: ``with query_budget(5): ...``."""
+    return QueryTracker(label, using=using, max_queries=max_queries, max_db_ms=max_db_ms)
+
+
+class QueryCountMiddleware:
+    """
+    Logs per-request query count and DB time, and exposes them as
+    ``X-DB-Queries`` / ``X-DB-Time-Ms`` response headers. Requests over
+    QUERY_COUNT_WARN queries or QUERY_TIME_WARN_MS of DB time log at WARNING.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.warn_count = getattr(settings, "QUERY_COUNT_WARN", 50)
+        self.warn_ms = getattr(settings, "QUERY_TIME_WARN_MS", 500)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with QueryTracker() as qt:
+            response = self.get_response(request)
+        return self._report(request, response, qt)
+
+    async def __acall__(self, request):
+        with QueryTracker() as qt:
+            response = await self.get_response(request)
+        return self._report(request, response, qt)
+
+    def _report(self, request, response, qt):
+        level = logging.DEBUG
+        if qt.count > self.warn_count or qt.db_ms > self.warn_ms:
+            level = logging.WARNING
+        log.log(
+            level, "%s %s: %d queries, %.1f ms db, %.1f ms total",
+            request.method, request.path, qt.count, qt.db_ms, qt.elapsed_ms,
+        )
+        response["X-DB-Queries"] = str(qt.count)
+        response["X-DB-Time-Ms"] = f"{qt.db_ms:.1f}"
+        return response
@@ -0,0 +1,64 @@
+# api/management/commands/bench_cold_start.py
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter: what a Celery worker does before its first
+# tick (django.setup(), task autodiscovery, then the checker on first use).
+CHILD = """
+import json, time
+t0 = time.perf_counter()
+import django
+django.setup()
+t1 = time.perf_counter()
+import api.tasks
+t2 = time.perf_counter()
+import api.checks
+t3 = time.perf_counter()
+print(json.dumps({"setup": t1 - t0, "tasks": t2 - t1, "checks": t3 - t2}))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure checker cold start in fresh interpreters for each settings module: "
+        "django.setup(), importing api.tasks (worker ready) and api.checks (ready to probe)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--settings-modules", nargs="+",
+                            default=["monitoring_api.settings", "monitoring_api.settings_checker"])
+        parser.add_argument("--runs", type=int, default=5)
+
+    def handle(self, *args, **opts):
+        if opts["runs"] <= 0:
+            raise CommandError("--runs must be positive.")
+
+        self.stdout.write(
+            f"{'settings':<36} {'setup ms':>9} {'+tasks':>8} {'+checks':>8} {'process ms':>11}"
+        )
+        for module in opts["settings_modules"]:
+            runs = [self._run(module) for _ in range(opts["runs"])]
+            med = {k: statistics.median(r[k] for r in runs) * 1000 for k in runs[0]}
+            self.stdout.write(
+                f"{module:<36} {med['setup']:>9.0f} {med['tasks']:>8.0f} "
+                f"{med['checks']:>8.0f} {med['process']:>11.0f}"
+            )
+
+    def _run(self, module):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=module)
+        started = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-c", CHILD], env=env, capture_output=True, text=True,
+        )
+        elapsed = time.perf_counter() - started
+        if proc.returncode != 0:
+            raise CommandError(f"{module} failed to start:\n{proc.stderr}")
+        timings = json.loads(proc.stdout.strip().splitlines()[-1])
+        timings["process"] = elapsed
+        return timings
@@ -0,0 +1,108 @@
+# api/management/commands/loadtest_reads.py
+import statistics
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test import Client
+
+from api.instrumentation import QueryTracker
+from api.models import Service
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, round(pct / 100.0 * len(ordered) + 0.5) - 1))
+    return ordered[k]
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay the read endpoints (results list, service summary, CheckResult admin "
+        "changelist) through the full Django stack and report p50/p99 latency and "
+        "query counts. Run `seed_results` first to get a production-sized history."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--warmup", type=int, default=3)
+        parser.add_argument("--service", type=int, default=None,
+                            help="Service id for the summary endpoint (default: the one with most endpoints).")
+        parser.add_argument("--admin-user", default=None,
+                            help="Staff username for the admin changelist (default: first superuser).")
+        parser.add_argument("--deep-page", type=int, default=100,
+                            help="Page number used for the deep-pagination results target.")
+
+    def handle(self, *args, **opts):
+        if opts["iterations"] <= 0:
+            raise CommandError("--iterations must be positive.")
+
+        client = Client()
+        targets = self._targets(client, opts)
+        if not targets:
+            raise CommandError("Nothing to test: no services found. Run seed_results first.")
+
+        self.stdout.write(
+            f"{'target':<28} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9} {'queries':>8} {'db ms':>8}"
+        )
+        for name, path in targets:
+            row = self._measure(client, path, opts["iterations"], opts["warmup"])
+            if row is None:
+                self.stdout.write(self.style.WARNING(f"{name:<28} failed: {path}"))
+                continue
+            self.stdout.write(
+                f"{name:<28} {row['p50']:>9.1f} {row['p99']:>9.1f} {row['max']:>9.1f} "
+                f"{row['queries']:>8} {row['db_ms']:>8.1f}"
+            )
+
+    def _targets(self, client, opts):
+        svc_id = opts["service"]
+        if svc_id is None:
+            svc = Service.objects.annotate(n=Count("endpoint")).order_by("-n").first()
+            if svc is None:
+                return []
+            svc_id = svc.id
+
+        targets = [
+            ("results list", "/api/results/"),
+            (f"results page {opts['deep_page']}", f"/api/results/?page={opts['deep_page']}"),
+            (f"service {svc_id} summary", f"/api/services/{svc_id}/summary/"),
+        ]
+
+        User = get_user_model()
+        if opts["admin_user"]:
+            user = User.objects.filter(username=opts["admin_user"], is_staff=True).first()
+        else:
+            user = User.objects.filter(is_superuser=True).first()
+        if user is None:
+            self.stdout.write(self.style.WARNING(
+                "No staff user available; skipping the admin changelist."
+            ))
+        else:
+            client.force_login(user)
+            targets.append(("admin checkresult list", "/admin/api/checkresult/"))
+        return targets
+
+    def _measure(self, client, path, iterations, warmup):
+        for _ in range(warmup):
+            if client.get(path, HTTP_ACCEPT="application/json").status_code != 200:
+                return None
+
+        timings, queries, db_ms = [], [], []
+        for _ in range(iterations):
+            with QueryTracker() as qt:
+                resp = client.get(path, HTTP_ACCEPT="application/json")
+            if resp.status_code != 200:
+                return None
+            timings.append(qt.elapsed_ms)
+            queries.append(qt.count)
+            db_ms.append(qt.db_ms)
+
+        return {
+            "p50": percentile(timings, 50),
+            "p99": percentile(timings, 99),
+            "max": max(timings),
+            "queries": int(statistics.median(queries)),
+            "db_ms": statistics.median(db_ms),
+        }
@@ -0,0 +1,70 @@
+# api/management/commands/rebalance_schedule.py
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.models import Endpoint
+
+
+def load_profile(schedule, start, horizon):
+    """Peak and mean probes per second over ``horizon`` seconds for (next_run_at, interval) pairs."""
+    per_second = Counter()
+    t0 = start.timestamp()
+    for next_run_at, interval in schedule:
+        interval = max(1, interval or 60)
+        # Overdue (or unscheduled) endpoints run right away, then every interval.
+        t = max(next_run_at.timestamp(), t0) if next_run_at else t0
+        while t < t0 + horizon:
+            per_second[int(t - t0)] += 1
+            t += interval
+    total = sum(per_second.values())
+    return (max(per_second.values()) if per_second else 0), total / horizon
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-spread next_run_at of enabled poll endpoints onto their hashed phase within the "
+        "interval (see Endpoint.next_slot), flattening probe load that was created in "
+        "bursts, e.g. by a fleet registering at boot."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--service", type=int, default=None, help="Only this service id.")
+        parser.add_argument("--horizon", type=int, default=300,
+                            help="Seconds of future schedule used for the load report.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **opts):
+        # Push endpoints' next_run_at is their heartbeat deadline, not a slot.
+        qs = Endpoint.objects.filter(enabled=True, mode=Endpoint.MODE_POLL).only("id", "service_id", "url", "method", "interval_sec", "next_run_at")
+        if opts["service"] is not None:
+            qs = qs.filter(service_id=opts["service"])
+
+        now = timezone.now()
+        horizon = max(1, opts["horizon"])
+        batch, before, after, moved = [], [], [], 0
+        for ep in qs.iterator(chunk_size=opts["batch_size"]):
+            before.append((ep.next_run_at, ep.interval_sec))
+            ep.next_run_at = ep.next_slot(now)
+            after.append((ep.next_run_at, ep.interval_sec))
+            batch.append(ep)
+            if len(batch) >= opts["batch_size"]:
+                moved += self._save(batch, opts["dry_run"])
+                batch = []
+        moved += self._save(batch, opts["dry_run"])
+
+        peak_before, mean = load_profile(before, now, horizon)
+        peak_after, _ = load_profile(after, now, horizon)
+        verb = "Would reschedule" if opts["dry_run"] else "Rescheduled"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {moved} endpoint(s)."))
+        self.stdout.write(
+            f"Probes/s over the next {horizon}s: mean {mean:.2f}, "
+            f"peak {peak_before} before, {peak_after} after."
+        )
+
+    def _save(self, batch, dry_run):
+        if batch and not dry_run:
+            Endpoint.objects.bulk_update(batch, ["next_run_at"])
+        return len(batch)
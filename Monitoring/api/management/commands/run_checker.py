@@ -0,0 +1,137 @@
+# api/management/commands/run_checker.py
+import logging
+import os
+import signal
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.checks import due_endpoints, record_results, retry_admitted
+from api.instrumentation import QueryTracker
+from api.probe import MAX_CONCURRENCY, merge_retry
+from api.probe_pool import ProbePool
+
+log = logging.getLogger("api.checks")
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the checker as a long-lived loop on a multi-process probe engine (api.probe_pool): "
+        "N worker processes probe, partitioned by a consistent hash of endpoint id, and this "
+        "process is the single batched writer. Failed probes are retried through this process's "
+        "rate limiter. Use instead of the Celery beat ticks when one process cannot keep up."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+        parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENCY,
+                            help="Connections per worker process.")
+        parser.add_argument("--tier", default=None, help="Only check this tier.")
+        parser.add_argument("--tick", type=float, default=1.0,
+                            help="Seconds between polls for due endpoints.")
+        parser.add_argument("--batch", type=int, default=2000,
+                            help="Most due endpoints dispatched per tick.")
+        parser.add_argument("--flush-size", type=int, default=1000,
+                            help="Write results once this many are buffered ...")
+        parser.add_argument("--flush-s", type=float, default=1.0,
+                            help="... or once the oldest buffered result is this old.")
+
+    def handle(self, *args, **opts):
+        if opts["processes"] < 1 or opts["tick"] <= 0:
+            raise CommandError("--processes and --tick must be positive.")
+
+        stopping = []
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, lambda *_: stopping.append(True))
+
+        pool = ProbePool(opts["processes"], max_concurrency=opts["concurrency"]).start()
+        self.stdout.write(f"Probe engine started with {len(pool)} worker process(es).")
+
+        # Endpoints handed to workers and not yet written:
+        # id -> (endpoint, give-up time, outcome of the first attempt if this is a retry).
+        self.inflight = {}
+        self.buffer = []
+        self.buffered_at = None
+        self.flush_size, self.flush_s = opts["flush_size"], opts["flush_s"]
+        next_tick = 0.0
+        try:
+            while not stopping:
+                dead = pool.dead_workers()
+                if dead:
+                    raise CommandError(f"Probe worker(s) exited: {', '.join(dead)}")
+
+                now = time.monotonic()
+                if now >= next_tick:
+                    self._expire(now)
+                    # Buffered endpoints are still overdue in the DB until flushed.
+                    busy = self.inflight.keys() | {ep.id for ep, _ in self.buffer}
+                    due = due_endpoints(opts["tier"], opts["batch"], exclude=busy)
+                    for ep in due:
+                        self.inflight[ep.id] = (ep, self._give_up(ep, now), None)
+                    pool.submit(due)
+                    next_tick = now + opts["tick"]
+
+                self._collect(pool.results(timeout=max(0.0, min(next_tick - time.monotonic(), 0.2))), pool)
+                if self._flush_due(time.monotonic()):
+                    self._flush()
+        finally:
+            self._collect(pool.close())
+            # Retries that never came back: keep their first attempt.
+            self._buffer((ep, first) for ep, _, first in self.inflight.values() if first is not None)
+            self._flush()
+            self.stdout.write("Probe engine stopped.")
+
+    @staticmethod
+    def _give_up(ep, now):
+        # One attempt plus backoff; after that the outcome is presumed lost.
+        return now + (ep.timeout_ms or 5000) / 1000.0 + 10
+
+    def _collect(self, outcomes, pool=None):
+        """Buffer outcomes; with a ``pool``, failures get a retry if their rate limits allow."""
+        finished, retries = [], []
+        for ep_id, outcome in outcomes:
+            entry = self.inflight.pop(ep_id, None)
+            if entry is None:
+                continue
+            ep, _, first = entry
+            if first is not None:
+                finished.append((ep, merge_retry(first, outcome)))
+            elif not outcome[0] and pool is not None and retry_admitted(ep):
+                self.inflight[ep_id] = (ep, self._give_up(ep, time.monotonic()), outcome)
+                retries.append(ep)
+            else:
+                finished.append((ep, outcome))
+        if retries:
+            pool.submit(retries, retry=True)
+        self._buffer(finished)
+
+    def _buffer(self, finished):
+        for entry in finished:
+            if not self.buffer:
+                self.buffered_at = time.monotonic()
+            self.buffer.append(entry)
+
+    def _flush_due(self, now):
+        return bool(self.buffer) and (
+            len(self.buffer) >= self.flush_size or now - self.buffered_at >= self.flush_s
+        )
+
+    def _expire(self, now):
+        # Dropped endpoints are still overdue in the DB and get dispatched again;
+        # a lost retry is recorded with its first attempt.
+        lost = [ep_id for ep_id, (_, give_up, _) in self.inflight.items() if give_up < now]
+        for ep_id in lost:
+            ep, _, first = self.inflight.pop(ep_id)
+            if first is not None:
+                self._buffer([(ep, first)])
+        if lost:
+            log.warning("No outcome for %d probe(s); dispatching them again", len(lost))
+
+    def _flush(self):
+        if not self.buffer:
+            return
+        endpoints = [ep for ep, _ in self.buffer]
+        outcomes = [outcome for _, outcome in self.buffer]
+        self.buffer = []
+        with QueryTracker("run_checker.flush", log_level=logging.INFO):
+            record_results(endpoints, outcomes)
@@ -0,0 +1,136 @@
+# api/management/commands/seed_results.py
+import math
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from api.models import Service, Endpoint, CheckResult
+
+
+SERVICE_PREFIX = "loadtest-svc"
+OUTAGE_RATE = 0.0005            # chance that a healthy check starts an outage
+OUTAGE_MEAN_LEN = 8             # checks per outage, on average
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-load synthetic CheckResult history for load testing the read paths. "
+        "Rows are inserted with raw batched INSERTs (executemany), so timestamps are "
+        "spread over the past instead of being stamped with auto_now_add."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--results", type=int, default=1_000_000,
+                            help="Total number of CheckResult rows to insert.")
+        parser.add_argument("--services", type=int, default=20)
+        parser.add_argument("--endpoints-per-service", type=int, default=5)
+        parser.add_argument("--interval", type=int, default=60,
+                            help="Seconds between generated checks of one endpoint.")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, **opts):
+        total = opts["results"]
+        batch_size = opts["batch_size"]
+        if total <= 0 or batch_size <= 0:
+            raise CommandError("--results and --batch-size must be positive.")
+
+        rnd = random.Random(opts["seed"])
+        endpoints = self._ensure_endpoints(opts["services"], opts["endpoints_per_service"])
+        per_endpoint = math.ceil(total / len(endpoints))
+        interval = max(1, opts["interval"])
+        start_at = timezone.now() - timezone.timedelta(seconds=per_endpoint * interval)
+
+        self.stdout.write(
+            f"Seeding {total} results over {len(endpoints)} endpoints "
+            f"({per_endpoint} each, from {start_at:%Y-%m-%d %H:%M})."
+        )
+
+        # Per-endpoint latency profile and outage state.
+        profiles = {
+            ep.id: {"median": rnd.uniform(20, 400), "outage_left": 0}
+            for ep in endpoints
+        }
+
+        sql = self._insert_sql()
+        adapt_ts = connection.ops.adapt_datetimefield_value
+        inserted = 0
+        report_every = max(batch_size, total // 20)
+        next_report = report_every
+        started = time.perf_counter()
+        batch = []
+
+        for step in range(per_endpoint):
+            ts = start_at + timezone.timedelta(seconds=step * interval)
+            for ep in endpoints:
+                if inserted + len(batch) >= total:
+                    break
+                jitter = timezone.timedelta(milliseconds=rnd.randint(0, 999))
+                batch.append((ep.id, adapt_ts(ts + jitter), *self._outcome(rnd, ep, profiles[ep.id])))
+                if len(batch) >= batch_size:
+                    inserted += self._flush(sql, batch)
+                    batch = []
+                    if inserted >= next_report:
+                        next_report += report_every
+                        rate = inserted / max(time.perf_counter() - started, 1e-9)
+                        self.stdout.write(f"  {inserted}/{total} ({rate:.0f} rows/s)")
+        if batch:
+            inserted += self._flush(sql, batch)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Inserted {inserted} results in {elapsed:.1f}s ({inserted / max(elapsed, 1e-9):.0f} rows/s)."
+        ))
+
+    def _ensure_endpoints(self, n_services, n_endpoints):
+        endpoints = []
+        for i in range(n_services):
+            name = f"{SERVICE_PREFIX}-{i:03d}"
+            svc, _ = Service.objects.get_or_create(
+                name=name, defaults={"url": f"http://{name}:8000", "status": "HEALTHY"},
+            )
+            for j in range(n_endpoints):
+                ep, _ = Endpoint.objects.get_or_create(
+                    service=svc,
+                    url=f"http://{name}:8000/check/{j}",
+                    method="GET",
+                    # Seeded endpoints only exist to own history; never probe them.
+                    defaults={"enabled": False},
+                )
+                endpoints.append(ep)
+        return endpoints
+
+    def _outcome(self, rnd, ep, profile):
+        """
+        Returns (status_code, response_time_ms, success, details) for one check:
+        log-normal latency around the endpoint's median, with occasional outages
+        that last several consecutive checks.
+        """
+        if profile["outage_left"] == 0 and rnd.random() < OUTAGE_RATE:
+            profile["outage_left"] = max(1, int(rnd.expovariate(1 / OUTAGE_MEAN_LEN)))
+
+        if profile["outage_left"] > 0:
+            profile["outage_left"] -= 1
+            if rnd.random() < 0.5:
+                return 0, ep.timeout_ms, False, "timed out"
+            return 503, int(rnd.uniform(5, 50)), False, f"Expected {ep.expected_status} got 503"
+
+        rtt = int(rnd.lognormvariate(math.log(profile["median"]), 0.35))
+        return ep.expected_status, min(rtt, ep.timeout_ms), True, None
+
+    def _insert_sql(self):
+        qn = connection.ops.quote_name
+        cols = ["endpoint_id", "timestamp", "status_code", "response_time_ms", "success", "details"]
+        return "INSERT INTO {} ({}) VALUES ({})".format(
+            qn(CheckResult._meta.db_table),
+            ", ".join(qn(c) for c in cols),
+            ", ".join(["%s"] * len(cols)),
+        )
+
+    def _flush(self, sql, rows):
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(sql, rows)
+        return len(rows)
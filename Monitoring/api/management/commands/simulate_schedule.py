@@ -0,0 +1,370 @@
+# api/management/commands/simulate_schedule.py
+import heapq
+import math
+import random
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.checks import TICK_BATCH
+from api.models import Endpoint, Service
+from api.probe import BACKOFF_BASE_S, MAX_CONCURRENCY, RETRY_COUNT, RateLimiter, host_of
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, round(pct / 100.0 * len(ordered) + 0.5) - 1))
+    return ordered[k]
+
+
+class SimEndpoint:
+    """An endpoint as the simulated scheduler sees it; ``due`` is virtual seconds."""
+
+    __slots__ = (
+        "id", "service_id", "interval", "phase", "timeout_s", "median_s", "limits",
+        "due", "ok", "run_started", "run_last",
+    )
+
+    def __init__(self, id, service_id, interval, phase, timeout_s, median_s, limits, due):
+        self.id = id
+        self.service_id = service_id
+        self.interval = interval
+        self.phase = phase
+        self.timeout_s = timeout_s
+        self.median_s = median_s
+        self.limits = limits
+        self.due = due
+        self.ok = None
+        self.run_started = self.run_last = None
+
+
+class Stats:
+    def __init__(self, name, cfg):
+        self.name = name
+        self.cfg = cfg
+        self.endpoints = 0
+        self.ticks = self.expired = self.full = 0
+        self.checks = self.deferred = self.missed = 0
+        self.busy_s = self.probe_s = self.peak_needed = 0.0
+        self.lags = []
+        self.backlog = 0
+
+
+class Simulation:
+    """
+    Replays the checker against a virtual clock, one tier queue at a time
+    (each queue has its own worker and rate limiter, as in production):
+
+    - a beat tick every ``every_s``; a single worker runs them in order and
+      drops ticks not started within one period (the beat entries' expiry)
+    - a tick selects up to ``batch`` due endpoints by next_run_at, defers
+      those over their rate limits (api.checks._admit), probes the rest on
+      ``concurrency`` slots, then writes results and reschedules each onto
+      its phase (api.checks.record_results)
+    - probe times are lognormal around each endpoint's median; failures are
+      retried once like api.probe.probe_with_retry, and timeouts take the
+      endpoint's full timeout
+
+    No network calls are made and nothing is written to the database.
+    """
+
+    def __init__(self, origin, duration, rng, failure_rate, timeout_rate, latency_sigma,
+                 tick_db_s, row_write_s, storage):
+        self.origin = origin
+        self.duration = duration
+        self.rng = rng
+        self.failure_rate = failure_rate
+        self.timeout_rate = timeout_rate
+        self.latency_sigma = latency_sigma
+        self.tick_db_s = tick_db_s
+        self.row_write_s = row_write_s
+        self.storage = storage
+        # Rows written and transactions, per virtual second (all queues).
+        self.rows_per_s = Counter()
+        self.inserts = self.updates = self.transactions = 0
+
+    def run_queue(self, stats, endpoints):
+        cfg = stats.cfg
+        every, batch, concurrency = cfg["every_s"], cfg["batch"], cfg["concurrency"]
+        stats.endpoints = len(endpoints)
+        clock = [0.0]
+        limiter = RateLimiter(clock=lambda: clock[0])
+        heap = [(ep.due, ep.id, ep) for ep in endpoints]
+        heapq.heapify(heap)
+
+        free_at = 0.0
+        for k in range(math.ceil(self.duration / every)):
+            beat = k * every
+            start = max(beat, free_at)
+            if start >= self.duration:
+                break
+            if start > beat + every:
+                stats.expired += 1
+                continue
+            stats.ticks += 1
+            due = []
+            while heap and heap[0][0] <= start and len(due) < batch:
+                due.append(heapq.heappop(heap)[2])
+            stats.full += len(due) == batch
+            if not due:
+                free_at = start + self.tick_db_s
+                stats.busy_s += self.tick_db_s
+                continue
+
+            # ---- admit within rate limits; the rest is pushed back
+            clock[0] = start
+            admitted, queued = [], Counter()
+            for ep in due:
+                wait = limiter.acquire(ep.limits)
+                if not wait:
+                    admitted.append(ep)
+                    continue
+                (_, rate, _) = ep.limits[0]
+                queued[ep.service_id] += 1
+                ep.due = start + wait + (queued[ep.service_id] - 1) / rate
+                heapq.heappush(heap, (ep.due, ep.id, ep))
+            deferred = len(due) - len(admitted)
+            stats.deferred += deferred
+            if deferred:
+                self._write(start, 0, deferred)
+
+            # ---- probe on ``concurrency`` slots, first come first served
+            probe_start = start + self.tick_db_s
+            slots = [probe_start] * min(concurrency, max(1, len(admitted)))
+            outcomes = []
+            tick_probe_s = 0.0
+            for ep in admitted:
+                began = heapq.heappop(slots)
+                clock[0] = began
+                ok, took = self._probe(ep, limiter)
+                heapq.heappush(slots, began + took)
+                tick_probe_s += took
+                lag = began - ep.due
+                stats.lags.append(lag)
+                stats.missed += int(lag // ep.interval)
+                outcomes.append((ep, ok))
+            stats.checks += len(admitted)
+            stats.probe_s += tick_probe_s
+            stats.peak_needed = max(stats.peak_needed, tick_probe_s / every)
+
+            # ---- record results in one transaction, reschedule onto phases
+            write_s = self.tick_db_s + self.row_write_s * len(admitted)
+            now = max(slots) + write_s
+            inserts = sum(self._inserts(ep, ok, now) for ep, ok in outcomes)
+            extended = len(outcomes) - inserts if self.storage == "changes" else 0
+            self._write(now, inserts, extended + len(admitted) + len({ep.service_id for ep in admitted}))
+            for ep in admitted:
+                due_at = min(ep.due, now)
+                ep.due = self._next_slot(ep, max(due_at + ep.interval / 2, now))
+                heapq.heappush(heap, (ep.due, ep.id, ep))
+            stats.busy_s += now - start
+            free_at = now
+
+        # Endpoints left overdue at the end have missed every slot since they were due;
+        # more than one period overdue counts as backlog.
+        for due_at, _, ep in heap:
+            if due_at < self.duration:
+                stats.backlog += due_at < self.duration - every
+                stats.missed += int((self.duration - due_at) // ep.interval)
+        return stats
+
+    def _probe(self, ep, limiter):
+        ok, took = self._attempt(ep)
+        if not ok and RETRY_COUNT > 0 and limiter.acquire(ep.limits) == 0:
+            ok, retry_took = self._attempt(ep)
+            took += BACKOFF_BASE_S + 0.15 + retry_took
+        return ok, took
+
+    def _attempt(self, ep):
+        r = self.rng.random()
+        if r < self.timeout_rate:
+            return False, ep.timeout_s
+        took = min(ep.timeout_s, self.rng.lognormvariate(math.log(ep.median_s), self.latency_sigma))
+        return r >= self.timeout_rate + self.failure_rate, took
+
+    def _inserts(self, ep, ok, now):
+        """Result rows a check adds: 0 if it extends the current run (see CheckResult.extends_run)."""
+        if self.storage == "changes" and ep.ok == ok and ep.run_started is not None and (
+            now - ep.run_last <= 3 * ep.interval
+            and now - ep.run_started < settings.RESULT_HEARTBEAT_S
+        ):
+            ep.run_last = now
+            return 0
+        ep.ok, ep.run_started, ep.run_last = ok, now, now
+        return 1
+
+    def _write(self, at, inserts, updates):
+        self.inserts += inserts
+        self.updates += updates
+        self.transactions += 1
+        if at < self.duration:
+            self.rows_per_s[int(at)] += inserts + updates
+
+    def _next_slot(self, ep, after):
+        """Endpoint.next_slot on the virtual clock (phases are in epoch seconds)."""
+        k = math.floor((self.origin + after - ep.phase) / ep.interval) + 1
+        return ep.phase + k * ep.interval - self.origin
+
+
+class Command(BaseCommand):
+    help = (
+        "Dry-run the check scheduler against a virtual clock for the current and/or a "
+        "hypothetical endpoint population, and report scheduler lag, missed intervals, "
+        "probe concurrency demand and DB write rate per tier queue. Makes no network "
+        "calls and writes nothing."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--duration", type=int, default=3600, help="Simulated seconds.")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--no-current", action="store_true",
+                            help="Leave out the enabled poll endpoints in the database.")
+        parser.add_argument("--add", type=int, default=0, help="Hypothetical endpoints to add.")
+        parser.add_argument("--add-interval", type=int, default=60)
+        parser.add_argument("--add-tier", choices=list(settings.CHECK_TIERS), default=Service.TIER_STANDARD)
+        parser.add_argument("--add-timeout-ms", type=int, default=5000)
+        parser.add_argument("--endpoints-per-service", type=int, default=5,
+                            help="Hypothetical endpoints share services (and hosts) in groups of this size.")
+        parser.add_argument("--burst", action="store_true",
+                            help="Hypothetical endpoints are all due at once (a fleet registering at boot) "
+                                 "instead of on their phases.")
+        parser.add_argument("--latency-ms", type=float, default=150.0,
+                            help="Median probe time of endpoints without a latency baseline.")
+        parser.add_argument("--latency-sigma", type=float, default=0.8,
+                            help="Spread of probe times (sigma of the lognormal).")
+        parser.add_argument("--failure-rate", type=float, default=0.01,
+                            help="Share of attempts that fail quickly.")
+        parser.add_argument("--timeout-rate", type=float, default=0.005,
+                            help="Share of attempts that hang until the endpoint's timeout.")
+        parser.add_argument("--untiered", action="store_true",
+                            help="Simulate one run_due_checks() queue (TICK_BATCH, MAX_CONCURRENCY) "
+                                 "instead of settings.CHECK_TIERS.")
+        parser.add_argument("--every", type=float, default=15.0, help="Beat period with --untiered.")
+        parser.add_argument("--batch", type=int, default=None, help="Override the batch size of every queue.")
+        parser.add_argument("--concurrency", type=int, default=None,
+                            help="Override the probe concurrency of every queue.")
+        parser.add_argument("--tick-db-ms", type=float, default=20.0,
+                            help="Assumed fixed DB time per tick, for the select and again for the write.")
+        parser.add_argument("--row-write-ms", type=float, default=0.2,
+                            help="Assumed DB time per endpoint written back.")
+        parser.add_argument("--storage", choices=["full", "changes"], default=settings.RESULT_STORAGE)
+
+    def handle(self, *args, **opts):
+        if opts["duration"] <= 0:
+            raise CommandError("--duration must be positive.")
+
+        now = timezone.now()
+        rng = random.Random(opts["seed"])
+        queues = self._queues(opts)
+        endpoints = {name: [] for name in queues}
+        if not opts["no_current"]:
+            self._load_current(endpoints, now, opts)
+        self._add_hypothetical(endpoints, now, rng, opts)
+        if not any(endpoints.values()):
+            raise CommandError("Nothing to simulate: no endpoints. Use --add to simulate a hypothetical population.")
+
+        sim = Simulation(
+            origin=now.timestamp(), duration=opts["duration"], rng=rng,
+            failure_rate=opts["failure_rate"], timeout_rate=opts["timeout_rate"],
+            latency_sigma=opts["latency_sigma"], tick_db_s=opts["tick_db_ms"] / 1000.0,
+            row_write_s=opts["row_write_ms"] / 1000.0, storage=opts["storage"],
+        )
+        results = [sim.run_queue(Stats(name, cfg), endpoints[name]) for name, cfg in queues.items()]
+        self._report(results, sim, opts["duration"])
+
+    def _queues(self, opts):
+        if opts["untiered"]:
+            queues = {"all": {"every_s": opts["every"], "batch": TICK_BATCH, "concurrency": MAX_CONCURRENCY}}
+        else:
+            queues = {name: dict(cfg) for name, cfg in settings.CHECK_TIERS.items()}
+        for cfg in queues.values():
+            if opts["batch"]:
+                cfg["batch"] = opts["batch"]
+            if opts["concurrency"]:
+                cfg["concurrency"] = opts["concurrency"]
+        return queues
+
+    def _queue_of(self, tier, opts):
+        return "all" if opts["untiered"] else tier
+
+    def _load_current(self, endpoints, now, opts):
+        qs = (
+            Endpoint.objects.filter(enabled=True, mode=Endpoint.MODE_POLL)
+            .select_related("service")
+            .only("id", "service_id", "url", "method", "interval_sec", "timeout_ms", "tier",
+                  "next_run_at", "latency_mean_ms", "service__tier", "service__probe_rate_per_s",
+                  "service__probe_burst")
+        )
+        for ep in qs.iterator(chunk_size=2000):
+            svc = ep.service
+            endpoints[self._queue_of(ep.effective_tier, opts)].append(SimEndpoint(
+                id=ep.id, service_id=ep.service_id,
+                interval=max(1, ep.interval_sec or 60), phase=ep.phase_s,
+                timeout_s=max(0.001, (ep.timeout_ms or 5000) / 1000.0),
+                median_s=max(1.0, ep.latency_mean_ms or opts["latency_ms"]) / 1000.0,
+                limits=(
+                    (("service", ep.service_id),
+                     svc.probe_rate_per_s or settings.PROBE_SERVICE_RATE_PER_S,
+                     svc.probe_burst or settings.PROBE_SERVICE_BURST),
+                    (("host", host_of(ep.url)), settings.PROBE_HOST_RATE_PER_S, settings.PROBE_HOST_BURST),
+                ),
+                due=max(0.0, (ep.next_run_at - now).total_seconds()) if ep.next_run_at else 0.0,
+            ))
+
+    def _add_hypothetical(self, endpoints, now, rng, opts):
+        interval = max(1, opts["add_interval"])
+        per_service = max(1, opts["endpoints_per_service"])
+        queue = endpoints[self._queue_of(opts["add_tier"], opts)]
+        for i in range(opts["add"]):
+            service_id = -1 - i // per_service
+            phase = rng.uniform(0, interval)
+            queue.append(SimEndpoint(
+                id=-1 - i, service_id=service_id, interval=interval, phase=phase,
+                timeout_s=max(0.001, opts["add_timeout_ms"] / 1000.0),
+                median_s=max(1.0, opts["latency_ms"]) / 1000.0,
+                limits=(
+                    (("service", service_id), settings.PROBE_SERVICE_RATE_PER_S, settings.PROBE_SERVICE_BURST),
+                    (("host", f"sim-{-service_id}"), settings.PROBE_HOST_RATE_PER_S, settings.PROBE_HOST_BURST),
+                ),
+                # Due on their phase within the first interval, or all at once.
+                due=0.0 if opts["burst"] else (phase - now.timestamp()) % interval,
+            ))
+
+    def _report(self, results, sim, duration):
+        self.stdout.write(
+            f"{'queue':<10} {'endpoints':>9} {'checks/s':>9} {'lag p50':>8} {'lag p99':>8} {'lag max':>8} "
+            f"{'missed':>7} {'deferred':>8} {'expired':>7} {'full':>5} {'busy':>6} {'conc avg':>8} "
+            f"{'conc need':>9} {'conc cfg':>8}"
+        )
+        for s in results:
+            if not s.endpoints:
+                continue
+            lags = s.lags or [0.0]
+            self.stdout.write(
+                f"{s.name:<10} {s.endpoints:>9} {s.checks / duration:>9.2f} "
+                f"{percentile(lags, 50):>7.1f}s {percentile(lags, 99):>7.1f}s {max(lags):>7.1f}s "
+                f"{s.missed:>7} {s.deferred:>8} {s.expired:>7} {s.full:>5} "
+                f"{100 * s.busy_s / duration:>5.0f}% {s.probe_s / duration:>8.1f} "
+                f"{s.peak_needed:>9.1f} {s.cfg['concurrency']:>8}"
+            )
+
+        peak = max(sim.rows_per_s.values(), default=0)
+        self.stdout.write(
+            f"DB writes: {(sim.inserts + sim.updates) / duration:.1f} rows/s "
+            f"({sim.inserts / duration:.1f} result inserts/s, peak {peak} rows in one second), "
+            f"{sim.transactions / duration:.2f} transactions/s, storage '{sim.storage}'."
+        )
+        self.stdout.write(
+            "lag: probe start minus next_run_at. missed: scheduled runs skipped. full: ticks that hit "
+            "the batch cap. busy: worker time spent in ticks. conc avg/need: probes in flight on "
+            "average / to finish the busiest tick within one period."
+        )
+        for s in results:
+            if s.expired or s.missed or s.backlog:
+                self.stdout.write(self.style.WARNING(
+                    f"{s.name}: does not keep up ({s.expired} tick(s) expired, {s.missed} missed run(s), "
+                    f"{s.backlog} endpoint(s) overdue at the end)."
+                ))
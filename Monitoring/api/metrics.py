@@ -1,4 +1,4 @@
-from prometheus_client import Counter, Histogram
+from prometheus_client import Counter, Gauge, Histogram
 
 check_total = Counter(
     "monitor_checks_total", "Total number of checks",
@@ -14,3 +14,23 @@ response_status = Counter(
     "monitor_check_response_status", "Response status codes from checks",
     ["service", "endpoint_id", "method", "status_code"]
 )
+
+endpoint_degraded = Gauge(
+    "monitor_endpoint_degraded", "1 while an endpoint's latency is well above its baseline (api.baselines)",
+    ["service", "endpoint_id", "method"],
+    multiprocess_mode="mostrecent",
+)
+
+latency_baseline_ms = Gauge(
+    "monitor_endpoint_latency_baseline_ms", "Expected latency of an endpoint at this hour of day",
+    ["service", "endpoint_id", "method"],
+    multiprocess_mode="mostrecent",
+)
+
+probes_deferred = Counter(
+    "monitor_probes_deferred_total", "Probes rescheduled because their service or host was over its rate limit",
+)
+
+heartbeats_received = Counter(
+    "monitor_heartbeats_received_total", "Heartbeats pushed by services to the ingest endpoint",
+)
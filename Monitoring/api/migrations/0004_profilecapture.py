@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_alter_endpoint_method_alter_endpoint_url_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProfileCapture',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('tick', 'check tick'), ('request', 'API request')], max_length=20)),
+                ('name', models.CharField(max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('duration_ms', models.IntegerField()),
+                ('samples', models.IntegerField()),
+                ('size_bytes', models.IntegerField()),
+                ('file_name', models.CharField(max_length=200, unique=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['-created_at'], name='api_profile_created_a81fb7_idx')],
+            },
+        ),
+    ]
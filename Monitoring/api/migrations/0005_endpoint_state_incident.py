@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_profilecapture'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='endpoint',
+            name='state',
+            field=models.CharField(choices=[('UNKNOWN', 'unknown'), ('UP', 'up'), ('DOWN', 'down')], default='UNKNOWN', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='endpoint',
+            name='state_changed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='Incident',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField()),
+                ('previous_state', models.CharField(blank=True, max_length=20, null=True)),
+                ('state', models.CharField(max_length=20)),
+                ('details', models.TextField(blank=True, null=True)),
+                ('notification', models.CharField(choices=[('pending', 'pending'), ('sent', 'sent'), ('deduped', 'deduplicated'), ('limited', 'rate limited'), ('failed', 'failed')], default='pending', max_length=10)),
+                ('endpoint', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='incidents', to='api.endpoint')),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='incidents', to='api.service')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['service', '-timestamp'], name='api_inciden_service_25f9ac_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 22:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_endpoint_state_incident'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='endpoint',
+            name='tier',
+            field=models.CharField(blank=True, choices=[('critical', 'critical'), ('standard', 'standard'), ('low', 'low')], max_length=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='tier',
+            field=models.CharField(choices=[('critical', 'critical'), ('standard', 'standard'), ('low', 'low')], default='standard', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='endpoint',
+            index=models.Index(fields=['enabled', 'next_run_at'], name='api_endpoin_enabled_f21bd9_idx'),
+        ),
+    ]
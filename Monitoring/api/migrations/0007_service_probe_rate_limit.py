@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_tiers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='service',
+            name='probe_burst',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='probe_rate_per_s',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
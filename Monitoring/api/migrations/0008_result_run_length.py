@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_service_probe_rate_limit'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='checkresult',
+            name='last_timestamp',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='checkresult',
+            name='latency_max_ms',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='checkresult',
+            name='latency_sum_ms',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='checkresult',
+            name='repeat_count',
+            field=models.PositiveIntegerField(db_default=1, default=1),
+        ),
+        migrations.AddField(
+            model_name='endpoint',
+            name='current_result',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.checkresult'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_result_run_length'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='endpoint',
+            name='mode',
+            field=models.CharField(choices=[('poll', 'poll'), ('push', 'push')], default='poll', max_length=10),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_endpoint_mode'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='endpoint',
+            name='latency_anomalies',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='endpoint',
+            name='latency_hourly',
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='endpoint',
+            name='latency_mean_ms',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='endpoint',
+            name='latency_samples',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='endpoint',
+            name='latency_var',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AlterField(
+            model_name='endpoint',
+            name='state',
+            field=models.CharField(choices=[('UNKNOWN', 'unknown'), ('UP', 'up'), ('DOWN', 'down'), ('DEGRADED', 'degraded')], default='UNKNOWN', max_length=10),
+        ),
+    ]
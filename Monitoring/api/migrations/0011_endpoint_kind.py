@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_latency_baselines'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='endpoint',
+            name='kind',
+            field=models.CharField(choices=[('http', 'http'), ('head', 'head'), ('tcp', 'tcp connect'), ('tls', 'tls handshake')], default='http', max_length=10),
+        ),
+    ]
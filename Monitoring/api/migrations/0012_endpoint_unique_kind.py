@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:57
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_endpoint_kind'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='endpoint',
+            unique_together={('service', 'url', 'method', 'kind')},
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_endpoint_unique_kind'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='checkresult',
+            index=models.Index(fields=['timestamp'], name='api_checkre_timesta_4fdd1f_idx'),
+        ),
+    ]
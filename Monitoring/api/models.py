@@ -1,12 +1,35 @@
+import math
+import os
+import zlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
 from django.db import models
 from django.utils import timezone
 
 
 class Service(models.Model):
+
+    # Probe tiers (settings.CHECK_TIERS): each has its own Celery queue,
+    # beat entry and concurrency budget.
+    TIER_CRITICAL = 'critical'
+    TIER_STANDARD = 'standard'
+    TIER_LOW = 'low'
+    TIER_CHOICES = {
+        TIER_CRITICAL: 'critical',
+        TIER_STANDARD: 'standard',
+        TIER_LOW: 'low',
+    }
+
     name = models.CharField(max_length=100, unique=True)
     url = models.URLField()
     status = models.CharField(max_length=50, blank=True, null=True)
     last_checked = models.DateTimeField(auto_now=True)
+    tier = models.CharField(default=TIER_STANDARD, choices=TIER_CHOICES, max_length=10)
+    # Probe rate limit for all endpoints of the service (token bucket);
+    # empty uses PROBE_SERVICE_RATE_PER_S / PROBE_SERVICE_BURST.
+    probe_rate_per_s = models.FloatField(blank=True, null=True)
+    probe_burst = models.PositiveIntegerField(blank=True, null=True)
 
     class Meta:
         indexes = [
@@ -29,6 +52,41 @@ class Endpoint(models.Model):
         'OPTIONS': 'options'
     }
 
+    STATE_UNKNOWN = 'UNKNOWN'
+    STATE_UP = 'UP'
+    STATE_DOWN = 'DOWN'
+    # Up, but latency well above its baseline (api.baselines).
+    STATE_DEGRADED = 'DEGRADED'
+    STATE_CHOICES = {
+        STATE_UNKNOWN: 'unknown',
+        STATE_UP: 'up',
+        STATE_DOWN: 'down',
+        STATE_DEGRADED: 'degraded',
+    }
+
+    # Poll endpoints are probed by the checker; push endpoints are sent
+    # heartbeats by their service (api.heartbeats) and go down when they stop.
+    MODE_POLL = 'poll'
+    MODE_PUSH = 'push'
+    MODE_CHOICES = {
+        MODE_POLL: 'poll',
+        MODE_PUSH: 'push',
+    }
+
+    # What a probe does (api.probe): the full request following redirects,
+    # HEAD without following them, or only a TCP connect / TLS handshake to
+    # the URL's host and port.
+    KIND_HTTP = 'http'
+    KIND_HEAD = 'head'
+    KIND_TCP = 'tcp'
+    KIND_TLS = 'tls'
+    KIND_CHOICES = {
+        KIND_HTTP: 'http',
+        KIND_HEAD: 'head',
+        KIND_TCP: 'tcp connect',
+        KIND_TLS: 'tls handshake',
+    }
+
     service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name='endpoint')
     url = models.URLField(max_length=200)
     method = models.CharField(default='GET', choices=METHOD_CHOICES, max_length=10)
@@ -38,17 +96,87 @@ class Endpoint(models.Model):
     headers = models.JSONField(blank=True, null=True)
     enabled = models.BooleanField(default=True)
     next_run_at = models.DateTimeField(blank=True, null=True)
+    state = models.CharField(default=STATE_UNKNOWN, choices=STATE_CHOICES, max_length=10)
+    state_changed_at = models.DateTimeField(blank=True, null=True)
+    # Overrides the service's tier when set.
+    tier = models.CharField(choices=Service.TIER_CHOICES, max_length=10, blank=True, null=True)
+    mode = models.CharField(default=MODE_POLL, choices=MODE_CHOICES, max_length=10)
+    kind = models.CharField(default=KIND_HTTP, choices=KIND_CHOICES, max_length=10)
+    # Streaming latency baseline of successful checks (api.baselines).
+    latency_mean_ms = models.FloatField(blank=True, null=True, editable=False)
+    latency_var = models.FloatField(blank=True, null=True, editable=False)
+    latency_samples = models.PositiveIntegerField(default=0, editable=False)
+    latency_hourly = models.JSONField(blank=True, null=True, editable=False)
+    latency_anomalies = models.PositiveSmallIntegerField(default=0, editable=False)
+    # Latest result row, extended in place while the outcome repeats
+    # (settings.RESULT_STORAGE = "changes").
+    current_result = models.ForeignKey(
+        'CheckResult', on_delete=models.SET_NULL, blank=True, null=True,
+        related_name='+', editable=False,
+    )
 
     class Meta:
-        unique_together = ('service', 'url', 'method')
+        unique_together = ('service', 'url', 'method', 'kind')
         indexes = [
             models.Index(fields=['service', 'enabled', 'next_run_at']),
+            models.Index(fields=['enabled', 'next_run_at']),
         ]
 
+    @classmethod
+    def in_tier(cls, tier):
+        """Q for endpoints whose effective tier (own, else the service's) is ``tier``."""
+        return models.Q(tier=tier) | models.Q(tier__isnull=True, service__tier=tier)
+
+    @property
+    def effective_tier(self):
+        return self.tier or self.service.tier
+
+    @property
+    def phase_s(self) -> float:
+        """
+        Fixed offset of this endpoint's runs within its interval, hashed from
+        (service, method, url, kind) so it is known before the row has an id
+        and endpoints registered together still spread over the interval.
+        HTTP endpoints leave the kind out, keeping the phase they had before
+        kinds existed.
+        """
+        interval_ms = max(1, self.interval_sec or 60) * 1000
+        key = f"{self.service_id}:{(self.method or 'GET').upper()}:{self.url}"
+        if self.kind and self.kind != self.KIND_HTTP:
+            key += f":{self.kind}"
+        key = key.encode()
+        return (zlib.crc32(key) % interval_ms) / 1000.0
+
+    def next_slot(self, after):
+        """First scheduled run strictly after ``after``: epoch seconds ≡ phase (mod interval)."""
+        interval = max(1, self.interval_sec or 60)
+        phase = self.phase_s
+        k = math.floor((after.timestamp() - phase) / interval) + 1
+        return datetime.fromtimestamp(phase + k * interval, tz=dt_timezone.utc)
+
+    def heartbeat_deadline(self, after):
+        """When a push endpoint whose last heartbeat was at ``after`` counts as missing."""
+        return after + timedelta(seconds=max(1, self.interval_sec or 60) * settings.HEARTBEAT_GRACE)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # The mode as loaded, to reschedule when it changes (None if deferred).
+        self._saved_mode = self.__dict__.get('mode') if self.pk else None
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        self._saved_mode = self.__dict__.get('mode')
+
     def save(self, *args, **kwargs):
-        if not self.next_run_at:
-            self.next_run_at = timezone.now()
+        mode_changed = self._saved_mode is not None and self.mode != self._saved_mode
+        if not self.next_run_at or mode_changed:
+            now = timezone.now()
+            # For push endpoints next_run_at is the heartbeat deadline.
+            self.next_run_at = self.heartbeat_deadline(now) if self.mode == self.MODE_PUSH else self.next_slot(now)
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'next_run_at'}
         super().save(*args, **kwargs)
+        self._saved_mode = self.mode
 
     def __str__(self):
         return f"{self.service.name} - {self.url}"
@@ -61,11 +189,110 @@ class CheckResult(models.Model):
     response_time_ms = models.IntegerField()
     success = models.BooleanField()
     details = models.TextField(blank=True, null=True)
+    # Run-length storage: with RESULT_STORAGE = "changes" a row stands for
+    # ``repeat_count`` consecutive checks with the same outcome, the first at
+    # ``timestamp`` (its latency in ``response_time_ms``) and the last at
+    # ``last_timestamp``. Null aggregates mean the row is a single check.
+    repeat_count = models.PositiveIntegerField(default=1, db_default=1)
+    latency_sum_ms = models.BigIntegerField(blank=True, null=True)
+    latency_max_ms = models.IntegerField(blank=True, null=True)
+    last_timestamp = models.DateTimeField(blank=True, null=True)
 
     class Meta:
         indexes = [
             models.Index(fields=['endpoint', '-timestamp']),
+            # Time-window filters across all endpoints (admin changelist).
+            models.Index(fields=['timestamp']),
         ]
 
+    def extends_run(self, ok, status_code, now, max_gap_s, heartbeat_s) -> bool:
+        """Whether a check with this outcome at ``now`` can be folded into this row."""
+        last = self.last_timestamp or self.timestamp
+        return (
+            self.success == ok
+            and self.status_code == status_code
+            and (now - last).total_seconds() <= max_gap_s
+            and (now - self.timestamp).total_seconds() < heartbeat_s
+        )
+
+    def add_check(self, latency_ms, now):
+        self.latency_sum_ms = (self.latency_sum_ms if self.latency_sum_ms is not None
+                               else self.response_time_ms * self.repeat_count) + latency_ms
+        self.latency_max_ms = max(self.latency_max_ms or self.response_time_ms, latency_ms)
+        self.repeat_count += 1
+        self.last_timestamp = now
+
     def __str__(self):
         return f"{self.endpoint.service.name} - {self.timestamp} - {'Success' if self.success else 'Failure'}"
+
+
+class Incident(models.Model):
+    """
+    One row per state transition of an endpoint (``endpoint`` set) or of a
+    whole service (``endpoint`` null), written by the checker as it happens.
+    """
+
+    NOTIFY_PENDING = 'pending'
+    NOTIFY_SENT = 'sent'
+    NOTIFY_DEDUPED = 'deduped'
+    NOTIFY_RATE_LIMITED = 'limited'
+    NOTIFY_FAILED = 'failed'
+    NOTIFY_CHOICES = {
+        NOTIFY_PENDING: 'pending',
+        NOTIFY_SENT: 'sent',
+        NOTIFY_DEDUPED: 'deduplicated',
+        NOTIFY_RATE_LIMITED: 'rate limited',
+        NOTIFY_FAILED: 'failed',
+    }
+
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name='incidents')
+    endpoint = models.ForeignKey(Endpoint, on_delete=models.CASCADE, related_name='incidents', blank=True, null=True)
+    timestamp = models.DateTimeField()
+    previous_state = models.CharField(max_length=20, blank=True, null=True)
+    state = models.CharField(max_length=20)
+    details = models.TextField(blank=True, null=True)
+    notification = models.CharField(default=NOTIFY_PENDING, choices=NOTIFY_CHOICES, max_length=10)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['service', '-timestamp']),
+        ]
+
+    def __str__(self):
+        target = self.endpoint.url if self.endpoint_id else self.service.name
+        return f"{target}: {self.previous_state} -> {self.state}"
+
+
+class ProfileCapture(models.Model):
+    KIND_CHOICES = {
+        'tick': 'check tick',
+        'request': 'API request',
+    }
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    name = models.CharField(max_length=200)
+    created_at = models.DateTimeField(auto_now_add=True)
+    duration_ms = models.IntegerField()
+    samples = models.IntegerField()
+    size_bytes = models.IntegerField()
+    file_name = models.CharField(max_length=200, unique=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at']),
+        ]
+
+    @property
+    def path(self):
+        return os.path.join(settings.PROFILE_DIR, self.file_name)
+
+    def delete(self, *args, **kwargs):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        return super().delete(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.kind} {self.name} ({self.duration_ms} ms)"
@@ -0,0 +1,295 @@
+# api/probe.py
+"""
+The probe engine: HTTP checks with httpx, no Django imports.
+
+Used by the Celery checker (api.checks), the ad-hoc probe views and the
+standalone probe agent (probe_agent.py), which runs on nodes without the
+Django project. A probe target is anything with ``url``, ``method``,
+``headers``, ``timeout_ms`` and ``expected_status`` attributes, so both
+Endpoint instances and the agent's leased endpoint records work.
+
+An optional ``kind`` picks the probe: ``http`` (default) sends the request
+and follows redirects; ``head`` sends HEAD and takes the first answer;
+``tcp`` only connects to the URL's host and port, and ``tls`` also
+completes a verified TLS handshake. Connect probes report status code 0.
+"""
+import asyncio
+import contextlib
+import logging
+import random
+import ssl
+import time
+from urllib.parse import urlsplit
+
+import httpx
+
+# Tunables
+MAX_CONCURRENCY = 20
+RETRY_COUNT = 1
+BACKOFF_BASE_S = 0.2
+
+KIND_HTTP = "http"
+KIND_HEAD = "head"
+KIND_TCP = "tcp"
+KIND_TLS = "tls"
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+_tls_context = None
+
+log = logging.getLogger(__name__)
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def host_of(url: str) -> str:
+    """Rate-limit key for the host (and port) a URL points at."""
+    return (urlsplit(url).netloc or url).lower()
+
+
+def address_of(url: str):
+    """(host, port) a connect probe dials; the port defaults by scheme."""
+    parts = urlsplit(url)
+    return parts.hostname, parts.port or DEFAULT_PORTS.get(parts.scheme)
+
+
+def _tls():
+    global _tls_context
+    if _tls_context is None:
+        # Loading the CA bundle is the expensive part; do it once per process.
+        _tls_context = ssl.create_default_context()
+    return _tls_context
+
+
+class TokenBucket:
+    """``rate`` tokens per second, holding at most ``burst``; starts full."""
+
+    def __init__(self, rate: float, burst: float, now=None):
+        self.configure(rate, burst)
+        self.tokens = self.burst
+        self.updated = time.monotonic() if now is None else now
+
+    def configure(self, rate: float, burst: float):
+        self.rate = max(float(rate), 1e-6)
+        self.burst = max(float(burst), 1.0)
+        self.tokens = min(getattr(self, "tokens", self.burst), self.burst)
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now) -> float:
+        """Seconds until one token is available (0 if one is now)."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+
+class RateLimiter:
+    """
+    Token buckets keyed by probe target, e.g. ``("service", 7)`` and
+    ``("host", "api:8000")``. A probe needs a token from every bucket it
+    touches; callers defer it by the returned wait instead of dropping it.
+    Buckets live in the process; see SharedRateLimiter for limits that hold
+    across processes. ``clock`` (monotonic seconds) can be replaced, e.g. by
+    a simulation's.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self._buckets = {}
+        self._clock = clock
+
+    def _bucket(self, key, rate, burst, now) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(rate, burst, now)
+        else:
+            # Limits may have been reconfigured; the fill level carries over.
+            bucket.configure(rate, burst)
+        return bucket
+
+    def acquire(self, limits) -> float:
+        """
+        ``limits`` is an iterable of ``(key, rate_per_s, burst)``. Takes one
+        token from each bucket if all have one and returns 0; otherwise takes
+        nothing and returns the seconds until all of them will.
+        """
+        now = self._clock()
+        buckets = [self._bucket(key, rate, burst, now) for key, rate, burst in limits]
+        wait = max((b.wait_time(now) for b in buckets), default=0.0)
+        if wait == 0:
+            for b in buckets:
+                b.take()
+        return wait
+
+
+# KEYS are bucket hashes, ARGV their (rate, burst) pairs. Same rules as
+# RateLimiter.acquire, on Redis's clock; the wait is a string, as Lua numbers
+# would come back truncated to integers.
+_ACQUIRE_LUA = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local levels, wait = {}, 0
+for i, key in ipairs(KEYS) do
+    local rate, burst = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+    local state = redis.call('HMGET', key, 'tokens', 'updated')
+    local tokens = tonumber(state[1]) or burst
+    local updated = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+    levels[i] = tokens
+    if tokens < 1 then
+        wait = math.max(wait, (1 - tokens) / rate)
+    end
+end
+for i, key in ipairs(KEYS) do
+    local rate, burst = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+    local tokens = levels[i]
+    if wait == 0 then
+        tokens = tokens - 1
+    end
+    redis.call('HSET', key, 'tokens', tokens, 'updated', now)
+    redis.call('EXPIRE', key, math.ceil(burst / rate) + 60)
+end
+return tostring(wait)
+"""
+
+
+class SharedRateLimiter:
+    """
+    RateLimiter whose buckets live in Redis, so every process probing with
+    the same ``url`` (Celery workers, run_checker, the API leasing to agents)
+    draws from one budget per service and host. A Lua script takes the tokens
+    atomically. If Redis is unreachable, the process falls back to its own
+    buckets and tries Redis again after RETRY_S.
+    """
+
+    PREFIX = "monitor:probe-bucket:"
+    RETRY_S = 30.0
+
+    def __init__(self, url, client=None):
+        self.url = url
+        self._client = client
+        self._script = None
+        self._local = RateLimiter()
+        self._down_until = 0.0
+
+    def _acquire_script(self):
+        if self._script is None:
+            if self._client is None:
+                import redis
+                self._client = redis.Redis.from_url(self.url, socket_connect_timeout=1, socket_timeout=1)
+            self._script = self._client.register_script(_ACQUIRE_LUA)
+        return self._script
+
+    def acquire(self, limits) -> float:
+        """Same contract as RateLimiter.acquire."""
+        limits = list(limits)
+        keys = [self.PREFIX + ":".join(str(part) for part in key) for key, _, _ in limits]
+        args = []
+        for _, rate, burst in limits:
+            args += [max(float(rate), 1e-6), max(float(burst), 1.0)]
+        if time.monotonic() >= self._down_until:
+            try:
+                return float(self._acquire_script()(keys=keys, args=args))
+            except Exception as e:
+                log.warning("Shared probe rate limits unavailable, limiting in-process: %s", e)
+                self._down_until = time.monotonic() + self.RETRY_S
+        return self._local.acquire(limits)
+
+
+async def probe(client: httpx.AsyncClient, ep):
+    """
+    Single probe attempt. Returns tuple:
+    (ok: bool, status_code: int, elapsed_ms: int, details: str)
+    """
+    kind = getattr(ep, "kind", None) or KIND_HTTP
+    if kind in (KIND_TCP, KIND_TLS):
+        return await probe_connect(ep, tls=kind == KIND_TLS)
+
+    start = _now_ms()
+    try:
+        method = "HEAD" if kind == KIND_HEAD else (ep.method or "GET").upper()
+        timeout_s = max(0.001, (ep.timeout_ms or 5000) / 1000.0)
+
+        r = await client.request(
+            method,
+            ep.url,
+            headers=ep.headers or {},
+            timeout=httpx.Timeout(timeout_s),
+            follow_redirects=kind == KIND_HTTP,
+        )
+        elapsed = _now_ms() - start
+        ok = (r.status_code == (ep.expected_status or 200))
+        if not ok:
+            return False, r.status_code, elapsed, f"Expected {ep.expected_status} got {r.status_code}"
+        return True, r.status_code, elapsed, ""
+    except Exception as e:
+        elapsed = _now_ms() - start
+        return False, 0, elapsed, str(e)
+
+
+async def probe_connect(ep, tls=False):
+    """TCP connect (plus TLS handshake if ``tls``) to the URL's host and port; nothing is sent."""
+    start = _now_ms()
+    timeout_s = max(0.001, (ep.timeout_ms or 5000) / 1000.0)
+    writer = None
+    try:
+        host, port = address_of(ep.url)
+        if not host or not port:
+            return False, 0, 0, f"No host and port in {ep.url}"
+        _, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port, ssl=_tls() if tls else None),
+            timeout_s,
+        )
+        return True, 0, _now_ms() - start, ""
+    except asyncio.TimeoutError:
+        return False, 0, _now_ms() - start, f"Connect timed out after {timeout_s:g}s"
+    except Exception as e:
+        return False, 0, _now_ms() - start, str(e) or type(e).__name__
+    finally:
+        if writer is not None:
+            writer.close()
+            # Bounded: a TLS peer may never answer the close_notify.
+            with contextlib.suppress(OSError, asyncio.TimeoutError):
+                await asyncio.wait_for(writer.wait_closed(), timeout_s)
+
+
+def backoff_s() -> float:
+    """Pause before a retry."""
+    return BACKOFF_BASE_S + random.random() * 0.3
+
+
+def merge_retry(first, retried):
+    """Outcome of a failed attempt and its retry: the retry's, filled in from the first."""
+    ok, code, rtt, details = first
+    ok2, code2, rtt2, details2 = retried
+    return ok2, (code2 or code), (rtt2 or rtt), (details2 or details)
+
+
+async def probe_with_retry(client: httpx.AsyncClient, ep, limiter=None, limits=()):
+    outcome = await probe(client, ep)
+    # A retry is one more request to the target, so it needs its own tokens.
+    if not outcome[0] and RETRY_COUNT > 0 and (limiter is None or limiter.acquire(limits) == 0):
+        await asyncio.sleep(backoff_s())
+        outcome = merge_retry(outcome, await probe(client, ep))
+    return outcome
+
+
+async def fetch_results(endpoints, retry=True, max_concurrency=MAX_CONCURRENCY, limiter=None, limits_for=None):
+    """
+    Run all probes concurrently with a connection limit. With a ``limiter``,
+    retries only go out if ``limits_for(ep)`` still has tokens; first attempts
+    are expected to have been admitted by the caller (see RateLimiter).
+    """
+    async with httpx.AsyncClient(limits=httpx.Limits(max_connections=max_concurrency)) as client:
+        if retry:
+            tasks = [
+                probe_with_retry(client, ep, limiter, limits_for(ep) if limiter else ())
+                for ep in endpoints
+            ]
+        else:
+            tasks = [probe(client, ep) for ep in endpoints]
+        return await asyncio.gather(*tasks)
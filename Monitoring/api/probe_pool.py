@@ -0,0 +1,147 @@
+# api/probe_pool.py
+"""
+Multi-process probe engine.
+
+N worker processes, each with its own event loop and a persistent httpx
+connection pool, run the api.probe engine. Endpoints are partitioned by a
+jump consistent hash of their id, so an endpoint always lands on the same
+worker (keeping its connections warm) and only ~1/N of them move when N
+changes. Outcomes flow back over one queue to the parent, which is the single
+writer. Workers are spawned, not forked, and import nothing from Django.
+
+Workers make one attempt per submitted endpoint. Retries are the parent's
+call, as they need tokens from its rate limiter: it submits them again with
+``retry=True`` and the worker backs off before probing.
+"""
+import asyncio
+import multiprocessing
+import queue
+import time
+from types import SimpleNamespace
+
+import httpx
+
+from .probe import MAX_CONCURRENCY, backoff_s, probe
+
+SPEC_FIELDS = ("id", "url", "method", "headers", "timeout_ms", "expected_status", "kind")
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """Lamping & Veach jump consistent hash of an integer key into ``buckets``."""
+    b, j = -1, 0
+    key &= 0xFFFFFFFFFFFFFFFF
+    while j < buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((b + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+    return b
+
+
+def spec(ep) -> dict:
+    """Picklable probe target for a worker."""
+    return {name: getattr(ep, name) for name in SPEC_FIELDS}
+
+
+async def _run_batch(client, specs, retry, outbox):
+    if retry:
+        await asyncio.sleep(backoff_s())
+    targets = [SimpleNamespace(**s) for s in specs]
+    outcomes = await asyncio.gather(*(probe(client, t) for t in targets))
+    outbox.put([(t.id, outcome) for t, outcome in zip(targets, outcomes)])
+
+
+async def _worker_loop(inbox, outbox, max_concurrency):
+    loop = asyncio.get_running_loop()
+    pending = set()
+    async with httpx.AsyncClient(limits=httpx.Limits(max_connections=max_concurrency)) as client:
+        while True:
+            batch = await loop.run_in_executor(None, inbox.get)
+            if batch is None:
+                break
+            specs, retry = batch
+            task = loop.create_task(_run_batch(client, specs, retry, outbox))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        if pending:
+            await asyncio.gather(*pending)
+
+
+def _worker_main(inbox, outbox, max_concurrency):
+    try:
+        asyncio.run(_worker_loop(inbox, outbox, max_concurrency))
+    except KeyboardInterrupt:
+        pass
+
+
+class ProbePool:
+    """
+    ``submit()`` endpoint batches, then drain ``(endpoint_id, outcome)`` pairs
+    with ``results()``. Batches keep running concurrently inside each worker,
+    bounded by its connection pool.
+    """
+
+    def __init__(self, processes, max_concurrency=MAX_CONCURRENCY):
+        ctx = multiprocessing.get_context("spawn")
+        self.outbox = ctx.Queue()
+        self.inboxes = [ctx.Queue() for _ in range(max(1, processes))]
+        self.procs = [
+            ctx.Process(
+                target=_worker_main,
+                args=(inbox, self.outbox, max_concurrency),
+                name=f"probe-worker-{i}",
+                daemon=True,
+            )
+            for i, inbox in enumerate(self.inboxes)
+        ]
+
+    def __len__(self):
+        return len(self.procs)
+
+    def start(self):
+        for p in self.procs:
+            p.start()
+        return self
+
+    def partition(self, endpoints):
+        parts = [[] for _ in self.procs]
+        for ep in endpoints:
+            parts[jump_hash(ep.id, len(parts))].append(ep)
+        return parts
+
+    def submit(self, endpoints, retry=False):
+        """Probe ``endpoints`` once each; ``retry`` batches wait a backoff first."""
+        for inbox, part in zip(self.inboxes, self.partition(endpoints)):
+            if part:
+                inbox.put(([spec(ep) for ep in part], retry))
+
+    def results(self, timeout):
+        """Waits up to ``timeout`` seconds for outcomes, then also takes whatever else is queued."""
+        out = []
+        try:
+            out.extend(self.outbox.get(timeout=timeout))
+            while True:
+                out.extend(self.outbox.get_nowait())
+        except queue.Empty:
+            pass
+        return out
+
+    def dead_workers(self):
+        return [p.name for p in self.procs if not p.is_alive()]
+
+    def close(self, timeout=30.0):
+        """
+        Let workers finish their batches and stop. Returns outcomes that
+        arrived meanwhile (the outbox has to be drained for workers to exit).
+        """
+        for inbox in self.inboxes:
+            inbox.put(None)
+        out = []
+        deadline = time.monotonic() + timeout
+        while any(p.is_alive() for p in self.procs) and time.monotonic() < deadline:
+            out.extend(self.results(timeout=0.1))
+        out.extend(self.results(timeout=0))
+        for p in self.procs:
+            if p.is_alive():
+                p.terminate()
+            p.join(1)
+        return out
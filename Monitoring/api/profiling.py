@@ -0,0 +1,208 @@
+# api/profiling.py
+import itertools
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import asynccontextmanager, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils import timezone
+
+log = logging.getLogger(__name__)
+
+_counters = {}
+_counters_lock = threading.Lock()
+
+
+def profiling_enabled() -> bool:
+    return bool(settings.PROFILE_EVERY_N or settings.PROFILE_SLOW_MS)
+
+
+class SamplingProfiler:
+    """
+    Minimal wall-clock sampling profiler: a daemon thread snapshots the target
+    thread's stack every ``interval`` seconds via ``sys._current_frames()`` and
+    aggregates them as folded stacks (``a;b;c <count>``), the input format of
+    flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, interval: float, thread_id: int = None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            parts = []
+            while frame is not None:
+                code = frame.f_code
+                parts.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(parts))] += 1
+            self.samples += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+
+def _is_nth_run(kind: str) -> bool:
+    every_n = settings.PROFILE_EVERY_N
+    if not every_n:
+        return False
+    with _counters_lock:
+        n = next(_counters.setdefault(kind, itertools.count(1)))
+    return n % every_n == 0
+
+
+class _Run:
+    """Sampling state of one profiled block; see profiled()."""
+
+    def __init__(self, kind: str, name: str):
+        self.kind = kind
+        self.name = name
+        self.slow_ms = settings.PROFILE_SLOW_MS
+        self.nth = _is_nth_run(kind)
+        # Slow runs can only be recognised afterwards, so with PROFILE_SLOW_MS
+        # set every run is sampled and the samples are dropped if it was fast.
+        self.active = bool(self.nth or self.slow_ms)
+        self.profiler = None
+        self.elapsed_ms = 0.0
+
+    def start(self):
+        self.profiler = SamplingProfiler(settings.PROFILE_INTERVAL_MS / 1000.0)
+        self._started = time.perf_counter()
+        self.profiler.start()
+
+    def stop(self) -> bool:
+        """Stop sampling; True if the capture should be kept."""
+        self.profiler.stop()
+        self.elapsed_ms = (time.perf_counter() - self._started) * 1000
+        slow = self.slow_ms and self.elapsed_ms >= self.slow_ms
+        return bool((self.nth or slow) and self.profiler.samples)
+
+    def save(self):
+        try:
+            save_profile(self.kind, self.name, self.elapsed_ms, self.profiler)
+        except Exception:
+            log.exception("Could not store %s profile for %s", self.kind, self.name)
+
+
+@contextmanager
+def profiled(kind: str, name: str):
+    """
+    Profile the enclosed block when it is the PROFILE_EVERY_N-th run of its
+    kind or takes longer than PROFILE_SLOW_MS, and store it as a ProfileCapture.
+    """
+    run = _Run(kind, name)
+    if not run.active:
+        yield
+        return
+    run.start()
+    try:
+        yield
+    finally:
+        if run.stop():
+            run.save()
+
+
+@asynccontextmanager
+async def aprofiled(kind: str, name: str):
+    """Async variant of profiled(); the capture is stored off the event loop."""
+    run = _Run(kind, name)
+    if not run.active:
+        yield
+        return
+    run.start()
+    try:
+        yield
+    finally:
+        if run.stop():
+            await sync_to_async(run.save)()
+
+
+def save_profile(kind: str, name: str, elapsed_ms: float, profiler: SamplingProfiler):
+    from .models import ProfileCapture
+
+    profile_dir = settings.PROFILE_DIR
+    os.makedirs(profile_dir, exist_ok=True)
+    stamp = timezone.now().strftime("%Y%m%dT%H%M%S%f")
+    file_name = f"{kind}-{stamp}-{os.getpid()}.folded"
+    data = profiler.folded().encode()
+    with open(os.path.join(profile_dir, file_name), "wb") as fh:
+        fh.write(data)
+
+    ProfileCapture.objects.create(
+        kind=kind,
+        name=name[:200],
+        duration_ms=int(elapsed_ms),
+        samples=profiler.samples,
+        size_bytes=len(data),
+        file_name=file_name,
+    )
+    prune_profiles()
+
+
+def prune_profiles():
+    """Delete the oldest captures until PROFILE_MAX_FILES / PROFILE_MAX_BYTES hold."""
+    from .models import ProfileCapture
+
+    kept_files, kept_bytes, doomed = 0, 0, []
+    for cap in ProfileCapture.objects.order_by("-created_at").only("id", "size_bytes", "file_name"):
+        if kept_files < settings.PROFILE_MAX_FILES and kept_bytes + cap.size_bytes <= settings.PROFILE_MAX_BYTES:
+            kept_files += 1
+            kept_bytes += cap.size_bytes
+        else:
+            doomed.append(cap)
+    for cap in doomed:
+        cap.delete()
+
+
+class ProfilingMiddleware:
+    """
+    Profiles API requests selected by PROFILE_EVERY_N / PROFILE_SLOW_MS. Under
+    ASGI the sampled thread is the event loop's, so samples of a profiled
+    request can include other requests interleaved on the same loop.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not profiling_enabled():
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        self.prefixes = tuple(settings.PROFILE_PATH_PREFIXES)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not request.path.startswith(self.prefixes):
+            return self.get_response(request)
+        with profiled("request", f"{request.method} {request.path}"):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        if not request.path.startswith(self.prefixes):
+            return await self.get_response(request)
+        async with aprofiled("request", f"{request.method} {request.path}"):
+            return await self.get_response(request)
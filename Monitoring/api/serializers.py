@@ -9,6 +9,37 @@ from .models import Service, Endpoint, CheckResult
 DOCKER_HOST_RE = re.compile(r'^[a-z0-9]([a-z0-9-]{0,61}[a-z0-9])?$')
 
 
+def requested_fields(request):
+    """Field names from ``?fields=a,b`` on a DRF or plain Django request, else None."""
+    if request is None:
+        return None
+    params = getattr(request, "query_params", request.GET)
+    raw = params.get("fields")
+    if not raw:
+        return None
+    return [f.strip() for f in raw.split(",") if f.strip()]
+
+
+class SparseFieldsMixin:
+    """
+    Sparse fieldsets: output only the fields named in ``?fields=`` (or the
+    ``fields=`` kwarg). Only applied to reads, so writes always validate the
+    full field set. Unknown names (nested ones like ``service.name``
+    included) are ignored, and if none is known every field is output, as
+    CheckResultSerializer.values_queryset does.
+    """
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if fields is None and request is not None and request.method in ('GET', 'HEAD'):
+            fields = requested_fields(request)
+        if fields and set(fields) & set(self.fields):
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
 def validate_docker_url(value: str) -> str:
     """
     Relaxed URL validator that allows Docker service DNS names (e.g., http://twitter:8000)
@@ -34,12 +65,12 @@ def validate_docker_url(value: str) -> str:
     )
 
 
-class ServiceSerializer(serializers.ModelSerializer):
+class ServiceSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     url = serializers.CharField(validators=[validate_docker_url])
 
     class Meta:
         model = Service
-        fields = ['id', 'name', 'url', 'status', 'last_checked']
+        fields = ['id', 'name', 'url', 'status', 'last_checked', 'tier', 'probe_rate_per_s', 'probe_burst']
         read_only_fields = ['status', 'last_checked']
 
     def validate(self, data):
@@ -48,7 +79,7 @@ class ServiceSerializer(serializers.ModelSerializer):
 
 
 
-class EndpointSerializer(serializers.ModelSerializer):
+class EndpointSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     url = serializers.CharField(validators=[validate_docker_url])
 
     VALID_METHODS = {'GET', 'POST', 'PUT', 'DELETE', 'PATCH', 'HEAD', 'OPTIONS'}
@@ -57,12 +88,18 @@ class EndpointSerializer(serializers.ModelSerializer):
         model = Endpoint
         fields = [
             'id', 'service', 'url', 'method', 'expected_status',
-            'timeout_ms', 'interval_sec', 'headers', 'enabled', 'next_run_at'
+            'timeout_ms', 'interval_sec', 'headers', 'enabled', 'next_run_at', 'tier', 'mode',
+            'kind', 'state', 'latency_mean_ms',
         ]
+        read_only_fields = ['state', 'latency_mean_ms']
         extra_kwargs = {
             'url': {'help_text': 'Health endpoint URL (e.g. http://service:8000/health)'},
             'interval_sec': {'help_text': 'How often to check (in seconds, min 15s)'},
             'timeout_ms': {'help_text': 'Request timeout in milliseconds'},
+            'tier': {'help_text': "Probe tier; empty to use the service's tier"},
+            'mode': {'help_text': 'poll: probed by the checker; push: the service sends heartbeats'},
+            'kind': {'help_text': "http: full request; head: HEAD, no redirects; tcp/tls: connect "
+                                  "(and handshake) to the URL's host and port only"},
         }
 
     def validate(self, data):
@@ -85,11 +122,43 @@ class EndpointSerializer(serializers.ModelSerializer):
         return data
 
 
-class CheckResultSerializer(serializers.ModelSerializer):
+class CheckResultSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = CheckResult
         fields = [
             'id', 'endpoint', 'timestamp', 'status_code',
-            'response_time_ms', 'success', 'details'
+            'response_time_ms', 'success', 'details',
+            'repeat_count', 'last_timestamp', 'latency_sum_ms', 'latency_max_ms',
         ]
         read_only_fields = fields
+
+    # Serializer field -> model column, for list views that read with values().
+    VALUES_COLUMNS = {
+        'id': 'id',
+        'endpoint': 'endpoint_id',
+        'timestamp': 'timestamp',
+        'status_code': 'status_code',
+        'response_time_ms': 'response_time_ms',
+        'success': 'success',
+        'details': 'details',
+        'repeat_count': 'repeat_count',
+        'last_timestamp': 'last_timestamp',
+        'latency_sum_ms': 'latency_sum_ms',
+        'latency_max_ms': 'latency_max_ms',
+    }
+
+    @classmethod
+    def values_queryset(cls, queryset, fields=None):
+        """
+        Read-only fast path: ``queryset.values()`` over the columns behind
+        ``fields`` (default: all), for list views that skip model
+        instantiation and per-field serialization. Pair with from_values().
+        """
+        names = [f for f in (fields or ()) if f in cls.VALUES_COLUMNS] or cls.Meta.fields
+        return queryset.values(*[cls.VALUES_COLUMNS[f] for f in names])
+
+    @classmethod
+    def from_values(cls, rows):
+        """Rename values() columns to this serializer's field names."""
+        names = {column: field for field, column in cls.VALUES_COLUMNS.items()}
+        return [{names[k]: v for k, v in row.items()} for row in rows]
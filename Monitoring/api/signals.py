@@ -0,0 +1,30 @@
+# api/signals.py
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .config_cache import bump_version
+from .models import Endpoint, Service
+
+# Fields the checker itself rewrites every tick; saving only these is not a
+# configuration change.
+RUNTIME_FIELDS = {
+    Endpoint: {
+        "next_run_at", "state", "state_changed_at", "current_result", "latency_mean_ms",
+        "latency_var", "latency_samples", "latency_hourly", "latency_anomalies",
+    },
+    Service: {"status", "last_checked"},
+}
+
+
+@receiver(post_save, sender=Endpoint)
+@receiver(post_save, sender=Service)
+def config_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) <= RUNTIME_FIELDS[sender]:
+        return
+    bump_version()
+
+
+@receiver(post_delete, sender=Endpoint)
+@receiver(post_delete, sender=Service)
+def config_deleted(sender, instance, **kwargs):
+    bump_version()
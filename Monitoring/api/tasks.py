@@ -1,7 +1,22 @@
 from celery import shared_task
-from .checks import run_due_checks
+
+# Task bodies import their modules on first use: autodiscovery loads this file
+# at worker start, and the probe engine / alert client are not needed until then.
 
 
 @shared_task(name="api.run_due_checks")
-def run_due_checks_task():
-    return run_due_checks()
+def run_due_checks_task(tier=None):
+    from .checks import run_due_checks
+    return run_due_checks(tier)
+
+
+@shared_task(name="api.dispatch_alerts", ignore_result=True)
+def dispatch_alerts_task(incident_ids):
+    from .alerts import dispatch
+    return dispatch(incident_ids)
+
+
+@shared_task(name="api.sweep_heartbeats")
+def sweep_heartbeats_task():
+    from .heartbeats import sweep
+    return sweep()
@@ -1,3 +1,1556 @@
-from django.test import TestCase
+import asyncio
+import decimal
+import gzip
+import importlib
+import io
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches, resolve
+from django.utils import timezone
+
+from . import alerts, async_views, baselines, checks, events, heartbeats, profiling, timeseries, views, writer
+from . import urls as api_urls
+from monitoring_api import urls as project_urls
+from .admin import EstimatedCountPaginator
+from .config_cache import VERSION_KEY, EndpointConfigCache
+from .db_routing import PIN_COOKIE, ReplicaReadsMiddleware, ReplicaRouter, no_pin, use_primary
+from .instrumentation import QueryBudgetExceeded, query_budget
+from .metrics import endpoint_degraded
+from .models import CheckResult, Endpoint, Incident, ProfileCapture, Service
+from .management.commands import run_checker
+from .probe import RateLimiter, SharedRateLimiter, TokenBucket, address_of, probe, probe_with_retry
+from .probe_pool import ProbePool, jump_hash
+from .renderers import FastJSONRenderer
+from .serializers import CheckResultSerializer
+from .tasks import dispatch_alerts_task, run_due_checks_task
+
+
+def make_service(name="svc", endpoints=0, **fields):
+    """A service with ``endpoints`` enabled endpoints, all due now."""
+    svc = Service.objects.create(name=name, url=f"http://{name}:8000", **fields)
+    now = timezone.now()
+    for i in range(endpoints):
+        Endpoint.objects.create(service=svc, url=f"http://{name}:8000/health/{i}", next_run_at=now)
+    return svc
+
+
+def fake_probes(ok=True, code=200, rtt=20):
+    """Patch the probe engine so ticks make no network calls."""
+    async def fetch_results(endpoints, **kwargs):
+        return [(ok, code, rtt, "" if ok else "down") for _ in endpoints]
+    return mock.patch.object(checks, "fetch_results", fetch_results)
+
+
+# No Redis in tests: live events and heartbeats fall back to their no-Redis paths.
+@override_settings(MONITOR_EVENTS_REDIS_URL="", HEARTBEAT_REDIS_URL="")
+class MonitorTestCase(TestCase):
+    def setUp(self):
+        # Config cache and probe budgets are per process; start each test fresh.
+        checks._config.clear()
+        patcher = mock.patch.object(checks, "_limiter", RateLimiter())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class QueryBudgetTests(MonitorTestCase):
+    """Query counts of the hot paths must not grow with the number of rows."""
+
+    def test_budget_raises_with_the_captured_sql(self):
+        with self.assertRaises(QueryBudgetExceeded) as caught:
+            with query_budget(1, label="two queries"):
+                Service.objects.count()
+                Endpoint.objects.count()
+        self.assertIn("two queries", str(caught.exception))
+
+    def test_run_due_checks(self):
+        for name in "abcde":
+            make_service(name, endpoints=5)
+        with fake_probes(), query_budget(9, label="run_due_checks"):
+            self.assertEqual(checks.run_due_checks(), 25)
+        self.assertEqual(CheckResult.objects.count(), 25)
+
+    def test_results_list(self):
+        svc = make_service("a", endpoints=3)
+        CheckResult.objects.bulk_create(
+            CheckResult(endpoint=ep, status_code=200, response_time_ms=10, success=True)
+            for ep in svc.endpoint.all() for _ in range(40)
+        )
+        self.client.force_login(get_user_model().objects.create_superuser("admin", "", "pw"))
+        with query_budget(5, label="/api/results/"):
+            response = self.client.get("/api/results/")
+        self.assertEqual(response.status_code, 200)
+
+    def test_checkresult_admin_changelist(self):
+        svc = make_service("a", endpoints=3)
+        CheckResult.objects.bulk_create(
+            CheckResult(endpoint=ep, status_code=200, response_time_ms=10, success=True)
+            for ep in svc.endpoint.all() for _ in range(40)
+        )
+        self.client.force_login(get_user_model().objects.create_superuser("admin", "", "pw"))
+        with query_budget(8, label="CheckResult changelist"):
+            response = self.client.get("/admin/api/checkresult/")
+        self.assertEqual(response.status_code, 200)
+
+    def test_changelist_marks_a_capped_count(self):
+        svc = make_service("a", endpoints=3)
+        CheckResult.objects.bulk_create(
+            CheckResult(endpoint=ep, status_code=200, response_time_ms=10, success=True)
+            for ep in svc.endpoint.all() for _ in range(40)
+        )
+        self.client.force_login(get_user_model().objects.create_superuser("admin", "", "pw"))
+        with mock.patch.object(EstimatedCountPaginator, "COUNT_CAP", 50):
+            self.assertContains(self.client.get("/admin/api/checkresult/"), "50+ check results")
+        with mock.patch.object(EstimatedCountPaginator, "COUNT_CAP", 120):
+            response = self.client.get("/admin/api/checkresult/")
+        self.assertContains(response, "120 check results")
+        self.assertNotContains(response, "120+")
+
+    @skipUnless(connection.vendor == "sqlite", "reads SQLite's query plan")
+    def test_time_window_uses_the_timestamp_index(self):
+        since = timezone.now() - timedelta(hours=24)
+        with CaptureQueriesContext(connection) as queries:
+            EstimatedCountPaginator(CheckResult.objects.filter(timestamp__gte=since).order_by("-id"), 100).count
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + queries[0]["sql"])
+            plan = " ".join(row[-1] for row in cursor.fetchall())
+        self.assertIn("api_checkre_timesta_4fdd1f_idx", plan)
+
+
+class ProbeBatchTests(MonitorTestCase):
+    def post(self, body):
+        return self.client.post("/api/probe/batch/", body, content_type="application/json")
+
+    def test_rejects_malformed_bodies(self):
+        for body in ('{"service": "abc"}', '{"ids": ["x"]}', '{"ids": []}', '{"ids": 3}', "[1, 2]", "not json", "{}"):
+            with self.subTest(body=body):
+                self.assertEqual(self.post(body).status_code, 400)
+
+    def test_probes_the_listed_endpoints(self):
+        svc = make_service("a", endpoints=2)
+        ids = list(svc.endpoint.values_list("id", flat=True))
+
+        async def probe_now(endpoints):
+            return [(True, 200, 5, "") for _ in endpoints]
+
+        with mock.patch("api.views.probe_now", probe_now):
+            response = self.post({"ids": ids})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["ok"], 2)
+
+    def test_connect_probes_expect_no_status(self):
+        svc = make_service("a", endpoints=1)
+        http = svc.endpoint.get()
+        tcp = Endpoint.objects.create(service=svc, url=http.url, kind=Endpoint.KIND_TCP)
+
+        async def probe_now(endpoints):
+            return [(True, 0, 5, "") for _ in endpoints]
+
+        with mock.patch("api.views.probe_now", probe_now):
+            results = self.post({"ids": [http.id, tcp.id]}).json()["results"]
+        expected = {r["id"]: r["expected"] for r in results}
+        self.assertEqual(expected, {http.id: 200, tcp.id: None})
+
+
+class AdminFilterTests(MonitorTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(get_user_model().objects.create_superuser("admin", "", "pw"))
+
+    def test_invalid_filter_values_are_ignored(self):
+        make_service("a", endpoints=1)
+        for url in (
+            "/admin/api/checkresult/?service=abc",
+            "/admin/api/checkresult/?status_code=abc",
+            "/admin/api/endpoint/?service=abc",
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_service_filter(self):
+        a, b = make_service("a", endpoints=1), make_service("b", endpoints=1)
+        for svc in (a, b):
+            CheckResult.objects.create(endpoint=svc.endpoint.get(), status_code=200, response_time_ms=1, success=True)
+        response = self.client.get(f"/admin/api/checkresult/?service={a.id}")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {r.endpoint.service_id for r in response.context["cl"].result_list}, {a.id},
+        )
+
+
+class RateLimiterTests(TestCase):
+    def test_token_bucket_refills_at_its_rate(self):
+        bucket = TokenBucket(rate=2, burst=3, now=0.0)
+        for _ in range(3):
+            self.assertEqual(bucket.wait_time(0.0), 0)
+            bucket.take()
+        self.assertAlmostEqual(bucket.wait_time(0.0), 0.5)
+        self.assertEqual(bucket.wait_time(0.5), 0)
+        # Never holds more than the burst.
+        self.assertEqual(bucket.wait_time(100.0), 0)
+        self.assertEqual(bucket.tokens, 3)
+
+    def test_limiter_takes_from_every_bucket_or_none(self):
+        now = [0.0]
+        limiter = RateLimiter(clock=lambda: now[0])
+        service = (("service", 1), 1, 1)
+        host = (("host", "a:80"), 1, 2)
+        self.assertEqual(limiter.acquire([service, host]), 0)
+        # The service bucket is empty: nothing is taken from the host bucket.
+        self.assertAlmostEqual(limiter.acquire([service, host]), 1.0)
+        self.assertEqual(limiter.acquire([host]), 0)
+        now[0] = 1.0
+        self.assertEqual(limiter.acquire([service]), 0)
+
+    def test_shared_limiter_takes_tokens_in_redis(self):
+        script = mock.Mock(return_value=b"0.25")
+        client = mock.Mock(**{"register_script.return_value": script})
+        limiter = SharedRateLimiter("redis://test", client=client)
+        self.assertEqual(limiter.acquire([(("service", 1), 5, 10), (("host", "a:80"), 0, 0)]), 0.25)
+        script.assert_called_once_with(
+            keys=["monitor:probe-bucket:service:1", "monitor:probe-bucket:host:a:80"],
+            args=[5.0, 10.0, 1e-6, 1.0],
+        )
+
+    def test_shared_limiter_falls_back_to_local_buckets(self):
+        script = mock.Mock(side_effect=ConnectionError("down"))
+        client = mock.Mock(**{"register_script.return_value": script})
+        limiter = SharedRateLimiter("redis://test", client=client)
+        service = (("service", 1), 1, 1)
+        with self.assertLogs("api.probe", "WARNING"):
+            self.assertEqual(limiter.acquire([service]), 0)
+        self.assertGreater(limiter.acquire([service]), 0)
+        # Redis is not asked again until RETRY_S has passed.
+        self.assertEqual(script.call_count, 1)
+
+    def test_retries_need_a_token(self):
+        attempts = []
+
+        async def failing_probe(client, ep):
+            attempts.append(ep)
+            return False, 500, 1, "boom"
+
+        limiter = RateLimiter()
+        limits = [(("service", 1), 1, 1)]
+        self.assertEqual(limiter.acquire(limits), 0)
+        with mock.patch("api.probe.probe", failing_probe):
+            asyncio.run(probe_with_retry(None, "ep", limiter, limits))
+        self.assertEqual(len(attempts), 1)
+
+
+class AdmitTests(MonitorTestCase):
+    def test_over_limit_endpoints_are_deferred_at_the_service_rate(self):
+        svc = make_service("a", endpoints=5, probe_rate_per_s=2, probe_burst=2)
+        endpoints = list(Endpoint.objects.select_related("service").filter(service=svc).order_by("id"))
+        before = timezone.now()
+        admitted = checks._admit(endpoints)
+        self.assertEqual(admitted, endpoints[:2])
+        deferred = list(Endpoint.objects.filter(id__in=[ep.id for ep in endpoints[2:]]).order_by("id"))
+        offsets = [(ep.next_run_at - before).total_seconds() for ep in deferred]
+        # The first waits for a token (0.5s at 2/s); the rest queue behind it 0.5s apart.
+        for offset, expected in zip(offsets, (0.5, 1.0, 1.5)):
+            self.assertAlmostEqual(offset, expected, delta=0.2)
+
+    def test_a_busy_host_defers_other_services(self):
+        make_service("a", endpoints=1)
+        make_service("b", endpoints=1)
+        Endpoint.objects.update(url="http://shared:80/health")
+        endpoints = list(Endpoint.objects.select_related("service").order_by("id"))
+        with override_settings(PROBE_HOST_RATE_PER_S=1, PROBE_HOST_BURST=1):
+            self.assertEqual(checks._admit(endpoints), endpoints[:1])
+
+
+class SchedulePhaseTests(TestCase):
+    def test_next_slot_is_on_the_phase(self):
+        svc = Service.objects.create(name="a", url="http://a:8000")
+        ep = Endpoint(service=svc, url="http://a:8000/health", interval_sec=60)
+        after = timezone.now()
+        slot = ep.next_slot(after)
+        self.assertGreater(slot, after)
+        self.assertLessEqual((slot - after).total_seconds(), 60)
+        self.assertAlmostEqual(slot.timestamp() % 60, ep.phase_s, places=3)
+        # The slot itself is not "after" itself: the next one is a whole interval later.
+        self.assertAlmostEqual((ep.next_slot(slot) - slot).total_seconds(), 60, places=3)
+
+    def test_phase_is_stable_and_spreads_endpoints(self):
+        svc = Service.objects.create(name="a", url="http://a:8000")
+        eps = [Endpoint(service=svc, url=f"http://a:8000/{i}", interval_sec=60) for i in range(50)]
+        phases = [ep.phase_s for ep in eps]
+        self.assertEqual(phases, [ep.phase_s for ep in eps])
+        self.assertTrue(all(0 <= p < 60 for p in phases))
+        self.assertGreater(len({int(p) for p in phases}), 20)
+
+    def test_kind_is_part_of_the_phase_and_of_the_key(self):
+        svc = Service.objects.create(name="a", url="http://a:8000")
+        http = Endpoint.objects.create(service=svc, url="http://a:8000/health")
+        tcp = Endpoint.objects.create(service=svc, url="http://a:8000/health", kind=Endpoint.KIND_TCP)
+        # HTTP endpoints keep the phase they had before kinds existed.
+        key = f"{svc.id}:GET:http://a:8000/health".encode()
+        self.assertAlmostEqual(http.phase_s, (zlib.crc32(key) % 60000) / 1000.0)
+        self.assertNotEqual(http.phase_s, tcp.phase_s)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Endpoint.objects.create(service=svc, url="http://a:8000/health", kind=Endpoint.KIND_TCP)
+
+    def test_new_endpoints_are_scheduled_on_their_phase(self):
+        svc = Service.objects.create(name="a", url="http://a:8000")
+        ep = Endpoint.objects.create(service=svc, url="http://a:8000/health", interval_sec=30)
+        self.assertAlmostEqual(ep.next_run_at.timestamp() % 30, ep.phase_s, places=3)
+
+
+class TimeseriesTests(MonitorTestCase):
+    def setUp(self):
+        super().setUp()
+        self.ep = make_service("a", endpoints=1).endpoint.get()
+        self.start = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+
+    def result(self, at, repeat=1, last=None, success=True, ms=10):
+        row = CheckResult.objects.create(
+            endpoint=self.ep, status_code=200, response_time_ms=ms, success=success, repeat_count=repeat,
+            latency_sum_ms=ms * repeat if repeat > 1 else None, last_timestamp=last,
+        )
+        # timestamp is auto_now_add
+        CheckResult.objects.filter(pk=row.pk).update(timestamp=at)
+
+    def points(self, end, step):
+        results = CheckResult.objects.filter(endpoint=self.ep)
+        rows = timeseries.aggregate(results, self.start, end, step, 95)
+        runs = timeseries.spanning_runs(results, self.start, end, step)
+        return {p["t"]: p for p in timeseries.to_points(rows, self.start, end, step, runs)}
+
+    def test_runs_are_spread_over_the_buckets_they_cross(self):
+        s = self.start
+        # 13 checks every 10 s from +50 s to +170 s: 1, 6 and 6 per minute.
+        self.result(s + timedelta(seconds=50), repeat=13, last=s + timedelta(seconds=170))
+        # Started before the range: checks at -30..+30 s, 4 of them inside it.
+        self.result(s - timedelta(seconds=30), repeat=7, last=s + timedelta(seconds=30), success=False, ms=40)
+        # An ordinary row.
+        self.result(s + timedelta(seconds=65), ms=100)
+
+        points = self.points(s + timedelta(minutes=5), 60)
+        minute = [points[s + timedelta(minutes=m)] for m in range(3)]
+        self.assertEqual([p["count"] for p in minute], [5, 7, 6])
+        self.assertEqual(minute[0]["success_ratio"], 0.2)
+        self.assertEqual(minute[1]["avg_ms"], round((6 * 10 + 100) / 7, 1))
+        self.assertEqual(sum(p["count"] for p in points.values()), 13 + 4 + 1)
+
+    def test_endpoint_timeseries_view(self):
+        s = self.start
+        self.result(s + timedelta(seconds=50), repeat=13, last=s + timedelta(seconds=170))
+        self.client.force_login(get_user_model().objects.create_superuser("admin", "", "pw"))
+        response = self.client.get(
+            f"/api/endpoints/{self.ep.id}/timeseries/",
+            {"start": int(s.timestamp()), "end": int(s.timestamp()) + 300, "step": "1m"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([p["count"] for p in response.json()["points"]], [1, 6, 6])
+
+    def test_checks_after_the_end_are_not_counted(self):
+        s = self.start
+        self.result(s + timedelta(seconds=10), repeat=10, last=s + timedelta(seconds=100))
+        points = self.points(s + timedelta(seconds=60), 60)
+        self.assertEqual([p["count"] for p in points.values()], [5])
+
+
+class ResultRunTests(MonitorTestCase):
+    def test_extends_run(self):
+        t = timezone.now()
+        row = CheckResult(status_code=200, response_time_ms=10, success=True, timestamp=t)
+        self.assertTrue(row.extends_run(True, 200, t + timedelta(seconds=60), max_gap_s=180, heartbeat_s=900))
+        self.assertFalse(row.extends_run(False, 200, t + timedelta(seconds=60), max_gap_s=180, heartbeat_s=900))
+        self.assertFalse(row.extends_run(True, 204, t + timedelta(seconds=60), max_gap_s=180, heartbeat_s=900))
+        # A gap in the checks, or a run as long as the heartbeat, starts a new row.
+        self.assertFalse(row.extends_run(True, 200, t + timedelta(seconds=181), max_gap_s=180, heartbeat_s=900))
+        row.last_timestamp = t + timedelta(seconds=800)
+        self.assertTrue(row.extends_run(True, 200, t + timedelta(seconds=890), max_gap_s=180, heartbeat_s=900))
+        self.assertFalse(row.extends_run(True, 200, t + timedelta(seconds=900), max_gap_s=180, heartbeat_s=900))
+
+    def test_add_check(self):
+        t = timezone.now()
+        row = CheckResult(status_code=200, response_time_ms=10, success=True, timestamp=t)
+        row.add_check(30, t + timedelta(seconds=60))
+        row.add_check(20, t + timedelta(seconds=120))
+        self.assertEqual(row.repeat_count, 3)
+        self.assertEqual(row.latency_sum_ms, 60)
+        self.assertEqual(row.latency_max_ms, 30)
+        self.assertEqual(row.last_timestamp, t + timedelta(seconds=120))
+
+    @override_settings(RESULT_STORAGE="changes")
+    def test_repeated_outcomes_extend_the_current_row(self):
+        make_service("a", endpoints=1)
+        ep = Endpoint.objects.get()
+        for ok in (True, True, True, False):
+            Endpoint.objects.update(next_run_at=timezone.now())
+            with fake_probes(ok=ok, code=200 if ok else 503):
+                checks.run_due_checks()
+        rows = list(CheckResult.objects.order_by("id"))
+        self.assertEqual([(r.success, r.repeat_count) for r in rows], [(True, 3), (False, 1)])
+        ep.refresh_from_db()
+        self.assertEqual(ep.current_result_id, rows[-1].id)
+
+
+class HeartbeatTests(MonitorTestCase):
+    def setUp(self):
+        super().setUp()
+        svc = make_service("a")
+        self.push = Endpoint.objects.create(service=svc, url="http://a:8000/push", mode=Endpoint.MODE_PUSH)
+        self.poll = Endpoint.objects.create(service=svc, url="http://a:8000/poll")
+
+    def beat(self, body):
+        return self.client.post(
+            "/api/heartbeats/", body, content_type="application/json",
+            headers={"X-Heartbeat-Token": views.HEARTBEAT_TOKEN},
+        )
+
+    def test_beats_are_recorded_and_counted_per_endpoint(self):
+        response = self.beat({"heartbeats": [{"id": self.push.id}, {"id": self.push.id}, {"id": self.poll.id}]})
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json(), {"received": 3, "accepted": 2})
+        # Without Redis beats are recorded at once; the poll endpoint's is dropped.
+        self.assertEqual(list(CheckResult.objects.values_list("endpoint_id", "success")), [(self.push.id, True)])
+        self.push.refresh_from_db()
+        self.assertEqual(self.push.state, Endpoint.STATE_UP)
+        self.assertGreater(self.push.next_run_at, timezone.now())
+
+    def test_missed_heartbeats_fail_the_endpoint(self):
+        Endpoint.objects.filter(pk=self.push.pk).update(next_run_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(heartbeats.sweep(), {"recorded": 0, "missed": 1})
+        self.push.refresh_from_db()
+        self.assertEqual(self.push.state, Endpoint.STATE_DOWN)
+        self.assertIn("No heartbeat", CheckResult.objects.get().details)
+        # The next deadline is a grace period on, so the sweep does not fail it again right away.
+        self.assertEqual(heartbeats.sweep(), {"recorded": 0, "missed": 0})
+
+    def test_push_endpoints_are_never_probed_or_rescheduled(self):
+        deadline = self.push.next_run_at
+        Endpoint.objects.filter(pk=self.poll.pk).update(next_run_at=timezone.now())
+        with fake_probes():
+            self.assertEqual(checks.run_due_checks(), 1)
+        call_command("rebalance_schedule", stdout=io.StringIO())
+        self.client.force_login(get_user_model().objects.create_superuser("admin", "", "pw"))
+        self.client.post("/admin/api/endpoint/", {
+            "action": "schedule_run_now", "_selected_action": [self.push.pk, self.poll.pk],
+        })
+        self.push.refresh_from_db()
+        self.assertEqual(self.push.next_run_at, deadline)
+        self.assertEqual(heartbeats.sweep()["missed"], 0)
+
+    def test_changing_the_mode_reschedules_the_endpoint(self):
+        # A poll endpoint due long ago would be failed by the next sweep once it is push.
+        Endpoint.objects.filter(pk=self.poll.pk).update(next_run_at=timezone.now() - timedelta(hours=1))
+        self.client.force_login(get_user_model().objects.create_superuser("admin", "", "pw"))
+        response = self.client.patch(
+            f"/api/endpoints/{self.poll.pk}/", {"url": self.poll.url, "mode": Endpoint.MODE_PUSH},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.poll.refresh_from_db()
+        self.assertGreater(self.poll.next_run_at, timezone.now() + timedelta(seconds=60))
+        self.assertEqual(heartbeats.sweep()["missed"], 0)
+
+        # Back to poll: the next slot on its phase, not the far heartbeat deadline.
+        self.poll.mode = Endpoint.MODE_POLL
+        self.poll.save(update_fields=["mode"])
+        self.poll.refresh_from_db()
+        self.assertLessEqual(self.poll.next_run_at, timezone.now() + timedelta(seconds=60))
+        self.assertAlmostEqual(self.poll.next_run_at.timestamp() % 60, self.poll.phase_s, places=3)
+
+
+class RegistrationTests(MonitorTestCase):
+    def register(self, body):
+        return self.client.post(
+            "/api/register/", body, content_type="application/json",
+            headers={"X-Registration-Token": views.REG_TOKEN},
+        )
+
+    def test_batch_registration(self):
+        response = self.register({"services": [
+            {"name": "a", "base_url": "http://a:8000"},
+            {"name": "b", "base_url": "http://b:8000/", "health_path": "/healthz", "tier": "critical", "mode": "push"},
+        ]})
+        self.assertEqual(response.status_code, 200)
+        registered = response.json()["services"]
+        self.assertEqual([s["name"] for s in registered], ["a", "b"])
+        b = Endpoint.objects.get(pk=registered[1]["endpoint_id"])
+        self.assertEqual((b.url, b.mode, b.service.tier), ("http://b:8000/healthz", "push", "critical"))
+        self.assertEqual(registered[1]["heartbeat_interval_s"], b.interval_sec)
+
+        # Registering again is idempotent.
+        self.register({"services": [{"name": "a", "base_url": "http://a:8000"}]})
+        self.assertEqual(Endpoint.objects.count(), 2)
+
+    def test_an_invalid_entry_rejects_the_whole_batch(self):
+        response = self.register({"services": [
+            {"name": "a", "base_url": "http://a:8000"},
+            {"name": "b", "base_url": "http://b:8000", "tier": "gold"},
+        ]})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("services[1]", response.json()["detail"])
+        self.assertFalse(Service.objects.exists())
+
+    def test_rejects_bad_tokens_and_bodies(self):
+        self.assertEqual(self.client.post(
+            "/api/register/", {"name": "a", "base_url": "http://a:8000"}, content_type="application/json",
+        ).status_code, 403)
+        for body in ([1, 2], {"services": []}, {"services": {"name": "a"}}):
+            with self.subTest(body=body):
+                self.assertEqual(self.register(body).status_code, 400)
+
+
+@override_settings(
+    LATENCY_WARMUP_SAMPLES=10, LATENCY_ANOMALY_SIGMA=4, LATENCY_ANOMALY_RATIO=2,
+    LATENCY_ANOMALY_MIN_MS=100, LATENCY_ANOMALY_STREAK=3,
+)
+class LatencyBaselineTests(MonitorTestCase):
+    def endpoint(self):
+        svc = Service.objects.create(name="a", url="http://a:8000")
+        return Endpoint(service=svc, url="http://a:8000/health")
+
+    def test_observe_builds_a_baseline(self):
+        ep, now = self.endpoint(), timezone.now()
+        for ms in (40, 60) * 10:
+            self.assertFalse(baselines.observe(ep, ms, now))
+        self.assertEqual(ep.latency_samples, 20)
+        self.assertAlmostEqual(ep.latency_mean_ms, 50, delta=10)
+        self.assertAlmostEqual(baselines.expected_ms(ep, now), 50, delta=10)
+        self.assertIsNone(ep.latency_hourly[(now.hour + 1) % 24])
+
+    def test_a_streak_of_slow_checks_degrades(self):
+        ep, now = self.endpoint(), timezone.now()
+        for ms in (40, 60) * 10:
+            baselines.observe(ep, ms, now)
+        self.assertEqual([baselines.observe(ep, 2000, now) for _ in range(3)], [False, False, True])
+        mean = ep.latency_mean_ms
+        self.assertLess(mean, 100)  # anomalies barely move the baseline
+        # One normal check ends the streak.
+        self.assertFalse(baselines.observe(ep, 50, now))
+        self.assertEqual(ep.latency_anomalies, 0)
+
+    def test_no_anomalies_during_warmup(self):
+        ep, now = self.endpoint(), timezone.now()
+        baselines.observe(ep, 50, now)
+        self.assertFalse(any(baselines.observe(ep, 5000, now) for _ in range(5)))
+
+    def test_degraded_gauge_clears_when_the_endpoint_goes_down(self):
+        make_service("a", endpoints=1)
+        ep = Endpoint.objects.get()
+        labels = checks._labels_for(Endpoint.objects.select_related("service").get())
+
+        def tick(ok, rtt):
+            Endpoint.objects.update(next_run_at=timezone.now())
+            checks._limiter._buckets.clear()  # ticks back to back would exhaust the probe budget
+            with fake_probes(ok=ok, code=200 if ok else 503, rtt=rtt):
+                checks.run_due_checks()
+            return endpoint_degraded.labels(**labels)._value.get()
+
+        for _ in range(10):
+            tick(True, 50)
+        for _ in range(3):
+            gauge = tick(True, 3000)
+        ep.refresh_from_db()
+        self.assertEqual((ep.state, gauge), (Endpoint.STATE_DEGRADED, 1))
+        gauge = tick(False, 0)
+        ep.refresh_from_db()
+        self.assertEqual((ep.state, gauge), (Endpoint.STATE_DOWN, 0))
+
+
+class ConnectProbeTests(TestCase):
+    def probe(self, url, kind):
+        target = SimpleNamespace(url=url, method="GET", headers=None, timeout_ms=1000, expected_status=200, kind=kind)
+        return asyncio.run(probe(None, target))
+
+    def test_tcp_probe(self):
+        async def serve_and_probe():
+            server = await asyncio.start_server(lambda r, w: w.close(), "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                target = SimpleNamespace(url=f"http://127.0.0.1:{port}/", timeout_ms=1000, kind="tcp")
+                return await probe(None, target), port
+
+        (ok, code, _, details), port = asyncio.run(serve_and_probe())
+        self.assertEqual((ok, code, details), (True, 0, ""))
+        # Nothing listens there any more.
+        ok, code, _, details = self.probe(f"http://127.0.0.1:{port}/", "tcp")
+        self.assertFalse(ok)
+        self.assertTrue(details)
+
+    def test_address_defaults_by_scheme(self):
+        self.assertEqual(address_of("https://db.internal/health"), ("db.internal", 443))
+        self.assertEqual(address_of("http://db.internal:5432"), ("db.internal", 5432))
+
+
+@override_settings(DATABASE_REPLICAS=["replica1"], REPLICA_PIN_S=5)
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def serve(self, request, write=False, status=200, view=None):
+        """Run ``request`` through the middleware; returns (response, read alias)."""
+        seen = {}
+
+        def get_response(req):
+            if write:
+                self.router.db_for_write(Endpoint)
+            seen["alias"] = self.router.db_for_read(Endpoint)
+            req.resolver_match = SimpleNamespace(func=view or (lambda r: None))
+            return HttpResponse(status=status)
+
+        response = ReplicaReadsMiddleware(get_response)(request)
+        return response, seen["alias"]
+
+    def test_reads_go_to_a_replica(self):
+        _, alias = self.serve(self.factory.get("/api/services/"))
+        self.assertEqual(alias, "replica1")
+        # Outside a request (checker, Celery, commands) everything uses the primary.
+        self.assertIsNone(self.router.db_for_read(Endpoint))
+        self.assertEqual(self.router.db_for_write(Endpoint), "default")
+
+    def test_a_write_pins_the_client_to_the_primary(self):
+        response, alias = self.serve(self.factory.patch("/api/services/1/"), write=True)
+        self.assertIsNone(alias)
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.factory.cookies[PIN_COOKIE] = "1"
+        _, alias = self.serve(self.factory.get("/api/services/1/"))
+        self.assertIsNone(alias)
+
+    def test_pins_follow_credentials_not_addresses(self):
+        self.serve(self.factory.post("/api/services/", HTTP_AUTHORIZATION="Token a"), write=True)
+        _, alias = self.serve(self.factory.get("/api/services/", HTTP_AUTHORIZATION="Token a"))
+        self.assertIsNone(alias)
+        # Same address, other (or no) credentials: still on the replica.
+        _, alias = self.serve(self.factory.get("/api/services/", HTTP_AUTHORIZATION="Token b"))
+        self.assertEqual(alias, "replica1")
+        _, alias = self.serve(self.factory.get("/api/services/"))
+        self.assertEqual(alias, "replica1")
+
+    def test_failed_unsafe_and_no_pin_requests_do_not_pin(self):
+        auth = {"HTTP_AUTHORIZATION": "Token a"}
+        response, _ = self.serve(self.factory.post("/api/services/", **auth), write=True, status=400)
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        # An unsafe request reads from the primary even before it writes ...
+        response, alias = self.serve(self.factory.post("/api/services/", **auth))
+        self.assertIsNone(alias)
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        # ... and machine ingest views never pin their callers.
+        response, _ = self.serve(self.factory.post("/api/heartbeats/", **auth), write=True, view=views.heartbeat_ingest)
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        _, alias = self.serve(self.factory.get("/api/services/", **auth))
+        self.assertEqual(alias, "replica1")
+        self.assertFalse(getattr(views.agent_results, "replica_pin", True))
+        self.assertFalse(getattr(no_pin(lambda r: None), "replica_pin", True))
+
+    def test_pins_expire(self):
+        auth = {"HTTP_AUTHORIZATION": "Token a"}
+        now = 1_000_000.0
+        with mock.patch("time.time", return_value=now):
+            response, _ = self.serve(self.factory.post("/api/services/", **auth), write=True)
+        self.assertEqual(response.cookies[PIN_COOKIE]["max-age"], 5)
+        with mock.patch("time.time", return_value=now + 4):
+            self.assertIsNone(self.serve(self.factory.get("/api/services/", **auth))[1])
+        with mock.patch("time.time", return_value=now + 6):
+            self.assertEqual(self.serve(self.factory.get("/api/services/", **auth))[1], "replica1")
+
+    def test_use_primary(self):
+        def get_response(request):
+            with use_primary():
+                inside = self.router.db_for_read(Endpoint)
+            return HttpResponse(f"{inside}|{self.router.db_for_read(Endpoint)}")
+
+        response = ReplicaReadsMiddleware(get_response)(self.factory.get("/api/services/"))
+        self.assertEqual(response.content, b"None|replica1")
+
+    def test_auth_and_sessions_stay_on_the_primary(self):
+        def get_response(request):
+            return HttpResponse(str(self.router.db_for_read(get_user_model())))
+
+        response = ReplicaReadsMiddleware(get_response)(self.factory.get("/admin/"))
+        self.assertEqual(response.content, b"None")
+
+
+@override_settings(
+    ALERT_WEBHOOK_URLS=["http://hooks.test/alert"], ALERT_DEDUPE_S=300, ALERT_RATE_LIMIT=10, ALERT_RATE_WINDOW_S=600,
+)
+class AlertTests(MonitorTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+
+    def test_endpoint_transition(self):
+        ep = make_service("a", endpoints=1).endpoint.get()
+        now = timezone.now()
+        # The first UP is not an incident; staying UP is no transition at all.
+        self.assertIsNone(alerts.endpoint_transition(ep, True, now))
+        self.assertEqual(ep.state, Endpoint.STATE_UP)
+        self.assertIsNone(alerts.endpoint_transition(ep, True, now))
+        inc = alerts.endpoint_transition(ep, True, now, degraded=True)
+        self.assertEqual((inc.previous_state, inc.state), (Endpoint.STATE_UP, Endpoint.STATE_DEGRADED))
+        inc = alerts.endpoint_transition(ep, False, now, "x" * 3000)
+        self.assertEqual((inc.previous_state, inc.state), (Endpoint.STATE_DEGRADED, Endpoint.STATE_DOWN))
+        self.assertEqual(len(inc.details), 2000)
+        self.assertEqual(ep.state_changed_at, now)
+
+    def test_a_first_down_is_an_incident(self):
+        ep = make_service("a", endpoints=1).endpoint.get()
+        inc = alerts.endpoint_transition(ep, False, timezone.now())
+        self.assertEqual((inc.previous_state, inc.state), (Endpoint.STATE_UNKNOWN, Endpoint.STATE_DOWN))
+
+    def test_ticks_store_incidents_and_queue_alerts(self):
+        svc = make_service("a", endpoints=2)
+        with mock.patch("api.tasks.dispatch_alerts_task.delay") as delay:
+            with fake_probes(), self.captureOnCommitCallbacks(execute=True):
+                checks.run_due_checks()
+            self.assertFalse(Incident.objects.exists())
+            delay.assert_not_called()
+
+            Endpoint.objects.update(next_run_at=timezone.now())
+            checks._limiter._buckets.clear()
+            with fake_probes(ok=False), self.captureOnCommitCallbacks(execute=True):
+                checks.run_due_checks()
+        incidents = Incident.objects.filter(service=svc)
+        self.assertEqual(incidents.filter(endpoint__isnull=False, state=Endpoint.STATE_DOWN).count(), 2)
+        service_incident = incidents.get(endpoint__isnull=True)
+        self.assertEqual(
+            (service_incident.previous_state, service_incident.state),
+            (alerts.SERVICE_HEALTHY, alerts.SERVICE_UNHEALTHY),
+        )
+        delay.assert_called_once_with([inc.id for inc in incidents.order_by("id")])
+
+    def test_recompute_status_action_stores_incidents(self):
+        svc = make_service("a", endpoints=1, status=alerts.SERVICE_HEALTHY)
+        svc.endpoint.update(state=Endpoint.STATE_DOWN)
+        self.client.force_login(get_user_model().objects.create_superuser("admin", "", "pw"))
+        with mock.patch("api.tasks.dispatch_alerts_task.delay") as delay:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(
+                    "/admin/api/service/", {"action": "recompute_status", "_selected_action": [svc.id]},
+                )
+        self.assertEqual(response.status_code, 302)
+        svc.refresh_from_db()
+        self.assertEqual(svc.status, alerts.SERVICE_UNHEALTHY)
+        inc = Incident.objects.get(service=svc, endpoint__isnull=True)
+        self.assertEqual(inc.state, alerts.SERVICE_UNHEALTHY)
+        delay.assert_called_once_with([inc.id])
+
+    def incident(self, ep, state=Endpoint.STATE_DOWN):
+        return Incident.objects.create(
+            service_id=ep.service_id, endpoint=ep, timestamp=timezone.now(),
+            previous_state=Endpoint.STATE_UP, state=state,
+        )
+
+    def dispatch(self, incidents, fail=False):
+        client = mock.MagicMock()
+        client.__enter__.return_value = client
+        if fail:
+            client.post.side_effect = OSError("refused")
+        with mock.patch("httpx.Client", return_value=client):
+            sent = alerts.dispatch([inc.id for inc in incidents])
+        return sent, client
+
+    def test_dispatch_posts_each_incident(self):
+        ep = make_service("a", endpoints=1).endpoint.get()
+        inc = self.incident(ep)
+        sent, client = self.dispatch([inc])
+        self.assertEqual(sent, 1)
+        url, kwargs = client.post.call_args[0][0], client.post.call_args[1]
+        self.assertEqual(url, "http://hooks.test/alert")
+        self.assertEqual(kwargs["json"]["incident_id"], inc.id)
+        self.assertEqual(kwargs["json"]["endpoint_url"], ep.url)
+        inc.refresh_from_db()
+        self.assertEqual(inc.notification, Incident.NOTIFY_SENT)
+        # Already notified: dispatching again sends nothing.
+        self.assertEqual(self.dispatch([inc])[0], 0)
+
+    def test_dispatch_dedupes_repeated_states(self):
+        ep = make_service("a", endpoints=1).endpoint.get()
+        first, second, up = self.incident(ep), self.incident(ep), self.incident(ep, Endpoint.STATE_UP)
+        sent, _ = self.dispatch([first, second, up])
+        self.assertEqual(sent, 2)
+        self.assertEqual(
+            [inc.notification for inc in Incident.objects.order_by("id")],
+            [Incident.NOTIFY_SENT, Incident.NOTIFY_DEDUPED, Incident.NOTIFY_SENT],
+        )
+
+    @override_settings(ALERT_RATE_LIMIT=2)
+    def test_dispatch_rate_limits_per_service(self):
+        a, b = make_service("a", endpoints=3), make_service("b", endpoints=1)
+        incidents = [self.incident(ep) for ep in a.endpoint.all()] + [self.incident(b.endpoint.get())]
+        sent, _ = self.dispatch(incidents)
+        self.assertEqual(sent, 3)
+        self.assertEqual(
+            Incident.objects.filter(service=a, notification=Incident.NOTIFY_RATE_LIMITED).count(), 1,
+        )
+        self.assertEqual(Incident.objects.get(service=b).notification, Incident.NOTIFY_SENT)
+
+    def test_failed_webhooks_are_recorded(self):
+        inc = self.incident(make_service("a", endpoints=1).endpoint.get())
+        with self.assertLogs("api.alerts", "WARNING"):
+            sent, _ = self.dispatch([inc], fail=True)
+        self.assertEqual(sent, 0)
+        inc.refresh_from_db()
+        self.assertEqual(inc.notification, Incident.NOTIFY_FAILED)
+
+    def test_dispatch_task(self):
+        inc = self.incident(make_service("a", endpoints=1).endpoint.get())
+        with mock.patch("api.alerts.dispatch", return_value=1) as dispatch:
+            self.assertEqual(dispatch_alerts_task.apply(args=([inc.id],)).get(), 1)
+        dispatch.assert_called_once_with([inc.id])
+
+
+class WriteLockTests(TestCase):
+    # Holds the lock on a file until stdin closes; prints once it has it.
+    HOLDER = "import fcntl, os, sys; fd = os.open(sys.argv[1], os.O_RDWR); fcntl.flock(fd, fcntl.LOCK_EX); print('locked', flush=True); sys.stdin.read()"
+    # Exits 1 if the lock on the file is taken.
+    PROBE = "import fcntl, os, sys; fd = os.open(sys.argv[1], os.O_RDWR)\ntry: fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)\nexcept BlockingIOError: sys.exit(1)"
+
+    def setUp(self):
+        if writer.fcntl is None:
+            self.skipTest("needs fcntl")
+        fd, self.path = tempfile.mkstemp(suffix=".writelock")
+        os.close(fd)
+        self.addCleanup(os.unlink, self.path)
+        self.lock_path = writer.lock_path
+        patcher = mock.patch.object(writer, "lock_path", return_value=self.path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def locked_elsewhere(self):
+        return subprocess.run([sys.executable, "-c", self.PROBE, self.path]).returncode == 1
+
+    def test_no_lock_for_in_memory_databases(self):
+        # The test database is in memory; file databases lock <name>.writelock.
+        self.assertIsNone(self.lock_path())
+
+    def test_reentrant_within_a_thread(self):
+        with writer.write_lock("outer"):
+            with writer.write_lock("inner"):
+                self.assertTrue(self.locked_elsewhere())
+            # The inner block must not have released the outer one.
+            self.assertTrue(self.locked_elsewhere())
+        self.assertFalse(self.locked_elsewhere())
+
+    def test_excludes_other_threads(self):
+        entered = threading.Event()
+
+        def other():
+            with writer.write_lock("other"):
+                entered.set()
+
+        with writer.write_lock("first"):
+            thread = threading.Thread(target=other)
+            thread.start()
+            self.assertFalse(entered.wait(0.2))
+        self.assertTrue(entered.wait(5))
+        thread.join()
+
+    def test_waits_for_other_processes(self):
+        holder = subprocess.Popen(
+            [sys.executable, "-c", self.HOLDER, self.path], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+        )
+        self.addCleanup(holder.wait)
+        self.assertEqual(holder.stdout.readline().strip(), "locked")
+        acquired = threading.Event()
+
+        def take():
+            with writer.write_lock("waiting"):
+                acquired.set()
+
+        thread = threading.Thread(target=take)
+        thread.start()
+        self.assertFalse(acquired.wait(0.3))
+        holder.stdin.close()
+        self.assertTrue(acquired.wait(5))
+        thread.join()
+
+    def test_slow_waits_are_logged(self):
+        clock = iter([0.0, writer.SLOW_WAIT_S + 1])
+        with mock.patch.object(writer.time, "monotonic", lambda: next(clock)):
+            with self.assertLogs("api.writer", "WARNING") as logs:
+                with writer.write_lock("slow batch"):
+                    pass
+        self.assertIn("slow batch", logs.output[0])
+
+
+class JumpHashTests(TestCase):
+    def test_stable(self):
+        # Pinned: changing the hash would move every endpoint to another worker.
+        self.assertEqual([jump_hash(k, 10) for k in (0, 1, 2, 3, 42, 1000)], [0, 6, 6, 8, 2, 9])
+        self.assertEqual(jump_hash(123456789, 1000), 294)
+        self.assertEqual({jump_hash(k, 1) for k in range(100)}, {0})
+
+    def test_spreads_keys_evenly(self):
+        keys = range(20000)
+        for buckets in (2, 3, 7, 16):
+            with self.subTest(buckets=buckets):
+                counts = [0] * buckets
+                for k in keys:
+                    counts[jump_hash(k, buckets)] += 1
+                expected = len(keys) / buckets
+                self.assertTrue(all(abs(c - expected) < 0.1 * expected for c in counts), counts)
+
+    def test_only_keys_for_the_new_bucket_move(self):
+        for buckets in (1, 4, 9):
+            moved = [k for k in range(5000) if jump_hash(k, buckets) != jump_hash(k, buckets + 1)]
+            self.assertTrue(all(jump_hash(k, buckets + 1) == buckets for k in moved))
+            self.assertAlmostEqual(len(moved) / 5000, 1 / (buckets + 1), delta=0.03)
+
+
+class ProbePoolTests(TestCase):
+    def test_workers_probe_their_partition(self):
+        listener = socket.socket()
+        listener.bind(("127.0.0.1", 0))
+        listener.listen()
+        self.addCleanup(listener.close)
+        closed = socket.socket()
+        closed.bind(("127.0.0.1", 0))
+        port, closed_port = listener.getsockname()[1], closed.getsockname()[1]
+        closed.close()
+        targets = [
+            SimpleNamespace(id=i, url=f"tcp://127.0.0.1:{port if i % 2 else closed_port}", method="GET",
+                            headers=None, timeout_ms=2000, expected_status=200, kind="tcp")
+            for i in range(6)
+        ]
+        pool = ProbePool(2, max_concurrency=4).start()
+        self.assertEqual(
+            [[t.id for t in part] for part in pool.partition(targets)],
+            [[t.id for t in targets if jump_hash(t.id, 2) == w] for w in range(2)],
+        )
+        pool.submit(targets)
+        outcomes = []
+        deadline = time.monotonic() + 30
+        while len(outcomes) < len(targets) and time.monotonic() < deadline:
+            outcomes.extend(pool.results(timeout=1))
+        outcomes.extend(pool.close())
+        self.assertEqual({ep_id: ok for ep_id, (ok, *_) in outcomes}, {i: bool(i % 2) for i in range(6)})
+
+
+class FakePool:
+    """Stands in for ProbePool: one outcome per results() call, as workers report them."""
+
+    def __init__(self, outcomes, stop_after):
+        self.outcomes, self.stop_after = outcomes, stop_after
+        self.queued, self.submitted, self.calls = [], [], 0
+        self.stop = None
+
+    def start(self):
+        return self
+
+    def __len__(self):
+        return 1
+
+    def dead_workers(self):
+        return []
+
+    def submit(self, endpoints, retry=False):
+        self.submitted.append(([ep.id for ep in endpoints], retry))
+        self.queued.extend((ep.id, self.outcomes(ep, retry)) for ep in endpoints)
+
+    def results(self, timeout):
+        self.calls += 1
+        if self.calls >= self.stop_after:
+            self.stop()
+        return [self.queued.pop(0)] if self.queued else []
+
+    def close(self):
+        return []
+
+
+class RunCheckerTests(MonitorTestCase):
+    def run_checker(self, pool, *args):
+        handlers = {}
+
+        def on_signal(sig, handler):
+            handlers[sig] = handler
+
+        pool.stop = lambda: handlers[signal.SIGTERM](signal.SIGTERM, None)
+        recorded = mock.Mock(wraps=run_checker.record_results)
+        with mock.patch.object(run_checker, "ProbePool", lambda *a, **kw: pool), \
+                mock.patch.object(run_checker.signal, "signal", on_signal), \
+                mock.patch.object(run_checker, "record_results", recorded):
+            call_command("run_checker", "--tick", "60", *args, stdout=io.StringIO())
+        return [len(call.args[0]) for call in recorded.call_args_list]
+
+    def test_flushes_by_size(self):
+        make_service("a", endpoints=5)
+        pool = FakePool(lambda ep, retry: (True, 200, 5, ""), stop_after=7)
+        self.assertEqual(self.run_checker(pool, "--flush-size", "2", "--flush-s", "600"), [2, 2, 1])
+        self.assertEqual(CheckResult.objects.count(), 5)
+        self.assertFalse(Endpoint.objects.filter(next_run_at__lte=timezone.now()).exists())
+
+    def test_flushes_by_age(self):
+        make_service("a", endpoints=3)
+        pool = FakePool(lambda ep, retry: (True, 200, 5, ""), stop_after=5)
+        self.assertEqual(self.run_checker(pool, "--flush-size", "100", "--flush-s", "0"), [1, 1, 1])
+
+    def test_retries_go_through_the_rate_limiter(self):
+        svc = make_service("a", endpoints=3, probe_rate_per_s=0.001, probe_burst=4)
+        pool = FakePool(lambda ep, retry: (retry, 200 if retry else 503, 5, "" if retry else "down"), stop_after=10)
+        self.run_checker(pool, "--flush-s", "600")
+        # Three first attempts took three of the four tokens: one failure is retried.
+        self.assertEqual(pool.submitted[1][1], True)
+        self.assertEqual(len(pool.submitted[1][0]), 1)
+        self.assertEqual(len(pool.submitted), 2)
+        results = CheckResult.objects.filter(endpoint__service=svc)
+        self.assertEqual(results.filter(success=True).count(), 1)
+        self.assertEqual(results.filter(success=False, status_code=503).count(), 2)
+
+
+@mock.patch.object(views, "AGENT_TOKEN", "agent-secret")
+class AgentTests(MonitorTestCase):
+    AUTH = {"HTTP_AUTHORIZATION": "Bearer agent-secret"}
+
+    def post(self, path, body, gzipped=False, **headers):
+        data = json.dumps(body).encode()
+        if gzipped:
+            data = gzip.compress(data)
+            headers["HTTP_CONTENT_ENCODING"] = "gzip"
+        return self.client.post(path, data, content_type="application/json", **{**self.AUTH, **headers})
+
+    def test_bearer_token_is_required(self):
+        for headers in ({"HTTP_AUTHORIZATION": "Bearer wrong"}, {"HTTP_AUTHORIZATION": "agent-secret"}, {"HTTP_AUTHORIZATION": ""}):
+            for path in ("/api/agents/lease/", "/api/agents/results/"):
+                with self.subTest(path=path, headers=headers):
+                    self.assertEqual(self.post(path, {"results": []}, **headers).status_code, 403)
+
+    def test_disabled_without_a_token(self):
+        with mock.patch.object(views, "AGENT_TOKEN", ""):
+            for auth in ("Bearer ", "Bearer agent-secret"):
+                response = self.post("/api/agents/lease/", {}, HTTP_AUTHORIZATION=auth)
+                self.assertEqual(response.status_code, 403)
+
+    def test_lease_hides_endpoints_until_it_expires(self):
+        make_service("a", endpoints=3)
+        response = self.post("/api/agents/lease/", {"limit": 2, "lease_s": 60})
+        self.assertEqual(response.status_code, 200)
+        leased = [ep["id"] for ep in response.json()["endpoints"]]
+        self.assertEqual(len(leased), 2)
+        self.assertEqual(response.json()["endpoints"][0]["kind"], Endpoint.KIND_HTTP)
+        # Another agent only gets the one left; the checker sees none of the leased.
+        again = [ep["id"] for ep in self.post("/api/agents/lease/", {"limit": 10}).json()["endpoints"]]
+        self.assertEqual(len(again), 1)
+        self.assertNotIn(again[0], leased)
+        checks._limiter._buckets.clear()
+        self.assertEqual(checks.due_endpoints(), [])
+        # Nobody reported back: once the lease runs out they are due again.
+        later = timezone.now() + timedelta(seconds=61)
+        with mock.patch("django.utils.timezone.now", return_value=later):
+            self.assertEqual(sorted(ep.id for ep in checks.due_endpoints()), sorted(leased + again))
+
+    def test_lease_rejects_bad_bodies(self):
+        for body in ({"limit": "x"}, {"tier": "nope"}, [1]):
+            with self.subTest(body=body):
+                self.assertEqual(self.post("/api/agents/lease/", body).status_code, 400)
+
+    def test_results_are_recorded(self):
+        svc = make_service("a", endpoints=2)
+        ids = list(svc.endpoint.values_list("id", flat=True))
+        response = self.post("/api/agents/results/", {"agent": "eu-1", "results": [
+            {"id": ids[0], "ok": True, "status_code": 200, "response_time_ms": 12},
+            {"id": ids[1], "ok": False, "status_code": 0, "response_time_ms": 0, "details": "refused"},
+        ]}, gzipped=True)
+        self.assertEqual(response.json(), {"agent": "eu-1", "received": 2, "stored": 2})
+        self.assertEqual(
+            set(CheckResult.objects.values_list("endpoint_id", "success", "details")),
+            {(ids[0], True, None), (ids[1], False, "refused")},
+        )
+
+    def test_unknown_and_foreign_ids_are_skipped(self):
+        svc = make_service("a", endpoints=3)
+        push, disabled, polled = svc.endpoint.order_by("id")
+        Endpoint.objects.filter(pk=push.pk).update(mode=Endpoint.MODE_PUSH)
+        Endpoint.objects.filter(pk=disabled.pk).update(enabled=False)
+        results = [{"id": ep_id, "ok": True, "status_code": 200} for ep_id in (push.id, disabled.id, polled.id, 999999)]
+        response = self.post("/api/agents/results/", {"results": results})
+        self.assertEqual((response.json()["received"], response.json()["stored"]), (4, 1))
+        self.assertEqual(list(CheckResult.objects.values_list("endpoint_id", flat=True)), [polled.id])
+
+    def test_results_reject_bad_bodies(self):
+        bad = gzip.compress(b"{}")[:-4]
+        self.assertEqual(
+            self.client.post("/api/agents/results/", bad, content_type="application/json",
+                             HTTP_CONTENT_ENCODING="gzip", **self.AUTH).status_code,
+            400,
+        )
+        for body in ({}, {"results": {}}, {"results": [{"ok": True}]}, {"results": [{"id": "x"}]}):
+            with self.subTest(body=body):
+                self.assertEqual(self.post("/api/agents/results/", body).status_code, 400)
+
+
+class ConfigVersionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.svc = make_service("a", endpoints=1)
+        self.ep = self.svc.endpoint.get()
+
+    def assertBumps(self, change, bumps=True):
+        before = cache.get(VERSION_KEY)
+        change()
+        self.assertEqual(cache.get(VERSION_KEY) != before, bumps)
+
+    def test_config_saves_and_deletes_bump_the_version(self):
+        self.ep.url = "http://a:8000/ready"
+        self.assertBumps(self.ep.save)
+        self.assertBumps(lambda: self.ep.save(update_fields=["url", "next_run_at"]))
+        self.svc.probe_rate_per_s = 2
+        self.assertBumps(self.svc.save)
+        self.assertBumps(self.ep.delete)
+        self.assertBumps(self.svc.delete)
+
+    def test_runtime_saves_leave_it_alone(self):
+        self.ep.state = Endpoint.STATE_DOWN
+        self.assertBumps(lambda: self.ep.save(update_fields=["state", "state_changed_at", "next_run_at"]), False)
+        self.assertBumps(lambda: self.svc.save(update_fields=["status", "last_checked"]), False)
+
+    def test_the_checker_reloads_after_a_bump(self):
+        config = EndpointConfigCache()
+        self.assertEqual(config.get_many([self.ep.id])[0].url, self.ep.url)
+        Endpoint.objects.filter(pk=self.ep.pk).update(url="http://a:8000/ready")
+        # Unchanged version: the cached configuration is served without a query.
+        with self.assertNumQueries(0):
+            self.assertEqual(config.get_many([self.ep.id])[0].url, "http://a:8000/health/0")
+        self.ep.refresh_from_db()
+        self.ep.save()
+        self.assertEqual(config.get_many([self.ep.id])[0].url, "http://a:8000/ready")
+
+    def test_max_age_bounds_staleness(self):
+        config = EndpointConfigCache()
+        config.get_many([self.ep.id])
+        Endpoint.objects.filter(pk=self.ep.pk).update(url="http://a:8000/ready")
+        with override_settings(CONFIG_CACHE_MAX_AGE_S=0):
+            time.sleep(0.01)
+            self.assertEqual(config.get_many([self.ep.id])[0].url, "http://a:8000/ready")
+
+
+class TierTests(MonitorTestCase):
+    def setUp(self):
+        super().setUp()
+        self.critical = make_service("crit", endpoints=2, tier="critical")
+        self.standard = make_service("std", endpoints=1)
+        # Endpoint-level tiers win over the service's.
+        self.demoted = self.critical.endpoint.order_by("id").last()
+        self.promoted = self.standard.endpoint.get()
+        Endpoint.objects.filter(pk=self.demoted.pk).update(tier="low")
+        Endpoint.objects.filter(pk=self.promoted.pk).update(tier="critical")
+
+    def tier_ids(self, tier):
+        return set(Endpoint.objects.filter(Endpoint.in_tier(tier)).values_list("id", flat=True))
+
+    def test_endpoint_tier_overrides_the_service(self):
+        kept = self.critical.endpoint.exclude(pk=self.demoted.pk).get()
+        self.assertEqual(self.tier_ids("critical"), {kept.id, self.promoted.id})
+        self.assertEqual(self.tier_ids("low"), {self.demoted.id})
+        self.assertEqual(self.tier_ids("standard"), set())
+        self.demoted.refresh_from_db()
+        self.assertEqual(self.demoted.effective_tier, "low")
+        self.assertEqual(kept.effective_tier, "critical")
+
+    def test_each_tick_only_checks_its_tier(self):
+        probed = {}
+
+        async def fetch_results(endpoints, max_concurrency, **kwargs):
+            probed[max_concurrency] = {ep.id for ep in endpoints}
+            return [(True, 200, 5, "") for _ in endpoints]
+
+        with mock.patch.object(checks, "fetch_results", fetch_results):
+            self.assertEqual(run_due_checks_task.apply(kwargs={"tier": "low"}).get(), 1)
+            self.assertEqual(checks.run_due_checks("standard"), 0)
+            self.assertEqual(checks.run_due_checks("critical"), 2)
+        # Each tier probes at its own concurrency.
+        self.assertEqual(probed, {
+            settings.CHECK_TIERS["low"]["concurrency"]: {self.demoted.id},
+            settings.CHECK_TIERS["critical"]["concurrency"]: self.tier_ids("critical"),
+        })
+
+    def test_tier_batch_size(self):
+        make_service("more", endpoints=4, tier="low")
+        with fake_probes(), override_settings(CHECK_TIERS={**settings.CHECK_TIERS, "low": {
+            **settings.CHECK_TIERS["low"], "batch": 3,
+        }}):
+            self.assertEqual(checks.run_due_checks("low"), 3)
+
+    def test_beat_entries_expire_on_their_tier_queue(self):
+        for tier, cfg in settings.CHECK_TIERS.items():
+            with self.subTest(tier=tier):
+                entry = settings.CELERY_BEAT_SCHEDULE[f"run-{tier}-health-checks"]
+                self.assertEqual(entry["task"], run_due_checks_task.name)
+                self.assertEqual(entry["kwargs"], {"tier": tier})
+                self.assertEqual(entry["schedule"], cfg["every_s"])
+                self.assertEqual(entry["options"], {"queue": cfg["queue"], "expires": cfg["every_s"]})
+        self.assertEqual(len({cfg["queue"] for cfg in settings.CHECK_TIERS.values()}), len(settings.CHECK_TIERS))
+
+
+class SparseFieldsTests(MonitorTestCase):
+    def setUp(self):
+        super().setUp()
+        self.svc = make_service("a", endpoints=1)
+        ep = self.svc.endpoint.get()
+        CheckResult.objects.create(endpoint=ep, status_code=200, response_time_ms=7, success=True)
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()["results"]
+
+    def test_only_the_requested_fields(self):
+        self.assertEqual(self.get("/api/services/?fields=id,name"), [{"id": self.svc.id, "name": "a"}])
+        self.assertEqual(set(self.get("/api/results/?fields=id, success")[0]), {"id", "success"})
+        self.assertEqual(set(self.get("/api/endpoints/?fields=id,state")[0]), {"id", "state"})
+
+    def test_unknown_and_nested_names_are_ignored(self):
+        full = set(self.get("/api/services/")[0])
+        self.assertEqual(set(self.get("/api/services/?fields=id,nope")[0]), {"id"})
+        # Nothing known (including dotted, nested names): every field, as without ?fields=.
+        for query in ("fields=nope", "fields=service.name", "fields=,", "fields="):
+            with self.subTest(query=query):
+                self.assertEqual(set(self.get(f"/api/services/?{query}")[0]), full)
+                self.assertEqual(
+                    set(self.get(f"/api/results/?{query}")[0]), set(CheckResultSerializer.Meta.fields),
+                )
+
+    def test_writes_ignore_fields(self):
+        response = self.client.post(
+            "/api/services/?fields=id", {"name": "b", "url": "http://b:8000"}, content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertIn("url", response.json())
+
+    def test_values_path_matches_the_serializer(self):
+        CheckResult.objects.update(details="ok", last_timestamp=timezone.now())
+        via_values = self.client.get("/api/results/").json()["results"]
+        via_serializer = json.loads(FastJSONRenderer().render(
+            CheckResultSerializer(CheckResult.objects.order_by("-id"), many=True).data,
+        ))
+        self.assertEqual(via_values, via_serializer)
+
+
+class RendererTests(TestCase):
+    DATA = {
+        "utc": datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=dt_timezone.utc),
+        "whole_second": datetime(2024, 5, 1, 12, 30, 15, tzinfo=dt_timezone.utc),
+        "offset": datetime(2024, 5, 1, 12, 30, tzinfo=dt_timezone(timedelta(hours=3, minutes=30))),
+        "naive": datetime(2024, 5, 1, 12, 30),
+        "date": datetime(2024, 5, 1).date(),
+        "decimal": decimal.Decimal("12.50"),
+        "float": 0.1,
+        "text": "خبر",
+        "nested": [{"when": datetime(2024, 1, 1, tzinfo=dt_timezone.utc), "n": None}],
+    }
+
+    def test_matches_drf_json_renderer(self):
+        from rest_framework.renderers import JSONRenderer
+
+        fast, drf = FastJSONRenderer().render(self.DATA), JSONRenderer().render(self.DATA)
+        self.assertEqual(json.loads(fast), json.loads(drf))
+        self.assertEqual(json.loads(fast)["utc"], "2024-05-01T12:30:15.123456Z")
+        self.assertEqual(json.loads(fast)["decimal"], 12.5)
+
+    def test_indent_and_empty_bodies(self):
+        self.assertEqual(FastJSONRenderer().render(None), b"")
+        indented = FastJSONRenderer().render({"a": 1}, "application/json; indent=2")
+        self.assertEqual(indented, b'{\n  "a": 1\n}')
+
+
+class AsyncViewParityTests(MonitorTestCase):
+    """With MONITOR_ASYNC_VIEWS=1 the async read views must answer exactly like the viewsets."""
+
+    URLS = [
+        "/api/services/", "/api/services/?page=2", "/api/services/?page=last", "/api/services/?page=9",
+        "/api/services/?page=x", "/api/services/?fields=id,name", "/api/services/?fields=nope",
+        "/api/services/{svc}/", "/api/services/{svc}/?fields=id", "/api/services/999999/",
+        "/api/services/{svc}/summary/", "/api/services/{svc}/summary/?fields=id,url",
+        "/api/services/{svc}/timeseries/?{range}&step=300", "/api/services/{svc}/timeseries/?step=x",
+        "/api/endpoints/", "/api/endpoints/?page=2&fields=id,state", "/api/endpoints/{ep}/",
+        "/api/endpoints/{ep}/timeseries/?{range}&step=60",
+        "/api/results/", "/api/results/?page=2", "/api/results/?fields=id,success,timestamp",
+        "/api/results/{res}/", "/api/results/999999/",
+    ]
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(self.use_async_views, False)
+        # More than a page (50) of services, endpoints and results.
+        for i in range(55):
+            Service.objects.create(name=f"s{i}", url=f"http://s{i}:8000")
+        svc = make_service("a", endpoints=60)
+        eps = list(svc.endpoint.all())
+        CheckResult.objects.bulk_create(
+            CheckResult(endpoint=ep, status_code=200, response_time_ms=i, success=i % 5 != 0)
+            for i, ep in enumerate(eps * 2)
+        )
+        end = int(time.time()) + 60
+        self.ids = {
+            "svc": svc.id, "ep": eps[0].id, "res": CheckResult.objects.first().id,
+            "range": f"start={end - 7200}&end={end}",
+        }
+
+    def use_async_views(self, enabled):
+        with override_settings(ASYNC_VIEWS=enabled):
+            importlib.reload(api_urls)
+        # The project urlconf holds on to the app's resolved patterns.
+        importlib.reload(project_urls)
+        clear_url_caches()
+
+    def fetch(self):
+        out = {}
+        for url in self.URLS:
+            url = url.format(**self.ids)
+            for method in (self.client.get, self.client.head):
+                response = method(url)
+                body = response.json() if response.content else None
+                out[method.__name__, url] = (response.status_code, body)
+        return out
+
+    def test_async_views_are_routed(self):
+        self.use_async_views(True)
+        self.assertIs(resolve("/api/services/").func, async_views.service_list)
+        self.assertIs(resolve("/api/results/1/").func, async_views.result_detail)
+        self.use_async_views(False)
+        self.assertIsNot(resolve("/api/services/").func, async_views.service_list)
+
+    def test_same_status_and_body(self):
+        self.use_async_views(False)
+        expected = self.fetch()
+        self.use_async_views(True)
+        actual = self.fetch()
+        for key, value in expected.items():
+            with self.subTest(request=key):
+                self.assertEqual(actual[key], value)
+
+    def test_writes_fall_through_to_the_viewsets(self):
+        self.use_async_views(True)
+        response = self.client.post(
+            "/api/services/", {"name": "new", "url": "http://new:8000"}, content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        response = self.client.patch(
+            f"/api/services/{self.ids['svc']}/", {"url": "http://a:8000", "tier": "low"},
+            content_type="application/json",
+        )
+        self.assertEqual((response.status_code, response.json()["tier"]), (200, "low"))
+
+
+class FakeRedis:
+    """Sync publisher and asyncio subscriber sides of one in-memory pub/sub channel."""
+
+    def __init__(self):
+        self.messages = asyncio.Queue()
+        self.subscribed = asyncio.Event()
+        self.closed = 0
+
+    def publish(self, channel, data):
+        self.messages.put_nowait({"type": "message", "channel": channel, "data": data})
+
+    def pubsub(self):
+        return self
+
+    async def subscribe(self, channel):
+        self.subscribed.set()
+
+    async def listen(self):
+        yield {"type": "subscribe"}
+        while True:
+            yield await self.messages.get()
+
+    async def aclose(self):
+        self.closed += 1
+
+
+@override_settings(MONITOR_EVENTS_REDIS_URL="redis://events.test/2")
+class StatusStreamTests(TestCase):
+    def run_with_redis(self, test):
+        async def main():
+            fake = FakeRedis()
+            with mock.patch.object(events, "_redis", return_value=fake), \
+                    mock.patch("redis.asyncio.from_url", return_value=fake):
+                await asyncio.wait_for(test(fake), 5)
+        asyncio.run(main())
+
+    def test_published_events_reach_matching_streams(self):
+        async def test(fake):
+            everything, one_service = events.stream(), events.stream(service_id=2)
+            self.assertEqual(await anext(everything), "retry: 3000\n\n")
+            await anext(one_service)
+            # One Redis subscription for both streams.
+            self.assertEqual(len(events.hub().queues), 2)
+            await fake.subscribed.wait()
+            events.publish([
+                {"type": "endpoint", "id": 5, "service_id": 1, "state": "DOWN"},
+                {"type": "service", "id": 2, "service_id": 2, "state": "HEALTHY"},
+            ])
+            first = await anext(everything)
+            self.assertTrue(first.startswith("event: endpoint\ndata: "))
+            self.assertEqual(json.loads(first.split("data: ", 1)[1])["id"], 5)
+            self.assertTrue((await anext(everything)).startswith("event: service\n"))
+            self.assertTrue((await anext(one_service)).startswith("event: service\n"))
+            await everything.aclose()
+            await one_service.aclose()
+
+        self.run_with_redis(test)
+
+    def test_keepalives_while_idle(self):
+        async def test(fake):
+            stream = events.stream(keepalive=0.01)
+            await anext(stream)
+            self.assertEqual(await anext(stream), ": keepalive\n\n")
+            await stream.aclose()
+
+        self.run_with_redis(test)
+
+    def test_hub_cleans_up_after_disconnects(self):
+        async def test(fake):
+            hub = events.hub()
+            stream = events.stream()
+            await anext(stream)
+            await fake.subscribed.wait()
+            task = hub._task
+            await stream.aclose()
+            self.assertEqual(hub.queues, set())
+            self.assertIsNone(hub._task)
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            # The subscription and its connection are closed with the task.
+            self.assertEqual(fake.closed, 2)
+
+        self.run_with_redis(test)
+
+    def test_slow_subscribers_drop_batches(self):
+        async def test(fake):
+            hub = events.hub()
+            with mock.patch.object(events._Hub, "QUEUE_SIZE", 1):
+                q = hub.subscribe()
+            with self.assertLogs("api.events", "WARNING"):
+                hub._fan_out([{"type": "service"}])
+                hub._fan_out([{"type": "service"}])
+            self.assertEqual(q.qsize(), 1)
+            hub.unsubscribe(q)
+
+        self.run_with_redis(test)
+
+    def test_stream_view(self):
+        async def test(fake):
+            request = RequestFactory().get("/api/stream/status/?service=abc")
+            response = await views.status_stream(request)
+            self.assertEqual(response["Content-Type"], "text/event-stream")
+            self.assertEqual(response["Cache-Control"], "no-cache")
+            body = response.streaming_content
+            self.assertEqual(await anext(body), b"retry: 3000\n\n")
+            await body.aclose()
+
+        self.run_with_redis(test)
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        profile_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(profile_dir.cleanup)
+        self.dir = profile_dir.name
+        overrides = override_settings(
+            PROFILE_DIR=self.dir, PROFILE_EVERY_N=0, PROFILE_SLOW_MS=0, PROFILE_INTERVAL_MS=1,
+            PROFILE_MAX_FILES=100, PROFILE_MAX_BYTES=10**6,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        patcher = mock.patch.object(profiling, "_counters", {})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_block(self, ms):
+        with profiling.profiled("tick", "run_due_checks"):
+            time.sleep(ms / 1000)
+
+    def test_off_by_default(self):
+        self.run_block(20)
+        self.assertFalse(ProfileCapture.objects.exists())
+        with self.assertRaises(MiddlewareNotUsed):
+            profiling.ProfilingMiddleware(lambda request: None)
+
+    def test_every_nth_run(self):
+        with override_settings(PROFILE_EVERY_N=2):
+            for _ in range(4):
+                self.run_block(20)
+        self.assertEqual(ProfileCapture.objects.count(), 2)
+        cap = ProfileCapture.objects.first()
+        self.assertEqual((cap.kind, cap.name), ("tick", "run_due_checks"))
+        self.assertGreater(cap.samples, 0)
+        with open(cap.path) as fh:
+            self.assertIn("run_block", fh.read())
+
+    def test_slow_runs_only(self):
+        with override_settings(PROFILE_SLOW_MS=40):
+            self.run_block(0)
+            self.assertFalse(ProfileCapture.objects.exists())
+            self.run_block(60)
+        self.assertGreaterEqual(ProfileCapture.objects.get().duration_ms, 40)
+
+    def capture(self, size):
+        profiler = SimpleNamespace(samples=1, folded=lambda: "x" * size)
+        profiling.save_profile("request", "GET /api/", 5.0, profiler)
+        return ProfileCapture.objects.order_by("-id").first()
+
+    def test_old_captures_are_pruned_with_their_files(self):
+        with override_settings(PROFILE_MAX_FILES=2):
+            first = self.capture(10)
+            self.assertTrue(os.path.exists(first.path))
+            kept = [self.capture(10), self.capture(10)]
+        self.assertEqual(list(ProfileCapture.objects.order_by("id")), kept)
+        self.assertFalse(os.path.exists(first.path))
+        with override_settings(PROFILE_MAX_BYTES=25):
+            newest = self.capture(20)
+        self.assertEqual(list(ProfileCapture.objects.all()), [newest])
+        self.assertEqual(sorted(os.listdir(self.dir)), [newest.file_name])
+
+    def test_delete_tolerates_a_missing_file(self):
+        cap = self.capture(10)
+        os.remove(cap.path)
+        cap.delete()
+        self.assertFalse(ProfileCapture.objects.exists())
+
+    def test_download_needs_view_permission(self):
+        cap = self.capture(10)
+        url = f"/admin/api/profilecapture/{cap.pk}/download/"
+        User = get_user_model()
+        staff = User.objects.create_user("staff", password="pw", is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        staff.user_permissions.add(Permission.objects.get(codename="view_profilecapture"))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"x" * 10)
+        self.assertIn("attachment", response["Content-Disposition"])
+        os.remove(cap.path)
+        self.assertEqual(self.client.get(url).status_code, 404)
+        # Not staff: sent to the admin login.
+        self.client.force_login(User.objects.create_user("user", password="pw"))
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+    def test_middleware_profiles_api_requests(self):
+        def get_response(request):
+            time.sleep(0.02)
+            return HttpResponse()
+
+        with override_settings(PROFILE_EVERY_N=1):
+            middleware = profiling.ProfilingMiddleware(get_response)
+            middleware(RequestFactory().get("/admin/"))
+            middleware(RequestFactory().get("/api/services/"))
+        self.assertEqual(ProfileCapture.objects.get().name, "GET /api/services/")
@@ -0,0 +1,230 @@
+# api/timeseries.py
+"""
+Bucketed CheckResult aggregation for the timeseries endpoints.
+
+Buckets are computed in SQL from the epoch seconds of ``timestamp``, so a
+response has at most one row per ``step`` no matter how many raw results
+fall in the range. Percentiles need an ordered-set aggregate and are only
+computed on PostgreSQL (``null`` elsewhere).
+
+Rows written with RESULT_STORAGE = "changes" stand for ``repeat_count``
+checks, so counts and latency sums are weighted by it. A run that lies in
+one bucket is aggregated in SQL with the rest; runs crossing a bucket edge
+or either end of the range (spanning_runs) are spread over the buckets
+they overlap, their checks taken as evenly spaced between ``timestamp`` and
+``last_timestamp``. Such a run contributes its mean latency to each bucket
+and its max to every bucket's max. Percentiles are taken over each
+single-bucket row's mean latency.
+"""
+import math
+import re
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Aggregate, BigIntegerField, ExpressionWrapper, F, FloatField, Func, IntegerField, Max, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+DEFAULT_RANGE = timedelta(hours=24)
+MAX_POINTS = 2000
+STEP_RE = re.compile(r"^(\d+)([smhd]?)$")
+STEP_UNITS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+class Epoch(Func):
+    """Whole seconds since the Unix epoch of a datetime expression (SQLite, PostgreSQL)."""
+
+    output_field = IntegerField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template="CAST(strftime('%%%%s', %(expressions)s) AS INTEGER)")
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template="FLOOR(EXTRACT(EPOCH FROM %(expressions)s))::bigint")
+
+
+class PercentileCont(Aggregate):
+    function = "PERCENTILE_CONT"
+    template = "%(function)s(%(fraction)s) WITHIN GROUP (ORDER BY %(expressions)s)"
+    output_field = FloatField()
+
+    def __init__(self, expression, fraction, **extra):
+        super().__init__(expression, fraction=float(fraction), **extra)
+
+
+class TimeseriesError(ValueError):
+    pass
+
+
+def _parse_time(raw, default):
+    if not raw:
+        return default
+    if raw.isdigit():
+        return datetime.fromtimestamp(int(raw), tz=dt_timezone.utc)
+    value = parse_datetime(raw)
+    if value is None:
+        raise TimeseriesError(f"Invalid datetime: {raw!r}")
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value, dt_timezone.utc)
+    return value
+
+
+def parse_params(params):
+    """
+    ``start``/``end`` as ISO-8601 or epoch seconds (default: last 24 h) and
+    ``step`` as seconds or with an s/m/h/d suffix (default: 1/100 of the range).
+    Returns (start, end, step_seconds, percentile).
+    """
+    end = _parse_time(params.get("end"), timezone.now())
+    start = _parse_time(params.get("start"), end - DEFAULT_RANGE)
+    if start >= end:
+        raise TimeseriesError("start must be before end")
+    span = (end - start).total_seconds()
+
+    raw_step = (params.get("step") or "").strip().lower()
+    if raw_step:
+        m = STEP_RE.match(raw_step)
+        if not m or int(m.group(1)) <= 0:
+            raise TimeseriesError(f"Invalid step: {raw_step!r}")
+        step = int(m.group(1)) * STEP_UNITS[m.group(2)]
+    else:
+        step = max(1, int(span // 100))
+    if span / step > MAX_POINTS:
+        raise TimeseriesError(f"Too many points; use a step of at least {int(span // MAX_POINTS) + 1}s")
+
+    try:
+        percentile = float(params.get("percentile", 95))
+    except ValueError:
+        raise TimeseriesError("Invalid percentile")
+    if not 0 < percentile < 100:
+        raise TimeseriesError("percentile must be between 0 and 100")
+    return start, end, step, percentile
+
+
+def _bucket(field, start, step):
+    return ExpressionWrapper(
+        (Epoch(field) - Value(int(start.timestamp()))) / Value(step),
+        output_field=IntegerField(),
+    )
+
+
+def aggregate(results, start, end, step, percentile):
+    """
+    Bucketed aggregates of the rows of a CheckResult queryset that lie in
+    one bucket, as an (unevaluated) values queryset ordered by bucket. Runs
+    crossing a bucket edge are left to spanning_runs().
+    """
+    aggregates = {
+        "count": Sum("repeat_count"),
+        "ok": Sum("repeat_count", filter=Q(success=True), default=0),
+        "latency_sum_ms": Sum(Coalesce(
+            "latency_sum_ms", F("response_time_ms") * F("repeat_count"),
+            output_field=BigIntegerField(),
+        )),
+        "max_ms": Max(Coalesce("latency_max_ms", "response_time_ms")),
+    }
+    if connections[results.db].vendor == "postgresql":
+        mean_ms = ExpressionWrapper(
+            Coalesce("latency_sum_ms", F("response_time_ms") * F("repeat_count"), output_field=BigIntegerField())
+            * 1.0 / F("repeat_count"),
+            output_field=FloatField(),
+        )
+        aggregates["pct_ms"] = PercentileCont(mean_ms, percentile / 100.0)
+    return (
+        results.filter(timestamp__gte=start, timestamp__lt=end)
+        .alias(last=Coalesce("last_timestamp", "timestamp"))
+        .filter(last__lt=end)
+        .annotate(bucket=_bucket("timestamp", start, step))
+        .alias(last_bucket=_bucket("last", start, step))
+        .filter(bucket=F("last_bucket"))
+        .values("bucket")
+        .annotate(**aggregates)
+        .order_by("bucket")
+    )
+
+
+def spanning_runs(results, start, end, step):
+    """
+    Runs of a CheckResult queryset that overlap [start, end) but not within
+    one bucket of it, as an (unevaluated) values queryset for to_points().
+    """
+    return (
+        # Runs last less than RESULT_HEARTBEAT_S, which bounds the index range.
+        results.filter(
+            timestamp__gte=start - timedelta(seconds=settings.RESULT_HEARTBEAT_S),
+            timestamp__lt=end, last_timestamp__gte=start, repeat_count__gt=1,
+        )
+        .alias(bucket=_bucket("timestamp", start, step), last_bucket=_bucket("last_timestamp", start, step))
+        .exclude(timestamp__gte=start, last_timestamp__lt=end, bucket=F("last_bucket"))
+        .values(
+            "timestamp", "last_timestamp", "repeat_count", "success",
+            "response_time_ms", "latency_sum_ms", "latency_max_ms",
+        )
+    )
+
+
+def _spread(run, start, end, step):
+    """(bucket, checks) pairs for a run's checks in [start, end), taken as evenly spaced."""
+    n = run["repeat_count"]
+    t0, t1 = run["timestamp"].timestamp(), run["last_timestamp"].timestamp()
+    lo, hi = start.timestamp(), end.timestamp()
+    start_epoch = int(lo)
+    if t1 <= t0 or n < 2:
+        if lo <= t0 < hi:
+            yield (math.floor(t0) - start_epoch) // step, n
+        return
+    gap = (t1 - t0) / (n - 1)
+    b = (math.floor(max(t0, lo)) - start_epoch) // step
+    while True:
+        edge = start_epoch + b * step
+        first = max(0, math.ceil((max(edge, lo) - t0) / gap))
+        last = min(n, math.ceil((min(edge + step, hi) - t0) / gap))
+        if last > first:
+            yield b, last - first
+        if edge + step > min(t1, hi):
+            return
+        b += 1
+
+
+def to_points(rows, start, end, step, runs=()):
+    """Shape aggregate rows, plus ``runs`` from spanning_runs(), into the response ``points`` list."""
+    start_epoch = int(start.timestamp())
+    buckets = {row["bucket"]: dict(row) for row in rows}
+    for run in runs:
+        n = run["repeat_count"]
+        mean_ms = (run["latency_sum_ms"] if run["latency_sum_ms"] is not None
+                   else run["response_time_ms"] * n) / n
+        max_ms = run["latency_max_ms"] if run["latency_max_ms"] is not None else run["response_time_ms"]
+        for b, checks in _spread(run, start, end, step):
+            row = buckets.setdefault(b, {
+                "bucket": b, "count": 0, "ok": 0, "latency_sum_ms": 0, "max_ms": max_ms, "pct_ms": None,
+            })
+            row["count"] += checks
+            row["ok"] += checks if run["success"] else 0
+            row["latency_sum_ms"] += mean_ms * checks
+            row["max_ms"] = max(row["max_ms"], max_ms)
+
+    points = []
+    for row in sorted(buckets.values(), key=lambda row: row["bucket"]):
+        t = datetime.fromtimestamp(start_epoch + row["bucket"] * step, tz=dt_timezone.utc)
+        points.append({
+            "t": t,
+            "count": row["count"],
+            "success_ratio": round(row["ok"] / row["count"], 4) if row["count"] else None,
+            "avg_ms": round(row["latency_sum_ms"] / row["count"], 1) if row["count"] else None,
+            "max_ms": row["max_ms"],
+            "pct_ms": row.get("pct_ms"),
+        })
+    return points
+
+
+def response_body(points, start, end, step, percentile):
+    return {
+        "start": start,
+        "end": end,
+        "step": step,
+        "percentile": percentile,
+        "points": points,
+    }
@@ -1,6 +1,10 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ServiceViewSet, EndpointViewSet, CheckResultViewSet, RegisterServiceView
+from .views import (
+    ServiceViewSet, EndpointViewSet, CheckResultViewSet, RegisterServiceView,
+    status_stream, probe_endpoint, probe_batch, agent_lease, agent_results, heartbeat_ingest,
+)
 
 router = DefaultRouter()
 router.register(r"services", ServiceViewSet, basename="service")
@@ -8,6 +12,28 @@ router.register(r"endpoints", EndpointViewSet, basename="endpoint")
 router.register(r"results", CheckResultViewSet, basename="result")
 
 urlpatterns = [
+    path("endpoints/<int:pk>/probe/", probe_endpoint, name="endpoint-probe"),
+    path("probe/batch/", probe_batch, name="probe-batch"),
     path("", include(router.urls)),
     path("register/", RegisterServiceView.as_view(), name="register-service"),
+    path("stream/status/", status_stream, name="status-stream"),
+    path("agents/lease/", agent_lease, name="agent-lease"),
+    path("agents/results/", agent_results, name="agent-results"),
+    path("heartbeats/", heartbeat_ingest, name="heartbeats"),
 ]
+
+if settings.ASYNC_VIEWS:
+    from . import async_views
+
+    # Ahead of the router so GET/HEAD are served by the async views.
+    urlpatterns[:0] = [
+        path("services/", async_views.service_list, name="service-list-async"),
+        path("services/<int:pk>/", async_views.service_detail, name="service-detail-async"),
+        path("services/<int:pk>/summary/", async_views.service_summary, name="service-summary-async"),
+        path("services/<int:pk>/timeseries/", async_views.service_timeseries, name="service-timeseries-async"),
+        path("endpoints/", async_views.endpoint_list, name="endpoint-list-async"),
+        path("endpoints/<int:pk>/", async_views.endpoint_detail, name="endpoint-detail-async"),
+        path("endpoints/<int:pk>/timeseries/", async_views.endpoint_timeseries, name="endpoint-timeseries-async"),
+        path("results/", async_views.result_list, name="result-list-async"),
+        path("results/<int:pk>/", async_views.result_detail, name="result-detail-async"),
+    ]
@@ -1,82 +1,419 @@
-import os, httpx
+import gzip
+import hmac
+import json
+import os
+import time
+import zlib
+
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
+from . import events, heartbeats, timeseries
+from .db_routing import no_pin
+from .checks import ingest_results, lease_due, probe_now
 from .models import Service, Endpoint, CheckResult
-from .serializers import ServiceSerializer, EndpointSerializer, CheckResultSerializer
+from .serializers import ServiceSerializer, EndpointSerializer, CheckResultSerializer, requested_fields
 
 REG_TOKEN = os.getenv("MONITOR_REGISTRATION_TOKEN", "change-me")
+PROBE_BATCH_MAX = 500
+REGISTER_BATCH_MAX = 100
+# Shared secret for probe agents; agent endpoints are disabled while unset.
+AGENT_TOKEN = os.getenv("MONITOR_AGENT_TOKEN", "")
+AGENT_RESULTS_MAX = 5000
+HEARTBEAT_TOKEN = os.getenv("MONITOR_HEARTBEAT_TOKEN", "") or REG_TOKEN
+HEARTBEATS_MAX = 5000
+
+
+def timeseries_response(params, results):
+    """Bucketed aggregates of ``results`` for ?start=&end=&step=&percentile=."""
+    try:
+        start, end, step, pct = timeseries.parse_params(params)
+    except timeseries.TimeseriesError as e:
+        return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    rows = timeseries.aggregate(results, start, end, step, pct)
+    runs = timeseries.spanning_runs(results, start, end, step)
+    points = timeseries.to_points(rows, start, end, step, runs)
+    return Response(timeseries.response_body(points, start, end, step, pct))
 
 
 class ServiceViewSet(viewsets.ModelViewSet):
-    queryset = Service.objects.all()
+    queryset = Service.objects.order_by("id")
     serializer_class = ServiceSerializer
 
     @action(detail=True, methods=["get"])
     def summary(self, request, pk=None):
         svc = self.get_object()
+        context = self.get_serializer_context()
         return Response({
             "service": ServiceSerializer(svc).data,
-            "endpoints": EndpointSerializer(svc.endpoint.all(), many=True).data,
+            "endpoints": EndpointSerializer(svc.endpoint.order_by("id"), many=True, context=context).data,
         })
 
+    @action(detail=True, methods=["get"])
+    def timeseries(self, request, pk=None):
+        svc = self.get_object()
+        endpoint_ids = Endpoint.objects.filter(service=svc).values("id")
+        return timeseries_response(request.query_params, CheckResult.objects.filter(endpoint_id__in=endpoint_ids))
+
 
 class EndpointViewSet(viewsets.ModelViewSet):
-    queryset = Endpoint.objects.select_related("service").all()
+    queryset = Endpoint.objects.select_related("service").order_by("id")
     serializer_class = EndpointSerializer
 
-    @action(detail=True, methods=["post"])
-    def probe(self, request, pk=None):
+    # POST endpoints/{id}/probe/ is served by the async probe_endpoint view below.
+
+    @action(detail=True, methods=["get"])
+    def timeseries(self, request, pk=None):
         ep = self.get_object()
-        try:
-            r = httpx.request(ep.method, ep.url, headers=ep.headers or {}, timeout=ep.timeout_ms/1000.0)
-            ok = (r.status_code == ep.expected_status)
-            return Response(
-                {"status_code": r.status_code, "ok": ok, "expected": ep.expected_status},
-                status=status.HTTP_200_OK if ok else status.HTTP_424_FAILED_DEPENDENCY,
-            )
-        except Exception as e:
-            return Response({"error": str(e)}, status=424)
+        return timeseries_response(request.query_params, CheckResult.objects.filter(endpoint=ep))
 
 
 class CheckResultViewSet(viewsets.ReadOnlyModelViewSet):
-    queryset = CheckResult.objects.select_related("endpoint", "endpoint__service").all()
+    # Newest first; id order follows insertion order and avoids sorting on timestamp.
+    queryset = CheckResult.objects.order_by("-id")
     serializer_class = CheckResultSerializer
     ordering = ["-timestamp"]
 
+    def list(self, request, *args, **kwargs):
+        # Rows come straight from values() (honouring ?fields=) instead of
+        # through model instances and the serializer.
+        qs = CheckResultSerializer.values_queryset(
+            self.filter_queryset(self.get_queryset()), requested_fields(request),
+        )
+        page = self.paginate_queryset(qs)
+        if page is not None:
+            return self.get_paginated_response(CheckResultSerializer.from_values(page))
+        return Response(CheckResultSerializer.from_values(qs))
+
 
 class RegisterServiceView(APIView):
+    """
+    Register a service and its health endpoint: ``{"name", "base_url"}`` plus
+    optional ``health_path`` (default ``/health``), ``tier`` and ``mode``, or a
+    batch ``{"services": [...]}`` of those, registered in one transaction.
+    Registering again updates the service and is otherwise a no-op.
+    """
     permission_classes = [AllowAny]
 
     def post(self, request, *args, **kwargs):
-        token = request.headers.get("X-Registration-Token") or request.data.get("token")
+        data = request.data if isinstance(request.data, dict) else {}
+        token = request.headers.get("X-Registration-Token") or data.get("token")
         if token != REG_TOKEN:
             return Response({"detail": "Invalid token"}, status=status.HTTP_403_FORBIDDEN)
 
-        name = request.data.get("name")
-        base_url = request.data.get("base_url")
-        if not name or not base_url:
-            return Response({"detail": "name and base_url required"}, status=status.HTTP_400_BAD_REQUEST)
+        batch = "services" in data
+        entries = data["services"] if batch else [request.data]
+        if not isinstance(entries, list) or not 0 < len(entries) <= REGISTER_BATCH_MAX:
+            return Response(
+                {"detail": f"services must be a list of 1 to {REGISTER_BATCH_MAX} entries"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        for i, entry in enumerate(entries):
+            error = self._invalid(entry)
+            if error:
+                if batch:
+                    error = f"services[{i}]: {error}"
+                return Response({"detail": error}, status=status.HTTP_400_BAD_REQUEST)
 
-        svc, _ = Service.objects.update_or_create(
-            name=name,
-            defaults={"url": base_url, "last_checked": timezone.now()},
-        )
+        with transaction.atomic():
+            registered = [self._register(entry) for entry in entries]
+        if batch:
+            return Response({"detail": "registered", "services": registered})
+        return Response({"detail": "registered", **registered[0]})
+
+    @staticmethod
+    def _invalid(entry):
+        if not isinstance(entry, dict):
+            return "entry must be an object"
+        if not entry.get("name") or not entry.get("base_url"):
+            return "name and base_url required"
+        tier = entry.get("tier")
+        if tier is not None and tier not in Service.TIER_CHOICES:
+            return f"Unknown tier {tier!r}"
+        mode = entry.get("mode", Endpoint.MODE_POLL)
+        if mode not in Endpoint.MODE_CHOICES:
+            return f"Unknown mode {mode!r}"
+        health_path = entry.get("health_path", "/health")
+        if not isinstance(health_path, str) or not health_path.startswith("/"):
+            return "health_path must start with /"
+        return None
 
-        default_url = base_url.rstrip("/") + "/health"
-        Endpoint.objects.get_or_create(
+    @staticmethod
+    def _register(entry):
+        base_url = entry["base_url"]
+        tier = entry.get("tier")
+        mode = entry.get("mode", Endpoint.MODE_POLL)
+        defaults = {"url": base_url, "last_checked": timezone.now()}
+        if tier is not None:
+            defaults["tier"] = tier
+        svc, _ = Service.objects.update_or_create(name=entry["name"], defaults=defaults)
+
+        health_url = base_url.rstrip("/") + entry.get("health_path", "/health")
+        ep, _ = Endpoint.objects.get_or_create(
             service=svc,
-            url=default_url,
+            url=health_url,
             method="GET",
+            kind=Endpoint.KIND_HTTP,
             defaults={
                 "expected_status": 200,
                 "timeout_ms": 3000,
                 "interval_sec": 60,
-                "enabled": True},
+                "enabled": True,
+                "mode": mode},
+        )
+        if ep.mode != mode:
+            ep.mode = mode
+            ep.save(update_fields=["mode"])
+
+        body = {"name": svc.name, "service_id": svc.id, "endpoint_id": ep.id}
+        if mode == Endpoint.MODE_PUSH:
+            body["heartbeat_interval_s"] = ep.interval_sec
+        return body
+
+
+async def status_stream(request):
+    """
+    Server-Sent Events stream of endpoint check and service status changes
+    (``?service=<id>`` to filter). Meant for ASGI servers: under WSGI each open
+    stream pins a worker.
+    """
+    service_id = request.GET.get("service")
+    service_id = int(service_id) if service_id and service_id.isdigit() else None
+    response = StreamingHttpResponse(
+        events.stream(service_id=service_id),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+def _probe_payload(ep, outcome):
+    ok, code, rtt, details = outcome
+    payload = {
+        "id": ep.id,
+        "url": ep.url,
+        "ok": ok,
+        "status_code": code,
+        # Connect probes (tcp/tls) have no HTTP status to expect.
+        "expected": ep.expected_status if ep.kind in (Endpoint.KIND_HTTP, Endpoint.KIND_HEAD) else None,
+        "response_time_ms": rtt,
+    }
+    if not ok and details:
+        payload["error"] = details
+    return payload
+
+
+@no_pin
+@csrf_exempt
+@require_POST
+async def probe_endpoint(request, pk):
+    """Probe one endpoint now, without tying up a worker thread while waiting."""
+    ep = await Endpoint.objects.filter(pk=pk).afirst()
+    if ep is None:
+        raise Http404("No Endpoint matches the given query.")
+    (outcome,) = await probe_now([ep])
+    return JsonResponse(
+        _probe_payload(ep, outcome),
+        status=status.HTTP_200_OK if outcome[0] else status.HTTP_424_FAILED_DEPENDENCY,
+    )
+
+
+def _is_id(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+@no_pin
+@csrf_exempt
+@require_POST
+async def probe_batch(request):
+    """
+    Probe many endpoints concurrently: body ``{"service": <id>}`` for every
+    enabled endpoint of a service, or ``{"ids": [...]}`` for an explicit list.
+    """
+    try:
+        body = json.loads(request.body or b"{}")
+    except ValueError:
+        return JsonResponse({"detail": "Invalid JSON body"}, status=status.HTTP_400_BAD_REQUEST)
+
+    if not isinstance(body, dict):
+        return JsonResponse({"detail": "Body must be a JSON object"}, status=status.HTTP_400_BAD_REQUEST)
+
+    if body.get("service") is not None:
+        if not _is_id(body["service"]):
+            return JsonResponse({"detail": "service must be an integer id"}, status=status.HTTP_400_BAD_REQUEST)
+        qs = Endpoint.objects.filter(service_id=body["service"], enabled=True)
+    elif body.get("ids") is not None:
+        ids = body["ids"]
+        if not isinstance(ids, list) or not ids or not all(_is_id(i) for i in ids):
+            return JsonResponse({"detail": "ids must be a non-empty list of integer ids"},
+                                status=status.HTTP_400_BAD_REQUEST)
+        qs = Endpoint.objects.filter(pk__in=ids)
+    else:
+        return JsonResponse({"detail": "service or ids required"}, status=status.HTTP_400_BAD_REQUEST)
+
+    endpoints = [ep async for ep in qs.order_by("id")[:PROBE_BATCH_MAX + 1]]
+    if len(endpoints) > PROBE_BATCH_MAX:
+        return JsonResponse(
+            {"detail": f"At most {PROBE_BATCH_MAX} endpoints per batch"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    started = time.perf_counter()
+    outcomes = await probe_now(endpoints)
+    results = [_probe_payload(ep, o) for ep, o in zip(endpoints, outcomes)]
+    ok_count = sum(1 for r in results if r["ok"])
+    return JsonResponse({
+        "count": len(results),
+        "ok": ok_count,
+        "failed": len(results) - ok_count,
+        "elapsed_ms": int((time.perf_counter() - started) * 1000),
+        "results": results,
+    })
+
+
+# ---------- Probe agents (see probe_agent.py) ----------
+
+def _agent_authorized(request) -> bool:
+    auth = request.headers.get("Authorization", "")
+    return bool(AGENT_TOKEN) and hmac.compare_digest(auth, f"Bearer {AGENT_TOKEN}")
+
+
+def _agent_body(request) -> dict:
+    """JSON body of an agent request, gunzipped if needed; ValueError if unreadable."""
+    raw = request.body or b"{}"
+    if request.headers.get("Content-Encoding", "").lower() == "gzip":
+        try:
+            raw = gzip.decompress(raw)
+        except (OSError, EOFError, zlib.error) as e:
+            raise ValueError(f"Invalid gzip body: {e}")
+    body = json.loads(raw)
+    if not isinstance(body, dict):
+        raise ValueError("Body must be a JSON object")
+    return body
+
+
+@no_pin
+@csrf_exempt
+@require_POST
+def agent_lease(request):
+    """
+    Lease due endpoints to a probe agent: body ``{"limit": 200, "lease_s": 60}``,
+    optionally with ``"tier"``. Leased endpoints are not due again until the
+    lease expires.
+    """
+    if not _agent_authorized(request):
+        return JsonResponse({"detail": "Invalid token"}, status=status.HTTP_403_FORBIDDEN)
+    try:
+        body = _agent_body(request)
+        limit = int(body.get("limit", 100))
+        lease_s = int(body.get("lease_s", 60))
+    except (ValueError, TypeError):
+        return JsonResponse({"detail": "Invalid body"}, status=status.HTTP_400_BAD_REQUEST)
+    tier = body.get("tier")
+    if tier is not None and tier not in settings.CHECK_TIERS:
+        return JsonResponse({"detail": f"Unknown tier {tier!r}"}, status=status.HTTP_400_BAD_REQUEST)
+
+    endpoints, lease_until = lease_due(limit, lease_s, tier)
+    return JsonResponse({
+        "lease_until": lease_until,
+        "endpoints": [
+            {
+                "id": ep.id,
+                "url": ep.url,
+                "method": ep.method,
+                "headers": ep.headers or {},
+                "timeout_ms": ep.timeout_ms,
+                "expected_status": ep.expected_status,
+                "kind": ep.kind,
+            }
+            for ep in endpoints
+        ],
+    })
+
+
+@no_pin
+@csrf_exempt
+@require_POST
+def agent_results(request):
+    """
+    Store a batch of agent probe results (optionally gzip-encoded):
+    ``{"agent": "eu-1", "results": [{"id", "ok", "status_code", "response_time_ms", "details"}]}``.
+    """
+    if not _agent_authorized(request):
+        return JsonResponse({"detail": "Invalid token"}, status=status.HTTP_403_FORBIDDEN)
+    try:
+        body = _agent_body(request)
+        reported = body["results"]
+        if not isinstance(reported, list):
+            raise TypeError
+    except (ValueError, TypeError, KeyError):
+        return JsonResponse({"detail": "Invalid body"}, status=status.HTTP_400_BAD_REQUEST)
+    if len(reported) > AGENT_RESULTS_MAX:
+        return JsonResponse(
+            {"detail": f"At most {AGENT_RESULTS_MAX} results per batch"},
+            status=status.HTTP_400_BAD_REQUEST,
         )
 
-        return Response({"detail": "registered", "service_id": svc.id})
+    try:
+        stored = ingest_results(reported)
+    except (KeyError, ValueError, TypeError):
+        return JsonResponse({"detail": "Invalid result entry"}, status=status.HTTP_400_BAD_REQUEST)
+    return JsonResponse({"agent": body.get("agent"), "received": len(reported), "stored": stored})
+
+
+# ---------- Push heartbeats (see api.heartbeats) ----------
+
+@no_pin
+@csrf_exempt
+@require_POST
+def heartbeat_ingest(request):
+    """
+    Heartbeats for push-mode endpoints, authenticated by ``X-Heartbeat-Token``
+    (default: the registration token). Body is one beat or
+    ``{"heartbeats": [...]}`` (optionally gzip-encoded); a beat is ``{"id": <endpoint id>}``
+    with optional ``ok`` (default true), ``status_code``, ``response_time_ms``
+    and ``details``. Beats are buffered and recorded by the next sweep (202);
+    ids that are not enabled push endpoints are dropped then. ``received``
+    counts the beats in the body, ``accepted`` the distinct endpoints among
+    them (the latest beat per endpoint is kept), with or without Redis.
+    """
+    token = request.headers.get("X-Heartbeat-Token", "")
+    if not hmac.compare_digest(token, HEARTBEAT_TOKEN):
+        return JsonResponse({"detail": "Invalid token"}, status=status.HTTP_403_FORBIDDEN)
+    try:
+        body = _agent_body(request)
+        beats = body["heartbeats"] if "heartbeats" in body else [body]
+        if not isinstance(beats, list):
+            raise TypeError
+    except (ValueError, TypeError, KeyError):
+        return JsonResponse({"detail": "Invalid body"}, status=status.HTTP_400_BAD_REQUEST)
+    if len(beats) > HEARTBEATS_MAX:
+        return JsonResponse(
+            {"detail": f"At most {HEARTBEATS_MAX} heartbeats per batch"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    try:
+        outcomes = {
+            int(b["id"]): (
+                bool(b.get("ok", True)),
+                int(b.get("status_code") or 0),
+                int(b.get("response_time_ms") or 0),
+                str(b.get("details") or ""),
+            )
+            for b in beats
+        }
+    except (KeyError, ValueError, TypeError, AttributeError):
+        return JsonResponse({"detail": "Invalid heartbeat entry"}, status=status.HTTP_400_BAD_REQUEST)
+    accepted = heartbeats.receive(outcomes)
+    return JsonResponse({"received": len(beats), "accepted": accepted}, status=status.HTTP_202_ACCEPTED)
@@ -0,0 +1,67 @@
+# api/writer.py
+"""
+Write lock for SQLite deployments.
+
+SQLite allows one write transaction at a time. Checker writes (result
+batches, deferrals, agent leases) are wrapped in ``write_lock()``, an
+exclusive flock on a file next to the database, so Celery workers,
+run_checker and agent ingestion wait for each other's batches instead of
+contending for the database lock. It is a lock, not a queue: waiters are
+not ordered and nothing is batched across processes. It is reentrant within
+a thread and excludes other threads and processes. API reads take no lock
+and, in WAL mode, never wait for a writer. On other databases it does nothing.
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+try:
+    import fcntl
+except ImportError:  # not POSIX: rely on SQLite's busy timeout alone
+    fcntl = None
+
+log = logging.getLogger(__name__)
+
+# Waits longer than this are logged.
+SLOW_WAIT_S = 1.0
+
+# Lock files this thread holds (the lock is reentrant within a thread).
+_held = threading.local()
+
+
+def lock_path(using="default"):
+    """Lock file for a SQLite database alias, or None if it is not SQLite."""
+    conn = connections[using]
+    if conn.vendor != "sqlite" or fcntl is None or conn.is_in_memory_db():
+        return None
+    return getattr(settings, "SQLITE_WRITE_LOCK", "") or f"{conn.settings_dict['NAME']}.writelock"
+
+
+@contextmanager
+def write_lock(name, using="default"):
+    """Hold the database's write lock for the block; ``name`` labels slow waits."""
+    path = lock_path(using)
+    held = _held.__dict__.setdefault("paths", set())
+    if path is None or path in held:
+        yield
+        return
+    # A fresh open file per acquisition, so threads of one process exclude each other too.
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o664)
+    try:
+        started = time.monotonic()
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        waited = time.monotonic() - started
+        if waited > SLOW_WAIT_S:
+            log.warning("%s waited %.1fs for the SQLite write lock", name, waited)
+        held.add(path)
+        try:
+            yield
+        finally:
+            held.discard(path)
+    finally:
+        os.close(fd)
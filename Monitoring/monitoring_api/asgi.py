@@ -14,3 +14,10 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'monitoring_api.settings')
 
 application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402  (settings are configured above)
+
+if settings.ASYNC_VIEWS:
+    from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
+
+    application = ASGIStaticFilesHandler(application)
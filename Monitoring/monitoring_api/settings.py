@@ -33,6 +33,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.instrumentation.QueryCountMiddleware',
+    'api.profiling.ProfilingMiddleware',
+    'api.db_routing.ReplicaReadsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -43,6 +46,13 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# ASGI deployment mode (uvicorn, see asgi.py): read paths are served by async
+# views. WhiteNoise's middleware is sync-only and would push every request back
+# onto a thread, so static files are served by the ASGI static handler instead.
+ASYNC_VIEWS = os.getenv("MONITOR_ASYNC_VIEWS", "0") == "1"
+if ASYNC_VIEWS:
+    MIDDLEWARE.remove('whitenoise.middleware.WhiteNoiseMiddleware')
+
 ROOT_URLCONF = 'monitoring_api.urls'
 
 
@@ -63,6 +73,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'monitoring_api.wsgi.application'
+ASGI_APPLICATION = 'monitoring_api.asgi.application'
 
 
 # Database
@@ -75,6 +86,57 @@ DATABASES = {
     }
 }
 
+# PostgreSQL when POSTGRES_HOST is set, with optional read replicas (comma-
+# separated POSTGRES_REPLICA_HOSTS). API reads go to the replicas (see
+# api.db_routing); writes, the checker and Celery use the primary. A client
+# that wrote reads from the primary for REPLICA_PIN_S, covering replica lag.
+POSTGRES_HOST = os.getenv("POSTGRES_HOST", "")
+POSTGRES_REPLICA_HOSTS = [h.strip() for h in os.getenv("POSTGRES_REPLICA_HOSTS", "").split(",") if h.strip()]
+REPLICA_PIN_S = int(os.getenv("REPLICA_PIN_S", "5"))
+if POSTGRES_HOST:
+    DATABASES['default'] = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.getenv("POSTGRES_DB", "monitoring"),
+        'USER': os.getenv("POSTGRES_USER", "monitoring"),
+        'PASSWORD': os.getenv("POSTGRES_PASSWORD", ""),
+        'HOST': POSTGRES_HOST,
+        'PORT': os.getenv("POSTGRES_PORT", "5432"),
+        'CONN_MAX_AGE': int(os.getenv("POSTGRES_CONN_MAX_AGE", "60")),
+    }
+    for i, host in enumerate(POSTGRES_REPLICA_HOSTS, start=1):
+        DATABASES[f'replica{i}'] = {
+            **DATABASES['default'],
+            'HOST': host,
+            # Tests read the primary's test database through the replica alias.
+            'TEST': {'MIRROR': 'default'},
+        }
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['api.db_routing.ReplicaRouter']
+
+# SQLite shared by the API, Celery workers and beat. Write transactions take
+# the lock when they begin (IMMEDIATE) and wait up to SQLITE_BUSY_TIMEOUT_S for
+# it rather than failing with "database is locked"; checker writes also hold an
+# exclusive file lock (api.writer), so processes sharing the database take
+# turns. SQLITE_WAL=1 switches the database file to WAL mode, where readers
+# never wait for the writer (nor it for them). Off by default: it rewrites the
+# file's header, and the development database is tracked in git.
+SQLITE_WAL = os.getenv("SQLITE_WAL", "0") == "1"
+SQLITE_BUSY_TIMEOUT_S = float(os.getenv("SQLITE_BUSY_TIMEOUT_S", "30"))
+SQLITE_WRITE_LOCK = os.getenv("SQLITE_WRITE_LOCK", "")  # default: <database>.writelock
+if DATABASES['default']['ENGINE'].endswith('sqlite3'):
+    DATABASES['default']['OPTIONS'] = {
+        'timeout': SQLITE_BUSY_TIMEOUT_S,
+        'transaction_mode': 'IMMEDIATE',
+    }
+    if SQLITE_WAL:
+        DATABASES['default']['OPTIONS']['init_command'] = (
+            'PRAGMA journal_mode=WAL;'
+            'PRAGMA synchronous=NORMAL;'
+            'PRAGMA temp_store=MEMORY;'
+            'PRAGMA cache_size=-16000;'
+            'PRAGMA mmap_size=134217728'
+        )
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -120,13 +182,85 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
+# Per-request query logging (api.instrumentation.QueryCountMiddleware):
+# requests above either threshold are logged at WARNING on "api.queries".
+QUERY_COUNT_WARN = int(os.getenv("QUERY_COUNT_WARN", "50"))
+QUERY_TIME_WARN_MS = float(os.getenv("QUERY_TIME_WARN_MS", "500"))
+
+# Opt-in sampling profiler (api.profiling) for check ticks and API requests:
+# profile every Nth run and/or any run slower than PROFILE_SLOW_MS (0 = off).
+# Captures are folded-stack files under PROFILE_DIR, browsable in the admin.
+PROFILE_EVERY_N = int(os.getenv("PROFILE_EVERY_N", "0"))
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", str(BASE_DIR / "profiles"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "100"))
+PROFILE_MAX_BYTES = int(os.getenv("PROFILE_MAX_BYTES", str(50 * 1024 * 1024)))
+PROFILE_PATH_PREFIXES = ["/api/"]
+
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://redis:6379/0")
 CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", "redis://redis:6379/1")
 CELERY_TIMEZONE = "UTC"
 
+# Shared cache (alert dedupe/rate limits need it shared between workers).
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "")
+if CACHE_REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": CACHE_REDIS_URL,
+        }
+    }
+
+# Upper bound on how long a checker keeps endpoint configuration without
+# re-reading it (api.config_cache); saves normally invalidate it at once.
+CONFIG_CACHE_MAX_AGE_S = int(os.getenv("CONFIG_CACHE_MAX_AGE_S", "300"))
+
+# Probe rate limits (token buckets in the probe engine). Per service, overridable
+# with Service.probe_rate_per_s / probe_burst, and per host across services.
+# Probes over the limit are rescheduled, not dropped.
+PROBE_SERVICE_RATE_PER_S = float(os.getenv("PROBE_SERVICE_RATE_PER_S", "5"))
+PROBE_SERVICE_BURST = int(os.getenv("PROBE_SERVICE_BURST", "10"))
+PROBE_HOST_RATE_PER_S = float(os.getenv("PROBE_HOST_RATE_PER_S", "10"))
+PROBE_HOST_BURST = int(os.getenv("PROBE_HOST_BURST", "20"))
+# Redis holding the buckets, so the limits hold across worker processes;
+# without it each process has its own buckets (and the full budget).
+PROBE_LIMIT_REDIS_URL = os.getenv("PROBE_LIMIT_REDIS_URL", CACHE_REDIS_URL)
+
+# Result storage: "full" writes a CheckResult row per check; "changes" writes a
+# row only when an endpoint's outcome (success, status code) changes, or every
+# RESULT_HEARTBEAT_S while it doesn't, and counts repeats into that row.
+RESULT_STORAGE = os.getenv("MONITOR_RESULT_STORAGE", "full")
+RESULT_HEARTBEAT_S = int(os.getenv("MONITOR_RESULT_HEARTBEAT_S", "900"))
+
+# Latency baselines (api.baselines): EWMA over all checks and per hour of day.
+# An endpoint is DEGRADED after LATENCY_ANOMALY_STREAK checks in a row above
+# its baseline by SIGMA standard deviations, RATIO times and MIN_MS.
+LATENCY_EWMA_ALPHA = float(os.getenv("LATENCY_EWMA_ALPHA", "0.05"))
+LATENCY_SEASONAL_ALPHA = float(os.getenv("LATENCY_SEASONAL_ALPHA", "0.1"))
+LATENCY_WARMUP_SAMPLES = int(os.getenv("LATENCY_WARMUP_SAMPLES", "30"))
+LATENCY_ANOMALY_SIGMA = float(os.getenv("LATENCY_ANOMALY_SIGMA", "4"))
+LATENCY_ANOMALY_RATIO = float(os.getenv("LATENCY_ANOMALY_RATIO", "2"))
+LATENCY_ANOMALY_MIN_MS = float(os.getenv("LATENCY_ANOMALY_MIN_MS", "100"))
+LATENCY_ANOMALY_STREAK = int(os.getenv("LATENCY_ANOMALY_STREAK", "3"))
+
+# State-transition alerts (api.alerts): JSON POSTed to each webhook.
+ALERT_WEBHOOK_URLS = [u.strip() for u in os.getenv("ALERT_WEBHOOK_URLS", "").split(",") if u.strip()]
+ALERT_WEBHOOK_TIMEOUT_S = float(os.getenv("ALERT_WEBHOOK_TIMEOUT_S", "5"))
+ALERT_DEDUPE_S = int(os.getenv("ALERT_DEDUPE_S", "300"))
+ALERT_RATE_LIMIT = int(os.getenv("ALERT_RATE_LIMIT", "10"))          # per service
+ALERT_RATE_WINDOW_S = int(os.getenv("ALERT_RATE_WINDOW_S", "600"))
+
+# Redis used to fan out live status events (api.events); empty disables publishing.
+MONITOR_EVENTS_REDIS_URL = os.getenv("MONITOR_EVENTS_REDIS_URL", "redis://redis:6379/2")
+
 REST_FRAMEWORK = {
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 50,
+    "DEFAULT_RENDERER_CLASSES": [
+        "api.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
 }
 SPECTACULAR_SETTINGS = {
@@ -138,9 +272,35 @@ SPECTACULAR_SETTINGS = {
     "LICENSE": {"name": "MIT"},
 }
 
+# Probe tiers (Service.tier / Endpoint.tier). Each tier is checked by its own
+# beat entry on its own queue, with its own batch size and probe concurrency,
+# so a backlog of slow low-priority endpoints never delays critical ones.
+# Ticks expire after one period instead of piling up behind a busy worker.
+CHECK_TIERS = {
+    "critical": {"queue": "checks-critical", "every_s": 5.0, "batch": 200, "concurrency": 50},
+    "standard": {"queue": "checks-standard", "every_s": 15.0, "batch": 500, "concurrency": 20},
+    "low": {"queue": "checks-low", "every_s": 30.0, "batch": 500, "concurrency": 10},
+}
+
 CELERY_BEAT_SCHEDULE = {
-    "run-health-checks-every-15s": {
+    f"run-{tier}-health-checks": {
         "task": "api.run_due_checks",
-        "schedule": 15.0,   
-    },
-}
\ No newline at end of file
+        "schedule": cfg["every_s"],
+        "kwargs": {"tier": tier},
+        "options": {"queue": cfg["queue"], "expires": cfg["every_s"]},
+    }
+    for tier, cfg in CHECK_TIERS.items()
+}
+
+# Push-mode endpoints (Endpoint.mode = "push", api.heartbeats): heartbeats are
+# buffered in Redis and recorded by a sweep every HEARTBEAT_SWEEP_S, which also
+# fails endpoints silent for HEARTBEAT_GRACE intervals. An empty
+# HEARTBEAT_REDIS_URL records each beat as it arrives: development only.
+HEARTBEAT_REDIS_URL = os.getenv("HEARTBEAT_REDIS_URL", MONITOR_EVENTS_REDIS_URL)
+HEARTBEAT_SWEEP_S = float(os.getenv("HEARTBEAT_SWEEP_S", "5"))
+HEARTBEAT_GRACE = float(os.getenv("HEARTBEAT_GRACE", "2"))
+CELERY_BEAT_SCHEDULE["sweep-heartbeats"] = {
+    "task": "api.sweep_heartbeats",
+    "schedule": HEARTBEAT_SWEEP_S,
+    "options": {"queue": CHECK_TIERS["critical"]["queue"], "expires": HEARTBEAT_SWEEP_S},
+}
@@ -0,0 +1,20 @@
+"""
+Slim settings for checker processes (Celery worker/beat, run_checker).
+
+Same database, cache, Celery and checker configuration as settings.py, but only
+the ``api`` app: no admin, auth, sessions, DRF, staticfiles or middleware are
+loaded, which trims django.setup() by roughly a fifth. The first tick still
+imports the probe engine and metrics through api.checks. Not for serving HTTP.
+Compare start-up with ``manage.py bench_cold_start``.
+"""
+from .settings import *  # noqa: F401,F403
+
+INSTALLED_APPS = [
+    'api',
+]
+
+MIDDLEWARE = []
+TEMPLATES = []
+ROOT_URLCONF = None
+AUTH_PASSWORD_VALIDATORS = []
+USE_I18N = False
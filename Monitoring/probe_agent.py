@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+"""
+Standalone probe agent.
+
+Leases batches of due endpoints from the Monitoring API, probes them with the
+same engine as the Celery checker (api.probe; needs only httpx) and pushes the
+results back as gzip-compressed batches. Run as many agents as you like, on
+any node or region that can reach the API:
+
+    MONITOR_AGENT_TOKEN=... python probe_agent.py --api http://monitoring:8000 --name eu-1
+
+Endpoints leased by an agent that dies become due again when the lease expires.
+"""
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+import socket
+import sys
+from types import SimpleNamespace
+
+import httpx
+
+from api.probe import MAX_CONCURRENCY, fetch_results
+
+log = logging.getLogger("probe_agent")
+
+UPLOAD_ATTEMPTS = 3
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Lease due endpoints, probe them and report results.")
+    p.add_argument("--api", default=os.getenv("MONITOR_API_URL", "http://localhost:8000"),
+                   help="Monitoring base URL (env MONITOR_API_URL)")
+    p.add_argument("--token", default=os.getenv("MONITOR_AGENT_TOKEN", ""),
+                   help="Agent token (env MONITOR_AGENT_TOKEN)")
+    p.add_argument("--name", default=os.getenv("MONITOR_AGENT_NAME", socket.gethostname()))
+    p.add_argument("--batch", type=int, default=200, help="Endpoints per lease")
+    p.add_argument("--tier", default=os.getenv("MONITOR_AGENT_TIER") or None,
+                   help="Only lease endpoints of this tier (env MONITOR_AGENT_TIER)")
+    p.add_argument("--lease-s", type=int, default=60,
+                   help="Lease length; must exceed the slowest probe including its retry")
+    p.add_argument("--idle-s", type=float, default=5.0, help="Pause when nothing is due")
+    p.add_argument("--concurrency", type=int, default=MAX_CONCURRENCY)
+    p.add_argument("--once", action="store_true", help="Process one lease and exit")
+    return p.parse_args(argv)
+
+
+class Agent:
+    def __init__(self, args):
+        self.args = args
+        self.client = httpx.AsyncClient(
+            base_url=args.api.rstrip("/"),
+            headers={"Authorization": f"Bearer {args.token}"},
+            timeout=httpx.Timeout(30.0),
+        )
+
+    async def lease(self):
+        body = {"agent": self.args.name, "limit": self.args.batch, "lease_s": self.args.lease_s}
+        if self.args.tier:
+            body["tier"] = self.args.tier
+        r = await self.client.post("/api/agents/lease/", json=body)
+        r.raise_for_status()
+        return [SimpleNamespace(**ep) for ep in r.json()["endpoints"]]
+
+    async def upload(self, results):
+        body = gzip.compress(json.dumps({"agent": self.args.name, "results": results}).encode())
+        headers = {"Content-Type": "application/json", "Content-Encoding": "gzip"}
+        for attempt in range(1, UPLOAD_ATTEMPTS + 1):
+            try:
+                r = await self.client.post("/api/agents/results/", content=body, headers=headers)
+                r.raise_for_status()
+                log.info("Reported %d result(s), %s stored", len(results), r.json().get("stored"))
+                return
+            except httpx.HTTPError as e:
+                log.warning("Upload attempt %d/%d failed: %s", attempt, UPLOAD_ATTEMPTS, e)
+                await asyncio.sleep(2 ** attempt)
+        # The endpoints become due again once their lease expires.
+        log.error("Dropping %d result(s) after %d failed uploads", len(results), UPLOAD_ATTEMPTS)
+
+    async def run(self):
+        upload = None
+        try:
+            while True:
+                try:
+                    endpoints = await self.lease()
+                except httpx.HTTPError as e:
+                    log.warning("Lease failed: %s", e)
+                    endpoints = []
+
+                if endpoints:
+                    outcomes = await fetch_results(endpoints, max_concurrency=self.args.concurrency)
+                    results = [
+                        {"id": ep.id, "ok": ok, "status_code": code, "response_time_ms": rtt, "details": details}
+                        for ep, (ok, code, rtt, details) in zip(endpoints, outcomes)
+                    ]
+                    # At most one upload in flight; it overlaps the next lease and probe round.
+                    if upload is not None:
+                        await upload
+                    upload = asyncio.create_task(self.upload(results))
+
+                if self.args.once:
+                    break
+                if len(endpoints) < self.args.batch:
+                    await asyncio.sleep(self.args.idle_s)
+        finally:
+            if upload is not None:
+                await upload
+            await self.client.aclose()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if not args.token:
+        sys.exit("MONITOR_AGENT_TOKEN (or --token) is required")
+    try:
+        asyncio.run(Agent(args).run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
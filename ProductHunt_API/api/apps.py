@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from service_health.django import start
+
+        from .health import HEALTH_PATH, monitor
+        start(monitor, HEALTH_PATH)
@@ -0,0 +1,21 @@
+import urllib.error
+import urllib.request
+
+from service_health import HealthMonitor
+
+HEALTH_PATH = "/api/producthunt/health/"
+
+monitor = HealthMonitor("producthunt")
+
+
+@monitor.check("producthunt_api", critical=False, interval_s=60, timeout_s=10)
+def producthunt_api_reachable():
+    # Any HTTP answer means the API is reachable; unauthenticated requests get 4xx.
+    request = urllib.request.Request("https://api.producthunt.com/v2/api/graphql", method="HEAD")
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return f"HTTP {response.status}"
+    except urllib.error.HTTPError as e:
+        if e.code >= 500:
+            return False
+        return f"HTTP {e.code}"
@@ -1,7 +1,10 @@
 from django.urls import path
-from .views import producthunt_filter, health_check
+from service_health.django import health_view
+
+from .health import monitor
+from .views import producthunt_filter
 
 urlpatterns = [
     path('filter/', producthunt_filter, name='producthunt_filter'),
-    path('health/', health_check, name='health_check'), # added by Parsa for health check
+    path('health/', health_view(monitor), name='health_check'),
 ]
\ No newline at end of file
@@ -1,5 +1,3 @@
-from datetime import timezone
-
 from django.shortcuts import render
 import requests
 from datetime import datetime, timedelta
@@ -137,7 +135,3 @@ def producthunt_filter(request):
     post["topics"] = [t["node"]["name"] for t in post.get("topics", {}).get("edges", [])]
 
   return Response(matched_posts)
-
-@api_view(["GET"])
-def health_check(request):
-    return Response({"status": "ok", "timestamp": datetime.now(timezone.utc).isoformat()})
\ No newline at end of file
@@ -1,6 +1,8 @@
 import httpx
 from fastapi import FastAPI, HTTPException, Form
 from prometheus_fastapi_instrumentator import Instrumentator
+from service_health import HealthMonitor
+from service_health.fastapi import install as install_health
 from typing import List, Dict, Optional
 import logging
 
@@ -141,26 +143,20 @@ async def search_twitter_get(
     keyword_list = [k.strip() for k in keywords.split(",") if k.strip()]
     return await search_twitter_posts(keywords=keyword_list, post_type=post_type)
 
-@app.get("/health")
-async def health_check():
-    """Health check endpoint"""
-    try:
-        # Test connection to external API
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.get(TWITTER_API_BASE.replace('tw.php', ''))
-            
-        return {
-            "status": "healthy",
-            "twitter_api_accessible": response.status_code < 500,
-            "service": "twitter_api_proxy"
-        }
-    except Exception as e:
-        return {
-            "status": "degraded",
-            "twitter_api_accessible": False,
-            "error": str(e),
-            "service": "twitter_api_proxy"
-        }
+# Health: the upstream is checked in the background, not on every probe
+health = HealthMonitor("twitter_api_proxy")
+
+
+@health.check("twitter_api", critical=False, interval_s=30, timeout_s=10)
+async def twitter_api_accessible():
+    async with httpx.AsyncClient(timeout=10.0) as client:
+        response = await client.get(TWITTER_API_BASE.replace('tw.php', ''))
+    if response.status_code >= 500:
+        return False
+    return f"HTTP {response.status_code}"
+
+
+install_health(app, health)
 
 if __name__ == "__main__":
     import uvicorn
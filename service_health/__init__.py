@@ -0,0 +1,19 @@
+"""
+Health checks and monitor registration for the services watched by the
+Monitoring API.
+
+- HealthMonitor runs dependency checks in a background thread, each on its
+  own interval, and keeps a prebuilt ``/health`` response, so serving it
+  does no I/O.
+- register() registers the service with the Monitoring API
+  (RegisterServiceView) from a background thread: after a random start-up
+  delay, with retries on exponential backoff with full jitter, sending the
+  registrations queued in one process as a single batch.
+
+Framework glue lives in ``service_health.fastapi`` and
+``service_health.django``. Standard library only.
+"""
+from .checks import HealthMonitor
+from .registration import Registrar, register
+
+__all__ = ["HealthMonitor", "Registrar", "register"]
@@ -0,0 +1,158 @@
+# service_health/checks.py
+import asyncio
+import inspect
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+
+log = logging.getLogger("service_health")
+
+STARTING = "starting"
+HEALTHY = "healthy"
+DEGRADED = "degraded"
+UNHEALTHY = "unhealthy"
+
+
+class _Check:
+    def __init__(self, name, fn, interval_s, timeout_s, critical):
+        self.name = name
+        self.fn = fn
+        self.interval_s = interval_s
+        self.timeout_s = timeout_s
+        self.critical = critical
+        self.ok = None
+        self.detail = None
+        self.latency_ms = None
+        self.checked_at = None
+        self.next_at = 0.0
+
+    def state(self):
+        return {
+            "ok": self.ok,
+            "critical": self.critical,
+            "latency_ms": self.latency_ms,
+            "checked_at": self.checked_at,
+            "detail": self.detail,
+        }
+
+
+class HealthMonitor:
+    """
+    Dependency checks for one service, refreshed in the background.
+
+    A check is a callable, sync or async, that raises or returns False when
+    its dependency is unhealthy; any other return value is shown as its
+    detail. A failing critical check makes the service ``unhealthy`` (503),
+    a failing non-critical one ``degraded`` (200). Until every check has run
+    once the service reports ``starting`` (200).
+
+    ``response()`` returns the last ``(status_code, json_bytes)``; it is
+    swapped in whole after each round of checks, so readers need no lock.
+    """
+
+    def __init__(self, service, interval_s=15.0, timeout_s=5.0):
+        self.service = service
+        self.interval_s = interval_s
+        self.timeout_s = timeout_s
+        self._checks = []
+        self._stop = threading.Event()
+        self._thread = None
+        self._publish()
+
+    def add(self, name, fn, interval_s=None, timeout_s=None, critical=True):
+        self._checks.append(_Check(
+            name, fn,
+            interval_s=interval_s or self.interval_s,
+            timeout_s=timeout_s or self.timeout_s,
+            critical=critical,
+        ))
+        self._publish()
+        return fn
+
+    def check(self, name=None, **options):
+        """Decorator form of add(): ``@monitor.check("db", critical=True)``."""
+        def decorator(fn):
+            return self.add(name or fn.__name__, fn, **options)
+        return decorator
+
+    def response(self):
+        return self._response
+
+    def start(self):
+        """Start the refresh thread (once per process)."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="health-checks", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def run_once(self):
+        """Run every check now, in the calling thread, and publish the result."""
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(self._run_all(self._checks))
+        finally:
+            loop.close()
+        self._publish()
+
+    def _loop(self):
+        loop = asyncio.new_event_loop()
+        try:
+            while not self._stop.is_set():
+                now = time.monotonic()
+                due = [c for c in self._checks if c.next_at <= now]
+                if due:
+                    loop.run_until_complete(self._run_all(due))
+                    self._publish()
+                next_at = min((c.next_at for c in self._checks), default=now + self.interval_s)
+                self._stop.wait(max(0.05, next_at - time.monotonic()))
+        finally:
+            loop.close()
+
+    async def _run_all(self, checks):
+        await asyncio.gather(*(self._run(c) for c in checks))
+
+    async def _run(self, check):
+        started = time.perf_counter()
+        try:
+            if inspect.iscoroutinefunction(check.fn):
+                result = await asyncio.wait_for(check.fn(), check.timeout_s)
+            else:
+                loop = asyncio.get_running_loop()
+                result = await asyncio.wait_for(loop.run_in_executor(None, check.fn), check.timeout_s)
+            check.ok = result is not False
+            check.detail = None if result is None or isinstance(result, bool) else str(result)
+        except asyncio.TimeoutError:
+            check.ok, check.detail = False, f"timed out after {check.timeout_s:g}s"
+        except Exception as e:
+            check.ok, check.detail = False, f"{type(e).__name__}: {e}"
+        check.latency_ms = round((time.perf_counter() - started) * 1000, 1)
+        check.checked_at = datetime.now(timezone.utc).isoformat()
+        check.next_at = time.monotonic() + check.interval_s
+        if not check.ok:
+            log.warning("Health check %s failed: %s", check.name, check.detail)
+
+    def _publish(self):
+        checks = list(self._checks)
+        if any(c.ok is None for c in checks):
+            status = STARTING
+        elif any(not c.ok and c.critical for c in checks):
+            status = UNHEALTHY
+        elif any(not c.ok for c in checks):
+            status = DEGRADED
+        else:
+            status = HEALTHY
+        body = {
+            "status": status,
+            "service": self.service,
+            "checks": {c.name: c.state() for c in checks},
+        }
+        code = 503 if status == UNHEALTHY else 200
+        self._response = (code, json.dumps(body).encode())
@@ -0,0 +1,37 @@
+# service_health/django.py
+"""
+Django glue: route ``health_view(monitor)`` and call ``start(monitor, path)``
+from an AppConfig.ready().
+"""
+import os
+import sys
+
+from django.http import HttpResponse
+
+from .registration import register
+
+
+def health_view(monitor):
+    """View serving ``monitor``'s cached response."""
+    def health(request):
+        status_code, body = monitor.response()
+        return HttpResponse(body, status=status_code, content_type="application/json")
+    return health
+
+
+def _serving():
+    """False in management commands and in runserver's autoreloader parent."""
+    if not os.path.basename(sys.argv[0]).startswith("manage"):
+        return True  # gunicorn, uvicorn, ...
+    return len(sys.argv) > 1 and sys.argv[1] == "runserver" and (
+        os.environ.get("RUN_MAIN") == "true" or "--noreload" in sys.argv
+    )
+
+
+def start(monitor, health_path="/health", auto_register=True):
+    """Start ``monitor``'s checks and register ``health_path``, when serving requests."""
+    if not _serving():
+        return
+    monitor.start()
+    if auto_register:
+        register(health_path=health_path)
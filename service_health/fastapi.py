@@ -0,0 +1,36 @@
+# service_health/fastapi.py
+"""FastAPI glue: ``install(app, monitor)`` serves the cached health and registers on startup."""
+from contextlib import asynccontextmanager
+
+from fastapi import Response
+
+from .registration import register
+
+
+def install(app, monitor, path="/health", auto_register=True):
+    """
+    Serve ``monitor``'s cached response at ``path``, start its checks when the
+    app starts (and stop them on shutdown), and register ``path`` with the
+    monitor if ``auto_register`` (see service_health.register). The app's own
+    lifespan, if any, runs inside the monitor's.
+    """
+    @app.get(path, include_in_schema=False)
+    async def health():
+        status_code, body = monitor.response()
+        return Response(content=body, status_code=status_code, media_type="application/json")
+
+    app_lifespan = app.router.lifespan_context
+
+    @asynccontextmanager
+    async def lifespan(app):
+        monitor.start()
+        if auto_register:
+            register(health_path=path)
+        try:
+            async with app_lifespan(app) as state:
+                yield state
+        finally:
+            monitor.stop()
+
+    app.router.lifespan_context = lifespan
+    return health
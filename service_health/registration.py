@@ -0,0 +1,152 @@
+# service_health/registration.py
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+
+log = logging.getLogger("service_health")
+
+
+class Registrar:
+    """
+    Registers services with the Monitoring API from a background thread.
+
+    ``submit()`` queues a registration (``name``, ``base_url`` and optional
+    ``health_path``, ``tier``, ``mode``). The thread first sleeps a random
+    ``0..start_jitter_s``, so a fleet booting together does not register at
+    once, then sends whatever is queued within ``batch_window_s`` as one
+    ``{"services": [...]}`` request. Failures (network errors, 429, 5xx) are
+    retried with exponential backoff and full jitter; other 4xx answers mean
+    the request itself is wrong and are not retried.
+    """
+
+    def __init__(self, url, token, start_jitter_s=5.0, batch_window_s=0.5, max_batch=100,
+                 backoff_base_s=1.0, backoff_max_s=60.0, timeout_s=5.0):
+        self.url = url
+        self.token = token
+        self.start_jitter_s = start_jitter_s
+        self.batch_window_s = batch_window_s
+        self.max_batch = max_batch
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self.timeout_s = timeout_s
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, name, base_url, health_path="/health", tier=None, mode=None):
+        """Queue a registration; the returned Event is set once it is accepted."""
+        entry = {"name": name, "base_url": base_url, "health_path": health_path}
+        if tier:
+            entry["tier"] = tier
+        if mode:
+            entry["mode"] = mode
+        done = threading.Event()
+        self._queue.put((entry, done))
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="monitor-registration", daemon=True)
+                self._thread.start()
+        return done
+
+    def _run(self):
+        time.sleep(random.uniform(0, self.start_jitter_s))
+        while True:
+            batch = self._take_batch()
+            attempt = 0
+            while batch:
+                try:
+                    self._send([entry for entry, _ in batch])
+                except _Rejected as e:
+                    log.error("Monitor rejected registration of %s: %s", _names(batch), e)
+                    batch = []
+                except Exception as e:
+                    delay = random.uniform(0, min(self.backoff_max_s, self.backoff_base_s * 2 ** attempt))
+                    attempt += 1
+                    log.warning("Registering %s failed (%s); retry %d in %.1fs", _names(batch), e, attempt, delay)
+                    time.sleep(delay)
+                    # Registrations queued meanwhile ride along with the retry.
+                    batch += self._drain(self.max_batch - len(batch))
+                else:
+                    log.info("Registered %s with the monitor", _names(batch))
+                    for _, done in batch:
+                        done.set()
+                    batch = []
+
+    def _take_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_window_s
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _drain(self, limit):
+        out = []
+        while len(out) < limit:
+            try:
+                out.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return out
+
+    def _send(self, entries):
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps({"services": entries}).encode(),
+            headers={"Content-Type": "application/json", "X-Registration-Token": self.token},
+            method="POST",
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout_s) as response:
+                return json.loads(response.read() or b"{}")
+        except urllib.error.HTTPError as e:
+            if 400 <= e.code < 500 and e.code != 429:
+                raise _Rejected(f"HTTP {e.code}: {e.read()[:200]!r}") from e
+            raise
+
+
+class _Rejected(Exception):
+    pass
+
+
+def _names(batch):
+    return ", ".join(entry["name"] for entry, _ in batch)
+
+
+_default = None
+
+
+def register(name=None, base_url=None, health_path="/health", tier=None, mode=None):
+    """
+    Register this service in the background, configured from the environment:
+    MONITOR_URL (the register endpoint), MONITOR_REGISTRATION_TOKEN,
+    SERVICE_NAME and SERVICE_BASE_URL, plus optional MONITOR_TIER and
+    MONITOR_MODE. Returns None (and does nothing) if MONITOR_URL is unset.
+    """
+    global _default
+    url = os.getenv("MONITOR_URL", "")
+    name = name or os.getenv("SERVICE_NAME", "")
+    base_url = base_url or os.getenv("SERVICE_BASE_URL", "")
+    if not url:
+        return None
+    if not name or not base_url:
+        log.warning("MONITOR_URL is set but SERVICE_NAME/SERVICE_BASE_URL are not; not registering")
+        return None
+    if _default is None:
+        _default = Registrar(url, os.getenv("MONITOR_REGISTRATION_TOKEN", ""))
+    return _default.submit(
+        name, base_url, health_path,
+        tier=tier or os.getenv("MONITOR_TIER") or None,
+        mode=mode or os.getenv("MONITOR_MODE") or None,
+    )
@@ -0,0 +1,208 @@
+# service_health/tests.py
+# Run from the repository root: python -m unittest service_health.tests
+import asyncio
+import io
+import json
+import threading
+import time
+import unittest
+import urllib.error
+from types import SimpleNamespace
+from unittest import mock
+
+from . import registration
+from .checks import HealthMonitor
+from .registration import Registrar, _Rejected
+
+
+def body_of(monitor):
+    code, body = monitor.response()
+    return code, json.loads(body)
+
+
+class HealthMonitorTests(unittest.TestCase):
+    def test_starting_until_every_check_has_run(self):
+        monitor = HealthMonitor("svc")
+        monitor.add("db", lambda: True)
+        code, body = body_of(monitor)
+        self.assertEqual((code, body["status"]), (200, "starting"))
+        self.assertIsNone(body["checks"]["db"]["ok"])
+
+        monitor.run_once()
+        code, body = body_of(monitor)
+        self.assertEqual((code, body["status"], body["service"]), (200, "healthy", "svc"))
+        self.assertTrue(body["checks"]["db"]["ok"])
+
+    def test_failing_critical_check_is_unhealthy(self):
+        monitor = HealthMonitor("svc")
+        monitor.add("db", lambda: False)
+        monitor.add("cache", lambda: True, critical=False)
+        monitor.run_once()
+        code, body = body_of(monitor)
+        self.assertEqual((code, body["status"]), (503, "unhealthy"))
+        self.assertFalse(body["checks"]["db"]["ok"])
+
+    def test_failing_non_critical_check_is_degraded(self):
+        monitor = HealthMonitor("svc")
+
+        @monitor.check("search", critical=False)
+        async def search():
+            raise ConnectionError("refused")
+
+        monitor.add("db", lambda: "3 connections")
+        monitor.run_once()
+        code, body = body_of(monitor)
+        self.assertEqual((code, body["status"]), (200, "degraded"))
+        self.assertEqual(body["checks"]["search"]["detail"], "ConnectionError: refused")
+        # Any other return value is shown as the detail.
+        self.assertEqual(body["checks"]["db"]["detail"], "3 connections")
+
+    def test_slow_checks_time_out(self):
+        monitor = HealthMonitor("svc", timeout_s=0.05)
+
+        async def hangs():
+            await asyncio.sleep(5)
+
+        monitor.add("async", hangs)
+        monitor.add("sync", lambda: time.sleep(0.5), critical=False)
+        started = time.monotonic()
+        monitor.run_once()
+        self.assertLess(time.monotonic() - started, 0.5)
+        code, body = body_of(monitor)
+        self.assertEqual((code, body["status"]), (503, "unhealthy"))
+        for name in ("async", "sync"):
+            self.assertEqual(body["checks"][name]["detail"], "timed out after 0.05s")
+
+    def test_each_check_runs_on_its_own_interval(self):
+        calls = {"fast": 0, "slow": 0}
+
+        def counter(name):
+            def check():
+                calls[name] += 1
+            return check
+
+        monitor = HealthMonitor("svc")
+        monitor.add("fast", counter("fast"), interval_s=0.05)
+        monitor.add("slow", counter("slow"), interval_s=60)
+        monitor.start()
+        try:
+            time.sleep(0.5)
+        finally:
+            monitor.stop()
+        self.assertGreaterEqual(calls["fast"], 3)
+        self.assertEqual(calls["slow"], 1)
+        self.assertEqual(body_of(monitor)[1]["status"], "healthy")
+
+
+class RegistrarTests(unittest.TestCase):
+    def setUp(self):
+        # Sleeps are recorded, not slept, and jitter always picks its upper bound.
+        self.sleeps = []
+        fake_time = SimpleNamespace(sleep=self.sleeps.append, monotonic=time.monotonic)
+        fake_random = SimpleNamespace(uniform=lambda low, high: high)
+        for name, fake in (("time", fake_time), ("random", fake_random)):
+            patcher = mock.patch.object(registration, name, fake)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def registrar(self, send, **options):
+        options = {"start_jitter_s": 0, "batch_window_s": 0.2, **options}
+        registrar = Registrar("http://monitor/api/register/", "token", **options)
+        registrar._send = mock.Mock(side_effect=send)
+        return registrar
+
+    def wait(self, *events):
+        for event in events:
+            self.assertTrue(event.wait(5))
+
+    def test_registrations_in_the_window_are_sent_as_one_batch(self):
+        registrar = self.registrar(lambda entries: {}, max_batch=2)
+        events = [registrar.submit(name, f"http://{name}") for name in ("a", "b", "c")]
+        self.wait(*events)
+        batches = [[e["name"] for e in call.args[0]] for call in registrar._send.call_args_list]
+        # max_batch splits the three registrations into two requests.
+        self.assertEqual(batches, [["a", "b"], ["c"]])
+
+    def test_failures_back_off_exponentially_up_to_the_cap(self):
+        failures = iter([OSError("down")] * 4)
+
+        def send(entries):
+            error = next(failures, None)
+            if error:
+                raise error
+            return {}
+
+        registrar = self.registrar(send, backoff_base_s=1.0, backoff_max_s=5.0)
+        with self.assertLogs("service_health", "WARNING"):
+            self.wait(registrar.submit("a", "http://a", tier="critical"))
+        # The start-up delay, then 1, 2, 4 and the 5s cap.
+        self.assertEqual(self.sleeps, [0, 1.0, 2.0, 4.0, 5.0])
+        self.assertEqual(registrar._send.call_count, 5)
+        self.assertEqual(registrar._send.call_args.args[0],
+                         [{"name": "a", "base_url": "http://a", "health_path": "/health", "tier": "critical"}])
+
+    def test_registrations_queued_during_a_retry_ride_along(self):
+        late = []
+
+        def send(entries):
+            if not late:
+                late.append(registrar.submit("late", "http://late"))
+                raise OSError("down")
+            return {}
+
+        registrar = self.registrar(send)
+        with self.assertLogs("service_health", "WARNING"):
+            first = registrar.submit("a", "http://a")
+            self.wait(first)
+        self.wait(late[0])
+        self.assertEqual([e["name"] for e in registrar._send.call_args.args[0]], ["a", "late"])
+
+    def test_rejected_registrations_are_not_retried(self):
+        answers = iter([_Rejected("HTTP 400"), {}])
+        sent = threading.Event()
+
+        def send(entries):
+            sent.set()
+            answer = next(answers)
+            if isinstance(answer, Exception):
+                raise answer
+            return answer
+
+        registrar = self.registrar(send)
+        with self.assertLogs("service_health", "ERROR"):
+            rejected = registrar.submit("bad", "not a url")
+            self.wait(sent)
+            accepted = registrar.submit("good", "http://good")
+            self.wait(accepted)
+        self.assertFalse(rejected.is_set())
+        self.assertEqual(registrar._send.call_count, 2)
+        self.assertEqual(self.sleeps, [0])
+
+    def test_only_client_errors_are_rejected(self):
+        registrar = Registrar("http://monitor/api/register/", "token")
+
+        def http_error(code):
+            return urllib.error.HTTPError(registrar.url, code, "error", {}, io.BytesIO(b"{}"))
+
+        with mock.patch.object(registration.urllib.request, "urlopen", side_effect=http_error(400)):
+            with self.assertRaises(_Rejected):
+                registrar._send([])
+        for code in (429, 503):
+            with mock.patch.object(registration.urllib.request, "urlopen", side_effect=http_error(code)):
+                with self.assertRaises(urllib.error.HTTPError) as raised:
+                    registrar._send([])
+                self.assertNotIsInstance(raised.exception, _Rejected)
+
+    def test_sends_the_token_and_the_services(self):
+        registrar = Registrar("http://monitor/api/register/", "token")
+        response = mock.MagicMock()
+        response.__enter__.return_value.read.return_value = b'{"created": 1}'
+        with mock.patch.object(registration.urllib.request, "urlopen", return_value=response) as urlopen:
+            self.assertEqual(registrar._send([{"name": "a"}]), {"created": 1})
+        request = urlopen.call_args.args[0]
+        self.assertEqual(request.get_header("X-registration-token"), "token")
+        self.assertEqual(json.loads(request.data), {"services": [{"name": "a"}]})
+
+
+if __name__ == "__main__":
+    unittest.main()